@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+## benchmark_acquisition.py
+##
+## Measure the throughput and latency of each acquisition path in flir_spin_library, for every combination of the
+## requested image sizes, binning values and pixel formats. Run it against a real camera, or against the simulated
+## camera with "--simulate" (see simulated_pyspin.py), for example:
+##
+##     python benchmark_acquisition.py --simulate --paths num session live --binning 1 2 --pixel-formats Mono8 Mono16
+##     python benchmark_acquisition.py --num-frames 500 --output results.json --baseline previous_results.json
+##
+## For each run the results are:
+##     fps                 sustained frame rate (complete frames delivered / wall time)
+##     latency_ms          percentiles of the per-frame latency (see below)
+##     jitter_ms           standard deviation of the inter-frame intervals on the camera clock
+##     cpu_s, cpu_load     process CPU time (all threads) used by the run, and that time as a fraction of wall time
+##     peak_memory_mb      peak Python/numpy memory allocated during the run (from tracemalloc)
+##     dropped, incomplete frame accounting from the AcquisitionReport
+##
+## The latency of a frame is the host time at which the path handed the frame to the caller, minus the camera
+## timestamp of the frame (mapped onto the host clock with a timestamp latch taken just before the run). It therefore
+## includes the exposure, the readout, the transfer and the host-side handling. Paths that only hand back a finished
+## stack (num, burst, fastsave) have no per-frame latency; for "one" the latency is the duration of each call, since
+## that includes starting and stopping the acquisition.
+##
+## The results are written as JSON (to stdout, or to a file with "--output"). Given a "--baseline" JSON file from an
+## earlier run, runs whose fps fell, or whose median latency rose, by more than "--tolerance" are listed and the exit
+## status is 1, so that the benchmark can be used to catch regressions.
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy
+from numpy import array, zeros, percentile
+
+ALL_PATHS = ('one', 'num', 'burst', 'fastsave', 'session', 'live')
+
+## ====================================================================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the acquisition paths of flir_spin_library.')
+    parser.add_argument('--simulate', action='store_true', help='use the simulated camera (simulated_pyspin.py)')
+    parser.add_argument('--camera', type=int, default=0, help='index of the camera to use')
+    parser.add_argument('--paths', nargs='+', default=list(ALL_PATHS), choices=ALL_PATHS, help='acquisition paths to run')
+    parser.add_argument('--rois', nargs='+', default=['full'], help='image regions to use: "full", or "HxW" centered on the sensor')
+    parser.add_argument('--binning', nargs='+', type=int, default=[1], help='binning values to use')
+    parser.add_argument('--pixel-formats', nargs='+', default=[None], help='pixel formats to use (default: leave unchanged)')
+    parser.add_argument('--exposure', type=float, default=1000.0, help='exposure time in usec')
+    parser.add_argument('--framerate', type=float, default=None, help='frame rate in Hz (default: the fastest allowed)')
+    parser.add_argument('--num-frames', type=int, default=200, help='number of frames per run')
+    parser.add_argument('--num-single', type=int, default=20, help='number of calls for the single-image ("one") path')
+    parser.add_argument('--display-interval', type=float, default=50.0, help='polling interval (ms) of the "live" path, as in the GUI')
+    parser.add_argument('--fastsave-suffix', default='raw', help='file type written by the "fastsave" path')
+    parser.add_argument('--chunk-data', action='store_true', help='enable chunk data during the runs')
+    parser.add_argument('--output', default='', help='JSON file to write the results to (default: stdout)')
+    parser.add_argument('--baseline', default='', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='fractional change counted as a regression')
+    return(parser.parse_args(argv))
+
+## ====================================================================================
+def latency_stats(latencies_ns):
+    """
+    Summarize a list of latencies (in ns) as percentiles in ms, or return None for an empty list.
+    """
+
+    if (len(latencies_ns) == 0):
+        return(None)
+
+    lat = array(latencies_ns, 'float64') / 1.0E6
+    (p50, p90, p99) = percentile(lat, (50, 90, 99))
+    return({'p50':float(p50), 'p90':float(p90), 'p99':float(p99), 'max':float(lat.max())})
+
+## ====================================================================================
+def get_clock_offset(fsl, nodemap):
+    """
+    Get the offset (in ns) that maps camera timestamps onto the time.perf_counter_ns() clock, or None if the camera
+    cannot latch its timestamp.
+    """
+
+    t0 = time.perf_counter_ns()
+    latched = fsl.latch_timestamp(nodemap)
+    t1 = time.perf_counter_ns()
+    if latched is None:
+        return(None)
+    return((t0 + t1) // 2 - latched)
+
+## ====================================================================================
+def get_roi(camctrl, roi_string):
+    """
+    Convert "full" or "HxW" into the roi argument of CameraControl.configure(), centering the region on the image.
+    Regions larger than the (binned) image are clipped to it.
+    """
+
+    if (roi_string == 'full'):
+        return('full')
+
+    (height, width) = [int(v) for v in roi_string.lower().split('x')]
+    height_max = camctrl.node('HeightMax').GetValue()
+    width_max = camctrl.node('WidthMax').GetValue()
+    (height, width) = (min(height, height_max), min(width, width_max))
+    return((height, width, (height_max - height) // 2, (width_max - width) // 2))
+
+## ====================================================================================
+def run_one(fsl, cam, nodemap, args, result):
+    (image_width, image_height) = fsl.get_image_size(nodemap)
+    out = zeros((image_height,image_width), 'uint16')
+    report = fsl.AcquisitionReport(args.num_single)
+    latencies = []
+
+    for i in range(args.num_single):
+        t0 = time.perf_counter_ns()
+        (image_data, ts) = fsl.acquire_one_image(cam, nodemap, out=out)
+        latencies.append(time.perf_counter_ns() - t0)
+        if image_data is not None:
+            report.add_frame(i, ts)
+
+    return(report, latencies)
+
+## ====================================================================================
+def run_num(fsl, cam, nodemap, args, result):
+    report = fsl.AcquisitionReport(args.num_frames)
+    fsl.acquire_num_images(cam, nodemap, args.num_frames, report=report, chunk_data=args.chunk_data)
+    return(report, [])
+
+## ====================================================================================
+def run_burst(fsl, cam, nodemap, args, result):
+    report = fsl.AcquisitionReport(args.num_frames)
+    fsl.acquire_burst(cam, nodemap, args.num_frames, report=report, chunk_data=args.chunk_data)
+    return(report, [])
+
+## ====================================================================================
+def run_fastsave(fsl, cam, nodemap, args, result):
+    report = fsl.AcquisitionReport(args.num_frames)
+    with tempfile.TemporaryDirectory() as file_dir:
+        fsl.video_fastsave(cam, nodemap, args.num_frames, file_dir=file_dir+os.sep, file_prefix='bench',
+                           file_suffix=args.fastsave_suffix, report=report)
+        result['bytes_written'] = sum(os.path.getsize(os.path.join(file_dir, f)) for f in os.listdir(file_dir))
+    return(report, [])
+
+## ====================================================================================
+def run_session(fsl, cam, nodemap, args, result):
+    ## The GetNextImage() loop of AcquisitionSession, handing over every frame.
+    (image_width, image_height) = fsl.get_image_size(nodemap)
+    out = zeros((image_height,image_width), 'uint16')
+    metadata = zeros(1, fsl.FRAME_METADATA_DTYPE)
+    offset = result['clock_offset_ns']
+    latencies = []
+
+    session = fsl.AcquisitionSession(cam, nodemap, chunk_data=args.chunk_data)
+    session.start()
+    try:
+        for i in range(args.num_frames):
+            (image_data, ts) = session.get_next_image(out=out, metadata=metadata)
+            t = time.perf_counter_ns()
+            if (image_data is not None) and (offset is not None):
+                latencies.append(t - (int(ts) + offset))
+    finally:
+        session.stop()
+
+    return(session.report, latencies)
+
+## ====================================================================================
+def run_live(fsl, cam, nodemap, args, result):
+    ## The live-view loop of the GUI: a FrameGrabber fills the ring at the sensor rate, while the display polls for the
+    ## newest frame on a timer. The latency is that of the frames actually displayed.
+    offset = result['clock_offset_ns']
+    latencies = []
+    num_displayed = 0
+
+    session = fsl.AcquisitionSession(cam, nodemap, chunk_data=args.chunk_data)
+    session.start()
+    grabber = fsl.FrameGrabber(session)
+    grabber.start()
+    try:
+        last_count = 0
+        while (last_count < args.num_frames) and grabber.is_running():
+            (image_data, ts, frame_count) = grabber.get_latest()
+            t = time.perf_counter_ns()
+            if image_data is None:
+                break
+            if (frame_count != last_count):
+                num_displayed += 1
+                if (offset is not None):
+                    latencies.append(t - (int(ts) + offset))
+                last_count = frame_count
+            time.sleep(args.display_interval / 1000.0)
+    finally:
+        grabber.stop()
+        session.stop()
+
+    result['num_displayed'] = num_displayed
+    return(session.report, latencies)
+
+## ====================================================================================
+def run_benchmark(fsl, cam, nodemap, path, args):
+    """
+    Run one acquisition path with the camera's current settings, and collect the measurements.
+
+    :return: The results of the run.
+    :rtype: dict
+    """
+
+    result = {'path':path}
+    result['clock_offset_ns'] = get_clock_offset(fsl, nodemap)
+    run_function = globals()['run_' + path]
+
+    tracemalloc.start()
+    cpu0 = time.process_time()
+    t0 = time.perf_counter()
+    (report, latencies) = run_function(fsl, cam, nodemap, args, result)
+    wall_time = time.perf_counter() - t0
+    cpu_time = time.process_time() - cpu0
+    (_, peak_memory) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    summary = report.summary()
+    result['frames'] = summary['delivered']
+    result['dropped'] = summary['dropped']
+    result['incomplete'] = summary['incomplete']
+    result['wall_s'] = wall_time
+    result['fps'] = summary['delivered'] / wall_time if (wall_time > 0.0) else 0.0
+    result['camera_fps'] = 1000.0 / summary['interval_mean_ms'] if (summary['interval_mean_ms'] > 0.0) else 0.0
+    result['latency_ms'] = latency_stats(latencies)
+    result['jitter_ms'] = summary['interval_std_ms']
+    result['cpu_s'] = cpu_time
+    result['cpu_load'] = cpu_time / wall_time if (wall_time > 0.0) else 0.0
+    result['peak_memory_mb'] = peak_memory / 2**20
+    del result['clock_offset_ns']
+
+    return(result)
+
+## ====================================================================================
+def result_key(result):
+    return((result['path'], result['pixel_format'], result['binning'], result['roi']))
+
+## ====================================================================================
+def compare_with_baseline(results, baseline_results, tolerance):
+    """
+    List the runs that are slower than the matching run in the baseline: fps lower, or median latency higher, by more
+    than the given fraction.
+
+    :return: A list of (key, message) tuples, one per regression.
+    :rtype: list
+    """
+
+    baseline = {result_key(r):r for r in baseline_results}
+    regressions = []
+
+    for result in results:
+        old = baseline.get(result_key(result))
+        if old is None:
+            continue
+        if (result['fps'] < (1.0 - tolerance) * old['fps']):
+            regressions.append((result_key(result), f'fps {old["fps"]:.1f} -> {result["fps"]:.1f}'))
+        if result['latency_ms'] and old['latency_ms']:
+            (new_p50, old_p50) = (result['latency_ms']['p50'], old['latency_ms']['p50'])
+            if (new_p50 > (1.0 + tolerance) * old_p50):
+                regressions.append((result_key(result), f'median latency {old_p50:.2f} -> {new_p50:.2f} ms'))
+
+    return(regressions)
+
+## ====================================================================================
+def print_header(file=sys.stderr):
+    print(f'{"path":<9} {"format":<8} {"bin":>3} {"size":>11} {"frames":>6} {"fps":>7} {"lat p50":>8} {"lat p99":>8} '
+          f'{"jitter":>7} {"cpu":>5} {"mem MB":>7} {"drop":>5} {"inc":>4}', file=file)
+    return
+
+## ====================================================================================
+def print_result(r, file=sys.stderr):
+    (p50, p99) = ('-', '-') if (r['latency_ms'] is None) else (f'{r["latency_ms"]["p50"]:.2f}', f'{r["latency_ms"]["p99"]:.2f}')
+    size = f'{r["height"]}x{r["width"]}'
+    print(f'{r["path"]:<9} {str(r["pixel_format"]):<8} {r["binning"]:>3} {size:>11} {r["frames"]:>6} {r["fps"]:>7.1f} '
+          f'{p50:>8} {p99:>8} {r["jitter_ms"]:>7.3f} {r["cpu_load"]:>5.2f} {r["peak_memory_mb"]:>7.1f} '
+          f'{r["dropped"]:>5} {r["incomplete"]:>4}', file=file)
+    return
+
+## ====================================================================================
+def main(argv=None):
+    args = parse_args(argv)
+
+    ## The library picks its PySpin module when it is imported.
+    if args.simulate:
+        os.environ['FLIR_SIMULATED_CAMERA'] = '1'
+    import flir_spin_library as fsl
+    PySpin = fsl.PySpin
+
+    system = PySpin.System.GetInstance()
+    cam_list = system.GetCameras()
+    if (cam_list.GetSize() <= args.camera):
+        print(f'Camera {args.camera} not found ({cam_list.GetSize()} cameras detected)')
+        cam_list.Clear()
+        system.ReleaseInstance()
+        return(2)
+
+    cam = cam_list.GetByIndex(args.camera)
+    camctrl = fsl.CameraControl(cam)
+    camctrl.init()
+    nodemap = cam.GetNodeMap()
+    results = []
+
+    try:
+        fsl.set_autogain_off(nodemap)
+        camctrl.set_exposure_time(args.exposure)
+        if args.chunk_data:
+            fsl.enable_chunk_data(nodemap)
+
+        node_serial = PySpin.CStringPtr(cam.GetTLDeviceNodeMap().GetNode('DeviceSerialNumber'))
+        node_model = PySpin.CStringPtr(cam.GetTLDeviceNodeMap().GetNode('DeviceModelName'))
+        environment = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': numpy.__version__,
+            'platform': platform.platform(),
+            'simulated': (PySpin.__name__ == 'simulated_pyspin'),
+            'camera_model': node_model.GetValue() if PySpin.IsReadable(node_model) else '',
+            'camera_serial': node_serial.GetValue() if PySpin.IsReadable(node_serial) else '',
+            'exposure_us': args.exposure,
+            'chunk_data': args.chunk_data,
+        }
+
+        print_header()
+        for (pixel_format, binning, roi_string) in itertools.product(args.pixel_formats, args.binning, args.rois):
+            ## Set the binning first, so that the region is worked out for the binned image.
+            if not camctrl.configure(pixel_format=pixel_format, binning=binning):
+                print(f'Skipping pixel format {pixel_format}, binning {binning}: the camera rejected the setting')
+                continue
+            if not camctrl.configure(roi=get_roi(camctrl, roi_string)):
+                print(f'Skipping image region {roi_string}: the camera rejected the setting')
+                continue
+            if args.framerate is not None:
+                fsl.set_framerate(nodemap, args.framerate)
+            (image_width, image_height) = fsl.get_image_size(nodemap)
+
+            for path in args.paths:
+                result = run_benchmark(fsl, cam, nodemap, path, args)
+                result['pixel_format'] = camctrl.state['pixel_format']
+                result['binning'] = binning
+                result['roi'] = roi_string
+                (result['height'], result['width']) = (image_height, image_width)
+                result['framerate_setting'] = fsl.get_framerate(nodemap)
+                results.append(result)
+                print_result(result)
+    finally:
+        if args.chunk_data:
+            fsl.disable_chunk_data(nodemap)
+        cam.DeInit()
+        del cam
+        cam_list.Clear()
+        system.ReleaseInstance()
+
+    output = json.dumps({'environment':environment, 'results':results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline_results = json.load(f)['results']
+        regressions = compare_with_baseline(results, baseline_results, args.tolerance)
+        for (key, message) in regressions:
+            print(f'REGRESSION {key}: {message}', file=sys.stderr)
+        if regressions:
+            status = 1
+
+    return(status)
+
+## ====================================================================================
+if __name__ == '__main__':
+    sys.exit(main())
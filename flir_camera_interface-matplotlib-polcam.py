@@ -953,12 +953,13 @@ class MainWindow(QMainWindow):
         if initial_state_is_live:
             self.live_checkbox.setChecked(False)
 
-        result_str = fsl.video_fastsave(self.camera, self.nodemap, nframes, file_dir, file_prefix, file_suffix, start_num=self.file_counter, verbose=True)
-        if result_str:
-            result_str += 'Video save done.\n'
-            self.outputbox.appendPlainText(result_str)
+        log = fsl.video_fastsave(self.camera, self.nodemap, nframes, file_dir, file_prefix, file_suffix, start_num=self.file_counter)
+        if log is not None:
+            summary = fsl.summarize_recording_log(log, single_file=(file_suffix == fsl.RAW_RECORDING_SUFFIX))
+            self.outputbox.appendPlainText(f'Video save done: {summary}')
             
-        self.file_counter += nframes
+        ## A single-file recording uses only one file number.
+        self.file_counter += 1 if (file_suffix == fsl.RAW_RECORDING_SUFFIX) else nframes
 
         if initial_state_is_live:
             self.live_checkbox.setChecked(True)
@@ -8,13 +8,13 @@
 ##            self.outputbox.appendPlainText(err_msg)
 ## 5. Make another version of the interface based on two cameras operating simultaneously. Nice for UV-VIS or VIS-NIR dual camera use.
 
-from PyQt5.QtCore import QTimer, Qt, QRect
+from PyQt5.QtCore import QTimer, Qt, QRect, pyqtSignal
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QKeySequence, QIcon, QColor, QFont, QImage, QPixmap, QPainter
 from PyQt5.QtWidgets import (QApplication, QButtonGroup, QMainWindow, QSizePolicy, QWidget, QVBoxLayout, QMenuBar, QStatusBar,
                              QHBoxLayout, QAction, QDialog, QFrame, QFileDialog, QGroupBox, QRadioButton, QGridLayout,
                              QTabWidget, QLabel, QCheckBox, QSpinBox, QPlainTextEdit, QMessageBox, QErrorMessage,
-                             QDoubleSpinBox, QDialogButtonBox, QLineEdit, QLabel, QPushButton, QFormLayout)
+                             QDoubleSpinBox, QDialogButtonBox, QLineEdit, QLabel, QPushButton, QFormLayout, QComboBox)
 
 ## import the Qt5Agg figure canvas object, that binds figures to the Qt5Agg backend. It also inherits from QWidget.
 import matplotlib
@@ -32,7 +32,8 @@ mpl.rcParams['image.cmap'] = 'gray'
 import numpy
 from numpy import (pi, array, asarray, linspace, indices, amin, amax, sqrt, exp, mean, std, nan, NaN,
                    logical_and, zeros, uint8, mgrid, ones, uint32, load, float32, where, arange, uint16,
-                   logical_or, log, savez, empty, reshape, ndim, cos, rint, log2, sort, unique)
+                   logical_or, log, savez, empty, reshape, ndim, cos, rint, log2, sort, unique, moveaxis,
+                   floor, floor_divide, greater_equal, subtract, multiply, true_divide, copyto)
 numpy.seterr(all='raise')
 numpy.seterr(invalid='ignore')
 
@@ -44,12 +45,16 @@ except:
     from imageio import imread, imsave
 
 try:
-    import PySpin
+    if os.environ.get('FLIR_SIMULATED_CAMERA', '0') not in ('', '0'):
+        import simulated_pyspin as PySpin
+    else:
+        import PySpin
     import flir_spin_library as fsl
 except:
     msg = 'Cannot find the PySpin library. Did you maybe forget to activate the "flir" environment?'
     print(msg)
     raise ValueError(msg)
+from flir_raw_recording import RawRecordingWriter, RawRecordingReader, RAW_RECORDING_SUFFIX
 
 this_folder = os.path.dirname(os.path.realpath(__file__))
 print('this_folder=', this_folder)
@@ -121,6 +126,9 @@ class CustomDialog(QDialog):
 
 ## ===========================================================================================================
 class MainWindow(QMainWindow):
+    ## Emitted (from the camera's event dispatcher thread) when a new frame is ready for display, if image events are used.
+    new_frame_signal = pyqtSignal()
+
     def __init__(self, gui_height=None, gui_width=None, parent=None):
         super(MainWindow, self).__init__(parent)
         #self.showMaximized()
@@ -139,6 +147,13 @@ class MainWindow(QMainWindow):
         self.exposure = 10000
         self.binning = 1
         self.cropping = 0
+        self.pixel_format = 'Mono16'                ## 'Mono12p' halves the link bandwidth; frames are unpacked to the unbinned Mono16 scale
+        self.stream_buffer_mode = 'NewestOnly'      ## stream buffer handling mode: 'NewestOnly' gives the lowest live-view latency
+        self.stream_buffer_count = 0                ## number of stream buffers (0 = let the driver choose)
+        self.use_image_events = False               ## push frames to the display on arrival, instead of polling on a timer
+        self.frame_signal_pending = False           ## whether a new_frame_signal has been emitted but not yet handled
+        self.scan_trigger = False                   ## whether scan frames are being taken by software trigger
+        self.metadata = None                        ## the FRAME_METADATA_DTYPE records of the last capture, if it has them
         self.cam_bitdepth = 12 + uint16(log2(self.binning**2))      ## camera bit depth
         self.cam_saturation_level = (2**self.cam_bitdepth) - 1 - 7  ## why do we need '-7' here?!
         self.img_has_saturation = False
@@ -149,6 +164,8 @@ class MainWindow(QMainWindow):
         self.ncameras = 0           ## Number of cameras connected here (normally 0 or 1)
         self.has_fpp = False        ## Is a projector activated for fringe projection profilometry (FPP)?
         self.has_lctf = False       ## Is a liquid-crystal tunable filter (LCTF) activated?
+        self.lctf_settle_time = 0.05                ## the time (in sec) the LCTF takes to switch to a new wavelength
+        self.lctf_move_time = 0.0                   ## the time.perf_counter() value at the last wavelength change
         self.has_motor = False      ## Is the Thorlabs rotational motor activated?
 
         if (self.binning > 1):
@@ -158,6 +175,9 @@ class MainWindow(QMainWindow):
         self.tone_mapping_scale = uint16(pow(2.0, self.cam_bitdepth - 8))
         #self.tone_mapping_scale = 16
         self.img8bit = None         ## the 8-bit (tone-mapped) version of the raw image
+        self.saturated = None       ## the saturated-pixel flags of the current image (boolean)
+        self.image = None           ## the current image; it holds one reference to its buffer in self.frame_pool
+        self.frame_pool = fsl.FramePool()   ## reusable image buffers, so that live view does not allocate a new image per frame
 
         ## Define the image scale for each image -- we will need these for the manual controls on the colorbars of each image.
         self.image_vmin_str = 'Min'
@@ -357,6 +377,37 @@ class MainWindow(QMainWindow):
         #self.cropping_hlt.addWidget(self.cropping_label)
         #self.cropping_hlt.addWidget(self.cropping_spinbox)         ## disabled until I get the function working
 
+        self.pixel_format_hlt = QHBoxLayout()
+        self.pixel_format_label = QLabel('Pixel format:')
+        self.pixel_format_combobox = QComboBox()
+        self.pixel_format_combobox.addItems(['Mono16', 'Mono12p'])
+        self.pixel_format_combobox.setCurrentText(self.pixel_format)
+        self.pixel_format_combobox.currentTextChanged.connect(self.pixelFormatChange)
+        if (self.ncameras == 0):
+            self.pixel_format_combobox.setEnabled(False)
+            self.pixel_format_label.setStyleSheet('color: rgba(125, 125, 125, 1);')
+        self.pixel_format_hlt.addWidget(self.pixel_format_label)
+        self.pixel_format_hlt.addWidget(self.pixel_format_combobox)
+
+        self.stream_buffer_hlt = QHBoxLayout()
+        self.stream_buffer_label = QLabel('Stream buffers:')
+        self.stream_buffer_spinbox = QSpinBox()
+        self.stream_buffer_spinbox.setRange(0,1000)
+        self.stream_buffer_spinbox.setSpecialValueText('Auto')     ## a value of 0 lets the driver choose the buffer count
+        self.stream_buffer_spinbox.setValue(self.stream_buffer_count)
+        self.stream_buffer_spinbox.valueChanged.connect(self.streamBufferChange)
+        self.stream_buffer_combobox = QComboBox()
+        self.stream_buffer_combobox.addItems(['NewestOnly', 'NewestFirst', 'OldestFirst', 'OldestFirstOverwrite'])
+        self.stream_buffer_combobox.setCurrentText(self.stream_buffer_mode)
+        self.stream_buffer_combobox.currentTextChanged.connect(self.streamBufferChange)
+        if (self.ncameras == 0):
+            self.stream_buffer_spinbox.setEnabled(False)
+            self.stream_buffer_combobox.setEnabled(False)
+            self.stream_buffer_label.setStyleSheet('color: rgba(125, 125, 125, 1);')
+        self.stream_buffer_hlt.addWidget(self.stream_buffer_label)
+        self.stream_buffer_hlt.addWidget(self.stream_buffer_spinbox)
+        self.stream_buffer_hlt.addWidget(self.stream_buffer_combobox)
+
         self.fpp_hlt = QHBoxLayout()
         self.activate_fpp_button = QPushButton('Activate FPP')
         self.activate_fpp_button.clicked.connect(self.activate_projector)
@@ -404,6 +455,8 @@ class MainWindow(QMainWindow):
         self.vlt2.addLayout(self.cam_navgs_hlt)
         self.vlt2.addLayout(self.binning_hlt)
         self.vlt2.addLayout(self.cropping_hlt)
+        self.vlt2.addLayout(self.pixel_format_hlt)
+        self.vlt2.addLayout(self.stream_buffer_hlt)
         self.vlt2.addLayout(self.autoexp_hlt)
         self.vlt2.addLayout(self.fpp_hlt)
         self.vlt2.addLayout(self.lctf_hlt)
@@ -456,6 +509,10 @@ class MainWindow(QMainWindow):
     def closeEvent(self, event=None):
         ## Release the camera object.
         if (self.ncameras > 0):
+            self.stop_stream()
+            self.session.disable_image_events()
+            self.session.disable_device_events()
+
             ## Release reference to camera. We cannot rely on pointer objects being automatically cleaned up
             ## when going out of scope. The usage of "del" is preferred to assigning the variable to None.
             del self.camera
@@ -503,10 +560,27 @@ class MainWindow(QMainWindow):
 
     ## ===================================
     def saturationCheckChange(self, state):
-        self.saturated = (self.image >= self.cam_saturation_level)
+        self.update_saturation()
+        return
+
+    ## ===================================
+    def update_saturation(self):
+        ## Flag the saturated pixels, reusing the flag array from the previous frame.
+        if (self.saturated is None) or (self.saturated.shape != self.image.shape):
+            self.saturated = zeros(self.image.shape, 'bool')
+        greater_equal(self.image, self.cam_saturation_level, out=self.saturated)
         self.img_has_saturation = self.saturated.any()
         return
 
+    ## ===================================
+    def take_image(self, img):
+        ## Make "img" the current image. The caller hands over its reference to the image's pool buffer (if the image came
+        ## from self.frame_pool), and the reference held by the previous image is released.
+        if img is not self.image:
+            self.frame_pool.release(self.image)
+        self.image = img
+        return
+
     ## ===================================
     def initialize_camera(self):
         try:
@@ -525,8 +599,10 @@ class MainWindow(QMainWindow):
 
         self.camera = self.camera_list[0]
         self.nodemap_tldevice = self.camera.GetTLDeviceNodeMap()
-        self.camera.Init()                              ## Initialize the camera
+        self.camctrl = fsl.CameraControl(self.camera)   ## caches the nodes used in tight loops (exposure, binning)
+        self.camctrl.init()                             ## Initialize the camera
         self.nodemap = self.camera.GetNodeMap()         ## Retrieve the camera's GenICam nodemap
+        self.nodemap_tlstream = self.camera.GetTLStreamNodeMap()
 
         ## Initialize the camera to start up with full image size.
         fsl.set_full_imagesize(self.nodemap)
@@ -541,8 +617,8 @@ class MainWindow(QMainWindow):
         if not fsl.set_exposure_compensation_off(self.nodemap, verbose=False):
             pass
 
-        if not fsl.set_pixel_format(self.nodemap, 'Mono16', verbose=False):
-            self.outputbox.appendPlainText(f'Failed to set the pixel format to Mono16!')
+        if not fsl.set_pixel_format(self.nodemap, self.pixel_format, verbose=False):
+            self.outputbox.appendPlainText(f'Failed to set the pixel format to {self.pixel_format}!')
 
         if not fsl.set_binning(self.nodemap, self.binning, verbose=False):
             self.outputbox.appendPlainText(f'Failed to set the pixel binning to {self.binning}!')
@@ -569,10 +645,62 @@ class MainWindow(QMainWindow):
         ## Make sure the gamma setting is turned off.
         #fsl.disable_gamma(self.nodemap)
 
+        if not fsl.set_stream_buffer_handling_mode(self.nodemap_tlstream, self.stream_buffer_mode, verbose=False):
+            self.outputbox.appendPlainText(f'Failed to set the stream buffer handling mode to {self.stream_buffer_mode}!')
+        fsl.set_stream_buffer_count(self.nodemap_tlstream, self.stream_buffer_count, verbose=False)
+
+        ## Have the camera send each frame's exposure time, gain, frame ID and timestamp along with the pixels.
+        self.has_chunk_data = fsl.enable_chunk_data(self.nodemap, verbose=False)
+        if not self.has_chunk_data:
+            self.outputbox.appendPlainText(f'Chunk data is not available. Per-frame exposure times will not be recorded.')
+
+        ## Start the acquisition stream once, and keep it running until a stream-locked setting changes or the GUI closes.
+        ## The grabber thread pulls frames off the stream into a ring buffer, so the GUI never waits on the camera.
+        self.session = fsl.AcquisitionSession(self.camera, self.nodemap, chunk_data=self.has_chunk_data)
+        self.grabber = None
+        self.display_subscription = None
+        if self.use_image_events and (self.session.enable_image_events() is not None):
+            self.new_frame_signal.connect(self.newFrameReady)
+        else:
+            self.use_image_events = False
+        self.start_stream()
+
         self.acquire_new_image()
 
         return
 
+    ## ===================================
+    def start_stream(self):
+        if not self.session.start():
+            self.outputbox.appendPlainText(f'Failed to start the acquisition stream!')
+            return(False)
+
+        self.grabber = fsl.FrameGrabber(self.session)
+        self.grabber.start()
+
+        ## Pooled buffers of the previous image size will not be used again.
+        if (self.image is not None) and (self.image.shape != self.grabber.ring.shape[1:]):
+            self.frame_pool.clear()
+
+        ## With image events, the display is told about each new frame as it arrives (skipping any that arrive while the
+        ## display is busy), rather than polling for it.
+        if self.use_image_events:
+            self.display_subscription = self.session.event_handler.subscribe(self.emit_new_frame_signal, latest_only=True)
+
+        return(True)
+
+    ## ===================================
+    def stop_stream(self):
+        ## The grabber has to be stopped before the stream it is pulling from.
+        if self.display_subscription is not None:
+            self.session.event_handler.unsubscribe(self.display_subscription)
+            self.display_subscription = None
+        if self.grabber is not None:
+            self.grabber.stop()
+            self.grabber = None
+        self.session.stop()
+        return
+
     ## ===================================
     def update_image_params(self):
         if self.image is None:
@@ -583,28 +711,31 @@ class MainWindow(QMainWindow):
 
         ## Since we have a new image, we need to update the saturation flags.
         if self.saturation_checkbox.isChecked():
-            self.saturated = (self.image >= self.cam_saturation_level)
-            self.img_has_saturation = self.saturated.any()
+            self.update_saturation()
 
         ## Make an 8-bit image object for display purposes. Set saturated pixels to red.
-        if (self.img8bit is None) or (self.img8bit.shape != self.image.shape):
+        if (self.img8bit is None) or (self.img8bit.shape[:2] != self.image.shape):
             self.img8bit = zeros((self.Nx,self.Ny,3), 'uint8')
 
-        if not self.autoscale_brightness:
-            self.img8bit[:,:,0] = self.image // self.tone_mapping_scale
-            self.img8bit[:,:,1] = self.img8bit[:,:,0]
-            self.img8bit[:,:,2] = self.img8bit[:,:,0]
-        else:
-            scaled_image = self.image - amin(self.image)
-            scaled_image = 255.0 * scaled_image / amax(self.image)
-            self.img8bit[:,:,0] = uint8(scaled_image)
-            self.img8bit[:,:,1] = self.img8bit[:,:,0]
-            self.img8bit[:,:,2] = self.img8bit[:,:,0]
+        ## The conversions write into pooled scratch images and the existing 8-bit image, rather than allocating new arrays.
+        ## (Copying one channel of img8bit into another would make a temporary copy, so the gray image is kept separately.)
+        with self.frame_pool.frame(self.image.shape, 'uint8') as gray:
+            if not self.autoscale_brightness:
+                floor_divide(self.image, self.tone_mapping_scale, out=gray, casting='unsafe')
+            else:
+                with self.frame_pool.frame(self.image.shape, 'float64') as scaled_image:
+                    subtract(self.image, amin(self.image), out=scaled_image)
+                    multiply(scaled_image, 255.0, out=scaled_image)
+                    true_divide(scaled_image, amax(self.image), out=scaled_image)
+                    copyto(gray, scaled_image, casting='unsafe')
+            self.img8bit[:,:,0] = gray
+            self.img8bit[:,:,1] = gray
+            self.img8bit[:,:,2] = gray
 
         if self.saturation_checkbox.isChecked() and self.img_has_saturation:
-            self.img8bit[self.saturated,0] = 255
-            self.img8bit[self.saturated,1] = 0
-            self.img8bit[self.saturated,2] = 0
+            copyto(self.img8bit[:,:,0], 255, where=self.saturated)
+            copyto(self.img8bit[:,:,1], 0, where=self.saturated)
+            copyto(self.img8bit[:,:,2], 0, where=self.saturated)
 
         self.qimg = QImage(self.img8bit, self.Ny, self.Nx, QImage.Format_RGB888)
         self.pixmap = QPixmap.fromImage(self.qimg)
@@ -619,22 +750,40 @@ class MainWindow(QMainWindow):
     ## ===================================
     def acquire_new_image(self):
         if (self.ncameras > 0):
-            img = self.capture_image(1)
+            img = self.capture_image(1, latest=True)
             if img is None:
                 self.outputbox.appendPlainText(f'Failed to collect an image!')
                 return
             else:
                 self.image = img
 
-            self.statusbar.showMessage(f'image size: img(Nx,Ny) = ({self.Nx},{self.Ny}),     image_counter = {self.image_counter}')
+            report = self.session.report
+            self.statusbar.showMessage(f'image size: img(Nx,Ny) = ({self.Nx},{self.Ny}),     image_counter = {self.image_counter},     '
+                                       f'dropped frames = {report.num_dropped},     incomplete frames = {report.num_incomplete}')
             self.update_image_params()
 
-        if self.live_checkbox.isChecked() and (self.ncameras > 0):
+        if self.live_checkbox.isChecked() and (self.ncameras > 0) and not self.use_image_events:
             ## Emit a signal to repeat this action after some ms defined by self.timer_delay.
             QTimer.singleShot(self.timer_delay, self.acquire_new_image)
 
         return
 
+    ## ===================================
+    def emit_new_frame_signal(self, image, ts, metadata):
+        ## Called from the event dispatcher thread. Only one signal is kept in flight, so that frames are not queued up
+        ## behind a slow display.
+        if not self.frame_signal_pending:
+            self.frame_signal_pending = True
+            self.new_frame_signal.emit()
+        return
+
+    ## ===================================
+    def newFrameReady(self):
+        self.frame_signal_pending = False
+        if self.live_checkbox.isChecked():
+            self.acquire_new_image()
+        return
+
     ## ===================================
     def frameRateChange(self):
         if (self.ncameras == 0) or (self.framerate_spinbox.value() == 0):
@@ -647,6 +796,7 @@ class MainWindow(QMainWindow):
             return
         else:
             fsl.set_framerate(self.nodemap, new_framerate)
+            self.session.update_grab_timeout()
             self.framerate = new_framerate
             self.outputbox.appendPlainText(f'Framerate set to {new_framerate} Hz')
 
@@ -679,7 +829,8 @@ class MainWindow(QMainWindow):
 
         self.exposure = new_exposure
         self.exposure_spinbox.setValue(new_exposure)
-        fsl.set_exposure_time(self.nodemap, new_exposure)
+        self.camctrl.set_exposure_time(new_exposure)
+        self.session.update_grab_timeout()
         self.outputbox.appendPlainText(f'Setting exposure = {self.exposure} usec')
 
         return
@@ -706,15 +857,15 @@ class MainWindow(QMainWindow):
         suffix = os.path.splitext(filename)[1]
 
         if (suffix == 'npz'):
-            self.image = load(filename)['image']
+            self.take_image(load(filename)['image'])
         else:
             import_image = imread(filename)
             if (ndim(import_image) == 3):
-                self.image = float32(import_image[:,:,0]) + float32(import_image[:,:,0]) + float32(import_image[:,:,0])[::-1,:]
+                self.take_image(float32(import_image[:,:,0]) + float32(import_image[:,:,0]) + float32(import_image[:,:,0])[::-1,:])
             elif (ndim(import_image) != 2):
                 raise ImportError('Image format does not seem to be compatible.')
             else:
-                self.image = import_image[::-1,:]
+                self.take_image(import_image[::-1,:])
 
             self.update_image_params()
 
@@ -754,46 +905,78 @@ class MainWindow(QMainWindow):
         return
 
     ## ===================================
-    def capture_image(self, nframes=1, verbose=False):
-        if not hasattr(self, 'camera'):
+    def capture_image(self, nframes=1, verbose=False, latest=False, next_move=None, after=None):
+        ## If "latest" is True, then return the newest frame already in the grabber's ring (for live display). Otherwise,
+        ## wait for frames that arrive after this call, or after the grabber frame count "after" (for single-frame
+        ## captures that must skip the frames still in flight when a setting changed; see FrameGrabber.wait_for_exposure()).
+        ## "next_move" is the next move of a scan (for single-frame captures), started as early as is safe; see wait_for_frames().
+        if not hasattr(self, 'camera') or (self.grabber is None):
             return(None)
 
         ## "scale" is used to divide the 16-bit image value by 16 to remove the 4 extra bits going from 16-bit to 12-bit data.
-        ## However, if binning is turned on, then the sensor will deliver more than 12 bits.
-        scale = 16 / (self.binning**2)
+        ## However, if binning is turned on, then a Mono16 image carries more than 12 bits (see update_bit_depth()).
+        scale = 2.0**(16 - int(self.cam_bitdepth))
+
+        ## The images are computed into buffers from self.frame_pool, so that steady-state capture reuses the same few
+        ## arrays. The returned image is self.image, which owns the buffer until the next capture replaces it; a caller
+        ## that keeps it longer should self.frame_pool.retain() it. The caller owns a returned video, and should
+        ## self.frame_pool.release() it when done.
+        pool = self.frame_pool
 
         if (nframes == 1):
-            if (self.navgs == 1):
-                (self.image, self.ts) = fsl.acquire_one_image(self.camera, self.nodemap)
-                if self.image is None:
-                    return(None)
-                self.image = self.image // scale
-            elif (self.navgs > 1):
-                (img_set, ts_set) = fsl.acquire_num_images(self.camera, self.nodemap, self.navgs)
-                if img_set is None:
+            if (self.navgs == 1) and latest:
+                ## Live frames do not keep per-frame metadata.
+                self.metadata = None
+                (img, self.ts, _) = self.grabber.get_latest()
+                if img is None:
                     return(None)
-                self.image = uint32(mean(img_set, axis=2)) // scale
+                image = pool.acquire(img.shape, 'float64')
+                floor_divide(img, scale, out=image)
+            else:
+                ## The per-frame metadata (camera timestamp, exposure time, gain) of the captured frames is kept in self.metadata.
+                self.metadata = zeros(self.navgs, fsl.FRAME_METADATA_DTYPE)
+                with pool.frame((self.navgs,) + self.grabber.ring.shape[1:], 'uint16') as stack:
+                    (img_set, ts_set) = self.wait_for_frames(self.navgs, out=stack, next_move=next_move, after=after)
+                    if img_set is None:
+                        self.metadata = None
+                        return(None)
+                    image = self.average_frames(stack, scale)
                 self.ts = ts_set[0]
+            self.take_image(image)
             return(self.image)
         elif (nframes > 1):
             if (self.navgs == 1):
-                video = zeros((self.Nx,self.Ny,nframes), 'uint16')
-                for n in range(nframes):
-                    (self.image, self.ts) = fsl.acquire_one_image(self.camera, self.nodemap)
-                    if self.image is None:
-                        return(None)
-                    video[:,:,n] = self.image // scale
-            elif (self.navgs > 1):
-                ## Save N frames and average them together to each one frame of the video.
-                video = zeros((self.Nx,self.Ny,nframes), 'uint16')
-
-                for n in range(nframes):
-                    (img_set, ts_set) = fsl.acquire_num_images(self.camera, self.nodemap, self.navgs)
+                ## Short clips are taken as a MultiFrame burst, so that the frames are back-to-back at the full frame rate.
+                (image_width, image_height) = fsl.get_image_size(self.nodemap)
+                with pool.frame((nframes,image_height,image_width), 'uint16') as stack:
+                    (img_set, ts_set) = self.capture_burst(nframes, out=stack)
                     if img_set is None:
                         return(None)
-                    self.image = uint32(mean(img_set, axis=2)) // scale
-                    self.ts = ts_set[0]
-                    video[:,:,n] = self.image
+                    video = pool.acquire(img_set.shape, 'uint16')
+                    floor_divide(img_set, scale, out=video, casting='unsafe')
+                ## The current image is a view of the video, so it holds its own reference to the video's buffer.
+                pool.retain(video)
+                self.take_image(video[:,:,-1])
+                self.ts = ts_set[-1]
+            elif (self.navgs > 1):
+                ## Save N frames and average them together to each one frame of the video. Each video frame is given the
+                ## metadata of the first of the frames averaged into it.
+                video = pool.acquire((self.Nx,self.Ny,nframes), 'uint16')
+                video_metadata = zeros(nframes, fsl.FRAME_METADATA_DTYPE)
+                stack_metadata = zeros(self.navgs, fsl.FRAME_METADATA_DTYPE)
+
+                with pool.frame((self.navgs,) + self.grabber.ring.shape[1:], 'uint16') as stack:
+                    for n in range(nframes):
+                        (img_set, ts_set) = self.grabber.get_next_frames(self.navgs, out=stack, metadata=stack_metadata)
+                        if img_set is None:
+                            pool.release(video)
+                            self.metadata = None
+                            return(None)
+                        self.take_image(self.average_frames(stack, scale))
+                        self.ts = ts_set[0]
+                        video[:,:,n] = self.image
+                        video_metadata[n] = stack_metadata[0]
+                self.metadata = video_metadata
 
             return(video)
         else:
@@ -801,6 +984,115 @@ class MainWindow(QMainWindow):
 
         return(None)
 
+    ## ===================================
+    def average_frames(self, stack, scale):
+        ## Average a (navgs,Nx,Ny) stack of frames into a pooled image, truncated to an integer and divided by "scale".
+        image = self.frame_pool.acquire(stack.shape[1:], 'float64')
+        if (stack.shape[0] == 1):
+            floor_divide(stack[0], scale, out=image)
+        else:
+            mean(stack, axis=0, out=image)
+            floor(image, out=image)
+            floor_divide(image, scale, out=image)
+        return(image)
+
+    ## ===================================
+    def wait_for_frames(self, nframes, out=None, next_move=None, after=None):
+        ## Wait for the next frames (after the grabber frame count "after", if given), filling in self.metadata, and copy
+        ## them into "out" (a (nframes,Nx,Ny) stack) if given.
+        ## During a triggered scan, each frame is taken by a software trigger and "next_move" is started as soon as the
+        ## last exposure has ended, so that it overlaps the readout. Otherwise, "next_move" is started once the frames
+        ## have arrived.
+        if not self.scan_trigger:
+            result = self.grabber.get_next_frames(nframes, out=out, metadata=self.metadata, after=after)
+            if (next_move is not None) and (result[0] is not None):
+                next_move()
+            return(result)
+
+        img_stack = zeros((nframes,) + self.grabber.ring.shape[1:], 'uint16') if (out is None) else out
+        ts_set = zeros(nframes, 'uint64')
+        device_events = self.session.device_events
+
+        for i in range(nframes):
+            overlap = (i == nframes - 1) and (next_move is not None) and (device_events is not None)
+            frame_count = self.grabber.frame_count
+            if overlap:
+                event_count = device_events.get_count('EventExposureEnd')
+
+            if not self.session.fire_software_trigger():
+                return(None, 0)
+
+            if overlap:
+                if not device_events.wait_for_event('EventExposureEnd', event_count, self.session.grab_timeout / 1000.0):
+                    self.outputbox.appendPlainText(f'Timed out waiting for the end of the exposure!')
+                next_move()
+
+            (img_set, ts) = self.grabber.get_next_frames(1, out=img_stack[i:i+1], metadata=self.metadata[i:i+1], after=frame_count)
+            if img_set is None:
+                return(None, 0)
+            ts_set[i] = ts[0]
+
+        if (next_move is not None) and (device_events is None):
+            next_move()
+
+        return(moveaxis(img_stack, 0, -1), ts_set)
+
+    ## ===================================
+    def begin_triggered_scan(self):
+        ## Take scan frames by software trigger, so that each frame is exposed only after the previous move has finished.
+        ## The camera's ExposureEnd event then lets the next move start while the sensor is still reading out.
+        self.stop_stream()
+        if self.session.device_events is None:
+            if self.session.enable_device_events(('ExposureEnd',)) is None:
+                self.outputbox.appendPlainText(f'ExposureEnd events are not available; scan moves will wait for each frame.')
+        self.scan_trigger = fsl.configure_trigger(self.nodemap, source='Software')
+        self.start_stream()
+        return(self.scan_trigger)
+
+    ## ===================================
+    def end_triggered_scan(self):
+        self.stop_stream()
+        self.session.disable_device_events()
+        fsl.set_trigger_mode(self.nodemap, False)
+        self.scan_trigger = False
+        self.start_stream()
+        return
+
+    ## ===================================
+    def begin_pull_acquisition(self):
+        ## The library's own acquisition loops (acquire_burst(), video_fastsave()) retrieve frames with GetNextImage(),
+        ## which gets nothing while an image event handler is registered. So stop the stream and unregister the handler.
+        self.stop_stream()
+        if self.use_image_events:
+            self.session.disable_image_events()
+        return
+
+    ## ===================================
+    def end_pull_acquisition(self):
+        ## Undo begin_pull_acquisition(). If the image event handler cannot be registered again, then fall back to polling.
+        if self.use_image_events and (self.session.enable_image_events() is None):
+            self.outputbox.appendPlainText(f'Failed to re-enable image events; the display will poll for frames.')
+            self.use_image_events = False
+        self.start_stream()
+        return
+
+    ## ===================================
+    def capture_burst(self, nframes, out=None):
+        ## A burst needs the camera in MultiFrame mode, so the live stream is paused while the burst is drained.
+        self.begin_pull_acquisition()
+        self.metadata = zeros(nframes, fsl.FRAME_METADATA_DTYPE)
+        try:
+            (img_set, ts_set) = fsl.acquire_burst(self.camera, self.nodemap, nframes, out=out, metadata=self.metadata,
+                                                  chunk_data=self.has_chunk_data)
+        finally:
+            self.end_pull_acquisition()
+
+        if img_set is not None:
+            self.metadata = self.metadata[:img_set.shape[2]]
+        else:
+            self.metadata = None
+        return(img_set, ts_set)
+
     ## ===================================
     def saveDirChanged(self, text):
         ## If the basename of the file to save has changed, then reset the file counter.
@@ -853,6 +1145,23 @@ class MainWindow(QMainWindow):
                 vid_filename = file_dir + 'video.npz'
                 savez(vid_filename, video=video)
                 self.outputbox.appendPlainText(f'Saved video to {vid_filename}')
+            elif (file_suffix == RAW_RECORDING_SUFFIX):
+                ## Write the whole video into one file, with the frame IDs and timestamps (when the capture recorded them)
+                ## in the file's index.
+                vid_filename = f'{file_dir}{file_prefix}_{self.file_counter:05}.{file_suffix}'
+                nframes = video.shape[2]
+                has_metadata = (self.metadata is not None) and (len(self.metadata) == nframes)
+                try:
+                    with RawRecordingWriter(vid_filename, self.Nx, self.Ny, 'uint16', self.pixel_format, self.binning, nframes) as recording:
+                        for n in range(nframes):
+                            if has_metadata:
+                                recording.write_frame(video[:,:,n], self.metadata[n]['frame_id'], self.metadata[n]['timestamp'])
+                            else:
+                                recording.write_frame(video[:,:,n])
+                    self.file_counter += 1
+                    self.outputbox.appendPlainText(f'Saved video to {vid_filename}')
+                except (OSError, ValueError) as ex:
+                    self.outputbox.appendPlainText(f'Failed to save video to {vid_filename}: {ex}')
             else:
                 ## Note: the "file_counter" is what we use to keep track of all images saved so far in this session, so that we don't
                 ## overwrite previous files. The "fileSave()" function keep track of incrementing this value each time it is called.
@@ -861,6 +1170,7 @@ class MainWindow(QMainWindow):
                     filename = f'{file_dir}{file_prefix}_{self.file_counter:05}.{file_suffix}'
                     self.fileSave(filename, scale=16)
                 self.outputbox.appendPlainText('Video save done.\n')
+            self.frame_pool.release(video)
 
             if initial_state_is_live:
                 self.live_checkbox.setChecked(True)
@@ -894,12 +1204,27 @@ class MainWindow(QMainWindow):
         if initial_state_is_live:
             self.live_checkbox.setChecked(False)
 
-        result_str = fsl.video_fastsave(self.camera, self.nodemap, nframes, file_dir, file_prefix, file_suffix, start_num=self.file_counter, verbose=True)
-        if result_str:
-            result_str += 'Video save done.\n'
-            self.outputbox.appendPlainText(result_str)
+        ## video_fastsave() runs its own acquisition, so the live stream has to be stopped while it runs.
+        self.begin_pull_acquisition()
+        report = fsl.AcquisitionReport(nframes)
+        writer_report = fsl.WriterReport()
+        try:
+            log = fsl.video_fastsave(self.camera, self.nodemap, nframes, file_dir, file_prefix, file_suffix, start_num=self.file_counter,
+                                     report=report, writer_report=writer_report)
+        finally:
+            self.end_pull_acquisition()
+        if log is not None:
+            ## The per-frame log is in the sidecar file; only its summary goes to the outputbox.
+            summary = fsl.summarize_recording_log(log, single_file=(file_suffix == RAW_RECORDING_SUFFIX))
+            self.outputbox.appendPlainText(f'Video save done: {summary}')
+            self.outputbox.appendPlainText(f'Frame log saved to "{file_dir}{file_prefix}_{self.file_counter:05}_log.npy"')
+        else:
+            self.outputbox.appendPlainText(f'Video save failed!')
+        self.outputbox.appendPlainText(f'Recording report: {report}')
+        self.outputbox.appendPlainText(f'Writer report: {writer_report}')
 
-        self.file_counter += nframes
+        ## A single-file recording uses only one file number.
+        self.file_counter += 1 if (file_suffix == RAW_RECORDING_SUFFIX) else nframes
 
         if initial_state_is_live:
             self.live_checkbox.setChecked(True)
@@ -927,7 +1252,12 @@ class MainWindow(QMainWindow):
         ## not a time-sensitive thing.
         image_list = []
         for file in files:
-            if (file_suffix == 'raw'):
+            if (file_suffix == RAW_RECORDING_SUFFIX):
+                ## A recording file holds a whole video. Flip the frames as read_binary_image() does for "raw" files.
+                with RawRecordingReader(file) as recording:
+                    image_list.extend(frame[::-1,:] for frame in recording)
+                continue
+            elif (file_suffix == 'raw'):
                 img = fsl.read_binary_image(file, self.Nx, self.Ny)
             else:
                 img = imread(file)
@@ -939,7 +1269,7 @@ class MainWindow(QMainWindow):
         frame_list = []         # for storing the generated figure frames
         fig = plt.figure(figsize=(18,15))
         plt.tight_layout()
-        for i in range(len(files)):
+        for i in range(len(image_list)):
             frame_list.append([plt.imshow(image_list[i], cmap='gray', animated=True)])
 
         true_framerate = fsl.get_framerate(self.nodemap)
@@ -960,22 +1290,28 @@ class MainWindow(QMainWindow):
         while self.img_has_saturation:
             self.exposure /= 2
             self.exposure_spinbox.setValue(self.exposure)
-            fsl.set_exposure_time(self.nodemap, self.exposure)
-            self.acquire_new_image()
-            if (self.image is None):
+            self.camctrl.set_exposure_time(self.exposure)
+            self.session.update_grab_timeout()
+
+            ## Frames already exposed with the old exposure time still arrive after the change, so skip ahead to the
+            ## first frame that was taken with the new exposure.
+            after = self.grabber.wait_for_exposure(self.camctrl.get_exposure())
+            img = self.capture_image(1, after=after)
+            if (img is None):
                 self.outputbox.appendPlainText(f'Failed to capture an image. Aborting...')
                 return(False)
+            self.update_image_params()
 
             ## If the checkbox is not checked, then "acquire_new_image()" will not update the "img_has_saturation" variable.
             if self.saturation_checkbox.isChecked():
-                self.saturated = (self.image >= self.cam_saturation_level)
-                self.img_has_saturation = self.saturated.any()
+                self.update_saturation()
 
         self.exposure = uint32(self.exposure * self.cam_saturation_level * 0.98 / amax(self.image))
         if verbose:
             self.outputbox.appendPlainText(f'Set optimized exposure time to {self.exposure}ms')
         self.exposure_spinbox.setValue(self.exposure)
-        fsl.set_exposure_time(self.nodemap, self.exposure)
+        self.camctrl.set_exposure_time(self.exposure)
+        self.session.update_grab_timeout()
         return(True)
 
     ## ===================================
@@ -983,21 +1319,33 @@ class MainWindow(QMainWindow):
         if (self.ncameras == 0):
             return
 
-        if not fsl.set_binning(self.nodemap, self.binning_spinbox.value()):
+        ## Binning is locked while the camera is streaming. The configure() transaction restarts the stream only if needed.
+        ok = self.camctrl.configure(binning=self.binning_spinbox.value(), stop_stream=self.stop_stream, start_stream=self.start_stream)
+        if not ok:
             self.outputbox.appendPlainText(f'Failed to set the binning value!')
             return
 
         self.binning = self.binning_spinbox.value()
         ## Now that the binning has changed, modify the image size, and update the statusbar string.
-        (self.Ny,self.Nx) = fsl.get_image_width_height(self.nodemap, verbose=False)
+        (self.Ny,self.Nx) = fsl.get_image_size(self.nodemap, verbose=False)
         self.statusbar.showMessage(f'image size: img(Nx,Ny) = ({self.Nx},{self.Ny}),     image_counter = {self.image_counter}')
         self.outputbox.appendPlainText(f'Setting binning = {self.binning}. Now the image dims = ({self.Nx},{self.Ny})')
 
         ## Modify the saturation values, and the colorbar maxval.
-        self.cam_bitdepth = 12 + uint16(log2(self.binning**2))      ## camera bit depth
+        self.update_bit_depth()
+
+        return
+
+    ## ===================================
+    def update_bit_depth(self):
+        ## With Mono16, binned pixels are summed, so the image gains log2(binning**2) bits over the sensor's 12. A Mono12p
+        ## image stays at 12 bits whatever the binning, and is unpacked into the top 12 bits of the 16-bit range.
+        if (self.pixel_format == 'Mono16'):
+            self.cam_bitdepth = 12 + uint16(log2(self.binning**2))      ## camera bit depth
+        else:
+            self.cam_bitdepth = uint16(12)
         self.cam_saturation_level = (2**self.cam_bitdepth) - 2
         self.tone_mapping_scale = uint16(pow(2.0, self.cam_bitdepth - 8))
-
         return
 
     ## ===================================
@@ -1005,7 +1353,7 @@ class MainWindow(QMainWindow):
         if (self.ncameras == 0):
             return
 
-        self.cropping = self.binning_spinbox.value()
+        self.cropping = self.cropping_spinbox.value()
 
         if (self.cropping == 0):
             set_height = self.image_maxheight
@@ -1024,17 +1372,61 @@ class MainWindow(QMainWindow):
         set_height_offset = (self.image_maxheight // 2) - (set_height // 2)
         set_width_offset = (self.image_maxwidth // 2) - (set_width // 2)
 
-        if not fsl.set_image_region(self.nodemap, set_height, set_width, set_height_offset, set_width_offset):
+        ## The image region is locked while the camera is streaming. The configure() transaction restarts the stream only if needed.
+        roi = (set_height, set_width, set_height_offset, set_width_offset)
+        ok = self.camctrl.configure(roi=roi, stop_stream=self.stop_stream, start_stream=self.start_stream)
+        if not ok:
             self.outputbox.appendPlainText(f'Failed to set the cropping value!')
             return
         self.outputbox.appendPlainText(f'Setting cropping = {self.cropping}')
 
         ## Now that the cropping has changed, modify the image size, and update the statusbar string.
-        (self.Ny,self.Nx) = fsl.get_image_width_height(self.nodemap, verbose=False)
+        (self.Ny,self.Nx) = fsl.get_image_size(self.nodemap, verbose=False)
         self.statusbar.showMessage(f'image size: img(Nx,Ny) = ({self.Nx},{self.Ny}),     image_counter = {self.image_counter}')
 
         return
 
+    ## ===================================
+    def pixelFormatChange(self, new_format):
+        if (self.ncameras == 0):
+            return
+
+        ## Mono12p frames are unpacked into the same scale as unbinned Mono16 frames. With binning, though, a Mono12p image
+        ## has fewer bits than a Mono16 one, so the bit depth (and with it the image scaling) is updated.
+        ok = self.camctrl.configure(pixel_format=new_format, stop_stream=self.stop_stream, start_stream=self.start_stream)
+        if not ok:
+            self.outputbox.appendPlainText(f'Failed to set the pixel format to {new_format}!')
+            return
+
+        self.pixel_format = new_format
+        self.update_bit_depth()
+        self.outputbox.appendPlainText(f'Setting pixel format = {new_format}')
+        return
+
+    ## ===================================
+    def streamBufferChange(self):
+        if (self.ncameras == 0):
+            return
+
+        new_count = self.stream_buffer_spinbox.value()
+        new_mode = self.stream_buffer_combobox.currentText()
+
+        ## The stream buffer settings are locked while the camera is streaming, so stop the stream while changing them.
+        self.stop_stream()
+        ok = fsl.set_stream_buffer_count(self.nodemap_tlstream, new_count)
+        ok &= fsl.set_stream_buffer_handling_mode(self.nodemap_tlstream, new_mode)
+        self.start_stream()
+        if not ok:
+            self.outputbox.appendPlainText(f'Failed to set the stream buffer settings!')
+            return
+
+        self.stream_buffer_count = new_count
+        self.stream_buffer_mode = new_mode
+        count_str = new_count if (new_count > 0) else 'Auto'
+        self.outputbox.appendPlainText(f'Setting stream buffers = {count_str}, handling mode = {new_mode}')
+
+        return
+
     ## ===================================
     def show_histogram(self):
         self.outputbox.appendPlainText(f'Histogram function is not yet implemented')
@@ -1109,13 +1501,22 @@ class MainWindow(QMainWindow):
         file_prefix = self.file_prefix_editbox.text()
         file_suffix = self.file_suffix_editbox.text()
 
-        for n in range(self.fpp_nphases):
+        def project_phase(n):
             self.fpp_phasenum = n
-            phasevalue_deg = int(rint(360.0 * self.fpp_phasenum / self.fpp_nphases))
             self.update_projector_pattern()
-            img = self.capture_image(1)
+
+        self.begin_triggered_scan()
+        project_phase(0)
+
+        for n in range(self.fpp_nphases):
+            phasevalue_deg = int(rint(360.0 * n / self.fpp_nphases))
+
+            ## Project the next pattern while this frame is reading out.
+            next_move = (lambda: project_phase(n + 1)) if (n + 1 < self.fpp_nphases) else None
+            img = self.capture_image(1, next_move=next_move)
             if img is None:
                 self.outputbox.appendPlainText(f'Failed to collect an image!')
+                self.end_triggered_scan()
                 return
             else:
                 self.image = img
@@ -1123,6 +1524,8 @@ class MainWindow(QMainWindow):
             filename = f'{file_dir}{file_prefix}_{phasevalue_deg:03}.{file_suffix}'
             self.fileSave(filename)
 
+        self.end_triggered_scan()
+
         ## Return to the phase zero position.
         self.fpp_phasenum = 0
         self.update_projector_pattern()
@@ -1152,10 +1555,20 @@ class MainWindow(QMainWindow):
     def set_lctf_wavelength(self, new_wavelength):
         if self.lctf_device_handle.set_wavelength(new_wavelength):
             self.lctf_currentwave = new_wavelength
+            self.lctf_move_time = time.perf_counter()
         else:
             self.outputbox.appendPlainText(f'Failed to set the LCTF wavelength to {new_wavelength}nm.')
         return
 
+    ## ===================================
+    def wait_for_lctf_settle(self):
+        ## Wait out whatever is left of the LCTF's switching time since the last wavelength change. When the change was
+        ## started during the previous frame's readout, most or all of the switching time has already passed.
+        remaining = self.lctf_move_time + self.lctf_settle_time - time.perf_counter()
+        if (remaining > 0):
+            time.sleep(remaining)
+        return
+
     ## ===================================
     def collect_lctf_imageset(self):
         file_dir = self.file_dir_editbox.text()
@@ -1166,30 +1579,44 @@ class MainWindow(QMainWindow):
 
         self.lctf_wavelist = uint16(linspace(430,650,20))     ## returns a list from 430 to 720 in increments of 10
         self.lctf_wave_counter = 0          ## counter for which element of wavelist is the current one
+        lctf_metadata = zeros(len(self.lctf_wavelist), fsl.FRAME_METADATA_DTYPE)
 
-        for wave_nm in self.lctf_wavelist:
-            self.set_lctf_wavelength(wave_nm)
+        self.begin_triggered_scan()
+        self.set_lctf_wavelength(self.lctf_wavelist[0])
 
-            ## Check image exposure time here.
+        for (i,wave_nm) in enumerate(self.lctf_wavelist):
+            ## Check image exposure time here, once the filter has reached the new wavelength.
+            self.wait_for_lctf_settle()
             ok = self.do_autoexposure(None, verbose=False)
             if not ok:
                 self.outputbox.appendPlainText(f'Failed collection sequence!')
+                self.end_triggered_scan()
                 return
 
             self.outputbox.appendPlainText(f'{wave_nm}nm: set optimized exposure time to {self.exposure}ms')
-            time.sleep(0.2)
 
-            img = self.capture_image(1)
+            ## Tune the filter to the next wavelength while this frame is reading out.
+            next_move = (lambda: self.set_lctf_wavelength(self.lctf_wavelist[i+1])) if (i + 1 < len(self.lctf_wavelist)) else None
+            img = self.capture_image(1, next_move=next_move)
             if img is None:
                 self.outputbox.appendPlainText(f'Failed to collect an image!')
+                self.end_triggered_scan()
                 return
             else:
                 self.image = img
 
-            ## Actually, I really should be saving the exposure time too, in order to keep track of changes.
+            ## Keep the exposure time (and the rest of the frame metadata) that the camera reported with this frame.
+            lctf_metadata[self.lctf_wave_counter] = self.metadata[0]
+            self.lctf_wave_counter += 1
+
             filename = f'{file_dir}{file_prefix}_{wave_nm:03}.{file_suffix}'
             self.fileSave(filename)
-            time.sleep(0.2)
+
+        self.end_triggered_scan()
+
+        metadata_filename = f'{file_dir}{file_prefix}_metadata.npz'
+        savez(metadata_filename, wavelengths=self.lctf_wavelist, metadata=lctf_metadata)
+        self.outputbox.appendPlainText(f'Saved the frame metadata (exposure times, gains, timestamps) to {metadata_filename}')
 
         ## Return to the 550nm default wavelength.
         self.set_lctf_wavelength(550)
@@ -1230,12 +1657,18 @@ class MainWindow(QMainWindow):
         self.angle_stepsize = 5.0
         self.hurlbut_angles = arange(self.nangles) * self.angle_stepsize
 
-        for a in self.hurlbut_angles:
-            self.motor.move_to(a, blocking=True)
+        self.begin_triggered_scan()
+        self.motor.move_to(self.hurlbut_angles[0], blocking=True)
+
+        for (i,a) in enumerate(self.hurlbut_angles):
             #self.k10cr1_motor_obj.live_motion_monitor(a)
-            img = self.capture_image(1)
+
+            ## Rotate to the next angle while this frame is reading out.
+            next_move = (lambda: self.motor.move_to(self.hurlbut_angles[i+1], blocking=True)) if (i + 1 < self.nangles) else None
+            img = self.capture_image(1, next_move=next_move)
             if img is None:
                 self.outputbox.appendPlainText(f'Failed to collect an image!')
+                self.end_triggered_scan()
                 return
             else:
                 self.image = img
@@ -1244,6 +1677,8 @@ class MainWindow(QMainWindow):
             self.fileSave(filename)
             self.outputbox.appendPlainText(f'LCTF image collection is complete.')
 
+        self.end_triggered_scan()
+
         return
 
 ## ======================================================================================================
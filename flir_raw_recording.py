@@ -0,0 +1,201 @@
+"""
+A single-file format for raw video recordings, so that a recording of N frames is one file rather than N files.
+Writing one file per frame costs a file creation and a directory update for every frame, which limits recording to a
+few hundred frames per second; appending frames to one preallocated file costs only the write itself.
+
+The layout of a recording file is:
+
+    header      HEADER_SIZE bytes: the magic string, the format version, the frame height and width, the numpy dtype
+                of the stored pixels, the camera pixel format and binning, the size of one frame in bytes, the number
+                of frames, and the offset of the index (see HEADER_FORMAT).
+    frames      the frames, back to back, each height * width pixels in row order.
+    index       one INDEX_DTYPE record per frame: the camera frame ID, the camera timestamp (ns) and the host
+                timestamp (ns since the epoch).
+
+The number of frames and the index offset are only filled in when the recording is closed. A file that was never
+closed (such as after a crash) can still be read: the number of frames is then worked out from the file size, and
+there is no index. Since the file was preallocated, its trailing frames may be unwritten (zeros).
+
+This module only needs numpy, so that recordings can be read on machines without the Spinnaker SDK.
+"""
+
+import os
+import struct
+from numpy import dtype as numpy_dtype, zeros, empty, memmap, fromfile, ascontiguousarray, concatenate
+
+RAW_RECORDING_SUFFIX = 'rawseq'     ## the file suffix for recordings in this format
+MAGIC = b'FLIRSEQ1'
+VERSION = 1
+HEADER_SIZE = 4096                  ## the frames start on a page boundary, which suits both sequential writes and memmap
+HEADER_FORMAT = '<8sIIII8s32sIQQQ'  ## magic, version, header size, height, width, dtype, pixel format, binning,
+                                    ## frame bytes, number of frames, index offset
+INDEX_DTYPE = [('frame_id','<u8'), ('timestamp','<u8'), ('host_timestamp','<i8')]
+
+## ====================================================================================
+def _write_all(fileobj, data):
+    ## An unbuffered write can return before all of the data has been written.
+    view = memoryview(data).cast('B')
+    while (len(view) > 0):
+        nbytes = fileobj.write(view)
+        view = view[nbytes:]
+    return
+
+## ====================================================================================
+class RawRecordingWriter:
+    """
+    Write frames one after another into a single recording file. The file is preallocated for the expected number of
+    frames, so that the filesystem does not have to extend it on every write, and trimmed to the frames actually
+    written when it is closed. Frames must all have the same shape and dtype.
+
+    :param filename: The recording file to create (conventionally with the suffix RAW_RECORDING_SUFFIX).
+    :param height: uint
+    :param width: uint
+    :param dtype: The numpy dtype of the pixels, such as 'uint16'.
+    :param pixel_format: The camera pixel format the frames were taken with, such as 'Mono12p' (for reference only).
+    :param binning: The camera binning the frames were taken with (for reference only).
+    :param num_frames: The expected number of frames, used to preallocate the file and the index. More frames can be
+        written, at the cost of growing the file as it goes.
+    """
+
+    def __init__(self, filename, height, width, dtype='uint16', pixel_format='', binning=1, num_frames=0):
+        self.filename = filename
+        self.height = height
+        self.width = width
+        self.dtype = numpy_dtype(dtype).newbyteorder('<')
+        self.pixel_format = pixel_format
+        self.binning = binning
+        self.frame_bytes = height * width * self.dtype.itemsize
+        self.num_frames = 0
+        self.index = zeros(max(num_frames, 1), INDEX_DTYPE)
+
+        self.file = open(filename, 'wb', buffering=0)
+        self._write_header(0, 0)
+
+        size = HEADER_SIZE + num_frames * self.frame_bytes
+        if (num_frames > 0):
+            try:
+                os.posix_fallocate(self.file.fileno(), 0, size)
+            except (AttributeError, OSError):
+                self.file.truncate(size)
+        self.file.seek(HEADER_SIZE)
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return(False)
+
+    ## ===================================
+    def _write_header(self, num_frames, index_offset):
+        header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, HEADER_SIZE, self.height, self.width,
+                             self.dtype.str.encode('ascii'), self.pixel_format.encode('ascii'), self.binning,
+                             self.frame_bytes, num_frames, index_offset)
+        self.file.seek(0)
+        _write_all(self.file, header.ljust(HEADER_SIZE, b'\0'))
+        return
+
+    ## ===================================
+    def write_frame(self, image, frame_id=0, timestamp=0, host_timestamp=0):
+        """
+        Append one frame to the recording.
+
+        :param image: A (height,width) array of the recording's dtype.
+        :param frame_id: The camera frame ID.
+        :param timestamp: The camera timestamp (ns).
+        :param host_timestamp: The host time (ns since the epoch) at which the frame was received.
+        :return: The position of the frame in the recording.
+        :rtype: int
+        """
+
+        if (image.shape != (self.height,self.width)) or (image.dtype != self.dtype):
+            raise ValueError(f'RawRecordingWriter: expected a {self.height}x{self.width} {self.dtype} frame, but got a '
+                             f'{image.shape[0]}x{image.shape[1]} {image.dtype} frame')
+
+        _write_all(self.file, ascontiguousarray(image))
+
+        if (self.num_frames == len(self.index)):
+            self.index = concatenate((self.index, zeros(len(self.index), INDEX_DTYPE)))
+        self.index[self.num_frames] = (frame_id, timestamp, host_timestamp)
+        self.num_frames += 1
+
+        return(self.num_frames - 1)
+
+    ## ===================================
+    def close(self):
+        """
+        Trim the file to the frames written, append the index, and fill in the header.
+        """
+
+        if self.file.closed:
+            return
+
+        index_offset = HEADER_SIZE + self.num_frames * self.frame_bytes
+        self.file.truncate(index_offset)
+        self.file.seek(index_offset)
+        _write_all(self.file, self.index[:self.num_frames].tobytes())
+        self._write_header(self.num_frames, index_offset)
+        self.file.close()
+        return
+
+## ====================================================================================
+class RawRecordingReader:
+    """
+    Random access to the frames of a recording file. The frames are memory-mapped rather than read in, so opening a
+    long recording is quick, and reader[n] only reads frame n from disk.
+
+    :param filename: The recording file.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as fileobj:
+            header = fileobj.read(struct.calcsize(HEADER_FORMAT))
+        if (len(header) < struct.calcsize(HEADER_FORMAT)) or (header[:len(MAGIC)] != MAGIC):
+            raise ValueError(f'"{filename}" is not a raw recording file')
+
+        (magic, version, header_size, self.height, self.width, dtype_str, pixel_format, self.binning, self.frame_bytes,
+         num_frames, index_offset) = struct.unpack(HEADER_FORMAT, header)
+        if (version > VERSION):
+            raise ValueError(f'"{filename}" has recording format version {version}, but only up to {VERSION} is supported')
+        self.dtype = numpy_dtype(dtype_str.rstrip(b'\0').decode('ascii'))
+        self.pixel_format = pixel_format.rstrip(b'\0').decode('ascii')
+
+        ## If the recording was never closed, then count the whole frames in the file.
+        self.index = None
+        if (index_offset == 0):
+            num_frames = (os.path.getsize(filename) - header_size) // self.frame_bytes if (self.frame_bytes > 0) else 0
+        elif (num_frames > 0):
+            self.index = fromfile(filename, dtype=INDEX_DTYPE, count=num_frames, offset=index_offset)
+        self.num_frames = num_frames
+
+        if (num_frames > 0):
+            self.frames = memmap(filename, dtype=self.dtype, mode='r', offset=header_size, shape=(num_frames,self.height,self.width))
+        else:
+            self.frames = empty((0,self.height,self.width), self.dtype)
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return(False)
+
+    def __len__(self):
+        return(self.num_frames)
+
+    def __getitem__(self, n):
+        return(self.frames[n])
+
+    def __iter__(self):
+        for n in range(self.num_frames):
+            yield self.frames[n]
+
+    ## ===================================
+    def close(self):
+        """
+        Drop the reader's reference to the memory map. The file is unmapped once no frames taken from it remain in use.
+        """
+
+        self.frames = None
+        return
@@ -1,10 +1,21 @@
 import os
 import sys
-import PySpin
-from numpy import empty, amin, amax, array, zeros, arange, uint16
+import time
+import threading
+import queue
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+if os.environ.get('FLIR_SIMULATED_CAMERA', '0') not in ('', '0'):
+    import simulated_pyspin as PySpin       ## run without a camera; see simulated_pyspin.py
+else:
+    import PySpin
+from numpy import empty, amin, amax, array, zeros, arange, uint16, copyto, moveaxis, nan
+from numpy import dtype as numpy_dtype, save
 import struct
 import io
 from contextlib import redirect_stdout
+from flir_raw_recording import RawRecordingWriter, RAW_RECORDING_SUFFIX
 
 # *** NOTES ***
 #
@@ -388,10 +399,11 @@ def set_image_region(nodemap, height, width, height_offset, width_offset, verbos
     return(result)
 
 ## ====================================================================================
-def set_full_imagesize(nodemap, verbose=False):
+def set_full_imagesize(nodemap, reset_binning=True, verbose=False):
     """
     Sets the camera's width & height to be the maximum possible (no binning and no cropping). These settings must be
-    applied before BeginAcquisition() is called.
+    applied before BeginAcquisition() is called. If reset_binning is False, then the binning is left as it is and the
+    image is set to the maximum size allowed at that binning.
 
     :param nodemap: Device GenICam nodemap
     :param height: uint
@@ -407,7 +419,8 @@ def set_full_imagesize(nodemap, verbose=False):
         result = True
 
         ## First reset the binning value to 1.
-        set_binning(nodemap, 1)
+        if reset_binning:
+            set_binning(nodemap, 1)
 
         ## Apply minimum offset X
         node_offset_x = PySpin.CIntegerPtr(nodemap.GetNode('OffsetX'))
@@ -534,6 +547,40 @@ def get_image_width_height(nodemap, verbose=False):
 
     return(image_width, image_height)
 
+## ====================================================================================
+def get_image_size(nodemap, verbose=False):
+    """
+    Get the dimensions of the images that the camera is currently delivering (after binning and cropping).
+
+    :param nodemap: Device GenICam nodemap
+    :type nodemap: CameraPtr
+    :return: The image (width, height), or (0, 0) if an error occurred.
+    :rtype: tuple
+    """
+
+    image_width = 0
+    image_height = 0
+
+    try:
+        node_width = PySpin.CIntegerPtr(nodemap.GetNode('Width'))
+        if PySpin.IsAvailable(node_width) and PySpin.IsReadable(node_width):
+            image_width = node_width.GetValue()
+        else:
+            print('Image width node not available...')
+
+        node_height = PySpin.CIntegerPtr(nodemap.GetNode('Height'))
+        if PySpin.IsAvailable(node_height) and PySpin.IsReadable(node_height):
+            image_height = node_height.GetValue()
+        else:
+            print('Image height node not available...')
+
+        if verbose:
+            print(f'Current image size: ({image_width},{image_height})')
+    except PySpin.SpinnakerException as ex:
+        print('get_image_size() Error: %s' % ex)
+
+    return(image_width, image_height)
+
 ## ====================================================================================
 def set_autogain_off(nodemap, verbose=False):
     """
@@ -620,314 +667,3672 @@ def get_framerate(nodemap, verbose=False):
             print('AcquisitionFrameRate node is not available...')
             return(0)
 
-        current_framerate = node_acquisition_framerate.GetValue()
-        if verbose:
-            print(f'Current frame rate: {current_framerate:.1f} Hz')
-    except PySpin.SpinnakerException as ex:
-        print('get_framerate() Error: %s' % ex)
-        current_framerate = 0
+        current_framerate = node_acquisition_framerate.GetValue()
+        if verbose:
+            print(f'Current frame rate: {current_framerate:.1f} Hz')
+    except PySpin.SpinnakerException as ex:
+        print('get_framerate() Error: %s' % ex)
+        current_framerate = 0
+
+    return(current_framerate)
+
+## ====================================================================================
+def set_framerate(nodemap, new_framerate, verbose=False):
+    """
+    This function sets the framerate (in Hz) of the camera.
+
+    :param nodemap: Device GenICam nodemap
+    :type nodemap: CameraPtr
+    :param new_framerate: double
+    :return: True if successful, False otherwise.
+    :rtype: bool
+    """
+
+    try:
+        result = True
+
+        node_framerateenable = PySpin.CBooleanPtr(nodemap.GetNode('AcquisitionFrameRateEnable'))
+        if not PySpin.IsAvailable(node_framerateenable) and not PySpin.IsReadable(node_framerateenable):
+            print('AcquisitionFrameRateEnable node is not available...')
+            return(False)
+
+        node_acquisition_framerate = PySpin.CFloatPtr(nodemap.GetNode('AcquisitionFrameRate'))
+        if not PySpin.IsAvailable(node_acquisition_framerate) and not PySpin.IsReadable(node_acquisition_framerate):
+            print('AcquisitionFrameRate node is not available...')
+            return(False)
+
+        ## The frame rate can only be set manually once the frame rate control is enabled.
+        if PySpin.IsWritable(node_framerateenable):
+            node_framerateenable.SetValue(True)
+
+        old_framerate = node_acquisition_framerate.GetValue()
+        min_framerate = node_acquisition_framerate.GetMin()
+        max_framerate = node_acquisition_framerate.GetMax()
+
+        if (new_framerate > max_framerate):
+            print(f'Cannot set the frame rate to {new_framerate:.1f} Hz, which is above the max allowed value of {max_framerate:.1f} Hz.')
+            print(f'Defaulting to {max_framerate:.1f} Hz ...')
+            new_framerate = max_framerate
+
+        if (new_framerate < min_framerate):
+            print(f'Cannot set the frame rate to {new_framerate:.1f} Hz, which is below the min allowed value of {min_framerate:.1f} Hz.')
+            print(f'Defaulting to {min_framerate:.1f} Hz ...')
+            new_framerate = min_framerate
+
+        node_acquisition_framerate.SetValue(float(new_framerate))
+        if verbose:
+            print(f'Old frame rate = {old_framerate:.1f} Hz,   new frame rate: {new_framerate:.1f} Hz')
+    except PySpin.SpinnakerException as ex:
+        print('set_framerate() Error: %s' % ex)
+        result = False
+
+    return(result)
+
+## ====================================================================================
+def set_acquisition_mode(nodemap, mode, verbose=False):
+    """
+    This function sets the camera acquisition mode. This must be done before BeginAcquisition() is called.
+
+    :param nodemap: Device GenICam nodemap
+    :type nodemap: CameraPtr
+    :param mode: String, options are: ['Continuous', 'SingleFrame', 'MultiFrame']
+    :return: True if successful, False otherwise.
+    :rtype: bool
+    """
+
+    try:
+        ## In order to access the node entries, they have to be casted to a pointer type (CEnumerationPtr here)
+        node_acquisition_mode = PySpin.CEnumerationPtr(nodemap.GetNode('AcquisitionMode'))
+        if not PySpin.IsAvailable(node_acquisition_mode) or not PySpin.IsWritable(node_acquisition_mode):
+            print(f'Unable to set acquisition mode to {mode} (enum retrieval). Aborting...')
+            return(False)
+
+        ## Retrieve entry node from enumeration node
+        node_acquisition_mode_entry = node_acquisition_mode.GetEntryByName(mode)
+        if not PySpin.IsAvailable(node_acquisition_mode_entry) or not PySpin.IsReadable(node_acquisition_mode_entry):
+            print(f'Unable to set acquisition mode to {mode} (entry retrieval). Aborting...')
+            return(False)
+
+        ## Set integer value from entry node as new value of enumeration node
+        node_acquisition_mode.SetIntValue(node_acquisition_mode_entry.GetValue())
+        if verbose:
+            print(f'Acquisition mode set to {mode}')
+    except PySpin.SpinnakerException as ex:
+        print('set_acquisition_mode() Error: %s' % ex)
+        return(False)
+
+    return(True)
+
+## ====================================================================================
+def set_enumeration_value(nodemap, node_name, entry_name, verbose=False):
+    """
+    Set an enumeration node to one of its entries, by name.
+
+    :param nodemap: Device GenICam nodemap
+    :type nodemap: INodeMap
+    :param node_name: The enumeration node name, such as 'TriggerSource'.
+    :param entry_name: The entry name, such as 'Software'.
+    :return: True if successful, False otherwise.
+    :rtype: bool
+    """
+
+    try:
+        node_enum = PySpin.CEnumerationPtr(nodemap.GetNode(node_name))
+        if not PySpin.IsAvailable(node_enum) or not PySpin.IsWritable(node_enum):
+            print(f'{node_name} node is not available...')
+            return(False)
+
+        node_enum_entry = node_enum.GetEntryByName(entry_name)
+        if not PySpin.IsAvailable(node_enum_entry) or not PySpin.IsReadable(node_enum_entry):
+            print(f'{node_name}_{entry_name} node is not available...')
+            return(False)
+
+        node_enum.SetIntValue(node_enum_entry.GetValue())
+        if verbose:
+            print(f'{node_name} set to {entry_name}')
+    except PySpin.SpinnakerException as ex:
+        print('set_enumeration_value() Error: %s' % ex)
+        return(False)
+
+    return(True)
+
+## ====================================================================================
+def set_trigger_mode(nodemap, enabled, verbose=False):
+    """
+    Turn triggered acquisition on or off. With the trigger off, the camera runs freely at its frame rate.
+
+    :param nodemap: Device GenICam nodemap
+    :type nodemap: INodeMap
+    :param enabled: bool
+    :return: True if successful, False otherwise.
+    :rtype: bool
+    """
+
+    return(set_enumeration_value(nodemap, 'TriggerMode', 'On' if enabled else 'Off', verbose=verbose))
+
+## ====================================================================================
+def get_trigger_mode(nodemap):
+    """
+    Find out whether triggered acquisition is on.
+
+    :param nodemap: Device GenICam nodemap
+    :type nodemap: INodeMap
+    :return: True if the trigger is on, False otherwise.
+    :rtype: bool
+    """
+
+    try:
+        node_trigger_mode = PySpin.CEnumerationPtr(nodemap.GetNode('TriggerMode'))
+        if not PySpin.IsAvailable(node_trigger_mode) or not PySpin.IsReadable(node_trigger_mode):
+            return(False)
+        return(node_trigger_mode.GetCurrentEntry().GetSymbolic() == 'On')
+    except PySpin.SpinnakerException as ex:
+        print('get_trigger_mode() Error: %s' % ex)
+        return(False)
+
+## ====================================================================================
+def configure_trigger(nodemap, source='Software', activation='RisingEdge', delay=None, selector='FrameStart', verbose=False):
+    """
+    Configure and turn on triggered acquisition, so that the camera takes one frame per trigger. The trigger mode is
+    turned off while the trigger is configured, since the trigger source cannot be changed while it is on.
+
+    :param nodemap: Device GenICam nodemap
+    :type nodemap: INodeMap
+    :param source: String, options are: ['Software', 'Line0', 'Line1', 'Line2', 'Line3']
+    :param activation: String, the edge or level of a hardware trigger, options are: ['RisingEdge', 'FallingEdge',
+        'AnyEdge', 'LevelHigh', 'LevelLow']. Ignored for software triggers.
+    :param delay: The delay (in usec) between the trigger and the start of the exposure, or None to leave unchanged.
+    :param selector: The event that the trigger starts, normally 'FrameStart'.
+    :return: True if successful, False otherwise.
+    :rtype: bool
+    """
+
+    if not set_trigger_mode(nodemap, False):
+        return(False)
+
+    if not set_enumeration_value(nodemap, 'TriggerSelector', selector, verbose=verbose):
+        return(False)
+
+    if not set_enumeration_value(nodemap, 'TriggerSource', source, verbose=verbose):
+        return(False)
+
+    if (source != 'Software') and not set_enumeration_value(nodemap, 'TriggerActivation', activation, verbose=verbose):
+        return(False)
+
+    if delay is not None:
+        try:
+            node_trigger_delay = PySpin.CFloatPtr(nodemap.GetNode('TriggerDelay'))
+            if not PySpin.IsAvailable(node_trigger_delay) or not PySpin.IsWritable(node_trigger_delay):
+                print('TriggerDelay node is not available...')
+                return(False)
+
+            min_delay = node_trigger_delay.GetMin()
+            max_delay = node_trigger_delay.GetMax()
+            set_delay = max((delay, min_delay))
+            set_delay = min((set_delay, max_delay))
+            node_trigger_delay.SetValue(float(set_delay))
+            if verbose:
+                print(f'Trigger delay: limits = ({min_delay:.1f},{max_delay:.1f}), value set to {node_trigger_delay.GetValue():.1f} usec')
+        except PySpin.SpinnakerException as ex:
+            print('configure_trigger() Error: %s' % ex)
+            return(False)
+
+    return(set_trigger_mode(nodemap, True, verbose=verbose))
+
+## ====================================================================================
+def fire_software_trigger(nodemap, verbose=False):
+    """
+    Send a software trigger to the camera. The trigger has to be configured with source='Software', and the camera
+    has to be acquiring.
+
+    :param nodemap: Device GenICam nodemap
+    :type nodemap: INodeMap
+    :return: True if successful, False otherwise.
+    :rtype: bool
+    """
+
+    try:
+        node_software_trigger = PySpin.CCommandPtr(nodemap.GetNode('TriggerSoftware'))
+        if not PySpin.IsAvailable(node_software_trigger) or not PySpin.IsWritable(node_software_trigger):
+            print('TriggerSoftware node is not available...')
+            return(False)
+
+        node_software_trigger.Execute()
+        if verbose:
+            print('Software trigger sent')
+    except PySpin.SpinnakerException as ex:
+        print('fire_software_trigger() Error: %s' % ex)
+        return(False)
+
+    return(True)
+
+## ====================================================================================
+def get_grab_timeout(nodemap, margin=100, trigger_wait=1.0, verbose=False):
+    """
+    Compute a GetNextImage() timeout (in ms) from the camera's current settings: the exposure time, the frame period,
+    and, if the trigger is on, the trigger delay plus (for hardware triggers) the longest expected wait for a trigger.
+    A dead stream is then detected within a few frame periods, while long exposures do not time out.
+
+    :param nodemap: Device GenICam nodemap
+    :type nodemap: INodeMap
+    :param margin: The fixed margin (in ms) added to the timeout. A further 10% of the timeout is also added.
+    :param trigger_wait: The longest expected time (in sec) between hardware triggers.
+    :return: The timeout in ms.
+    :rtype: int
+    """
+
+    exposure_ms = 0.0
+    period_ms = 0.0
+    trigger_ms = 0.0
+
+    try:
+        node_exposure_time = PySpin.CFloatPtr(nodemap.GetNode('ExposureTime'))
+        if PySpin.IsAvailable(node_exposure_time) and PySpin.IsReadable(node_exposure_time):
+            exposure_ms = node_exposure_time.GetValue() / 1000.0
+
+        ## The resulting frame rate accounts for the exposure, readout and link limits; fall back to the frame rate setting.
+        for node_name in ('AcquisitionResultingFrameRate', 'AcquisitionFrameRate'):
+            node_framerate = PySpin.CFloatPtr(nodemap.GetNode(node_name))
+            if PySpin.IsAvailable(node_framerate) and PySpin.IsReadable(node_framerate) and (node_framerate.GetValue() > 0):
+                period_ms = 1000.0 / node_framerate.GetValue()
+                break
+
+        node_trigger_mode = PySpin.CEnumerationPtr(nodemap.GetNode('TriggerMode'))
+        if PySpin.IsAvailable(node_trigger_mode) and PySpin.IsReadable(node_trigger_mode) and \
+           (node_trigger_mode.GetCurrentEntry().GetSymbolic() == 'On'):
+            node_trigger_delay = PySpin.CFloatPtr(nodemap.GetNode('TriggerDelay'))
+            if PySpin.IsAvailable(node_trigger_delay) and PySpin.IsReadable(node_trigger_delay):
+                trigger_ms = node_trigger_delay.GetValue() / 1000.0
+
+            node_trigger_source = PySpin.CEnumerationPtr(nodemap.GetNode('TriggerSource'))
+            if PySpin.IsAvailable(node_trigger_source) and PySpin.IsReadable(node_trigger_source) and \
+               (node_trigger_source.GetCurrentEntry().GetSymbolic() != 'Software'):
+                trigger_ms += trigger_wait * 1000.0
+    except PySpin.SpinnakerException as ex:
+        print('get_grab_timeout() Error: %s' % ex)
+
+    timeout = int(1.1 * (exposure_ms + period_ms + trigger_ms) + margin)
+    if verbose:
+        print(f'Grab timeout: {timeout} ms (exposure={exposure_ms:.1f} ms, frame period={period_ms:.1f} ms, trigger={trigger_ms:.1f} ms)')
+
+    return(timeout)
+
+## ====================================================================================
+def configure_sequencer(nodemap, exposures, gains=None, verbose=False):
+    """
+    Program the camera's sequencer to cycle through a bracket of exposures, one sequencer set per exposure. Once the
+    sequencer is on, every frame the camera takes uses the next set in the cycle, so a bracket is acquired at the full
+    frame rate without any host round-trips. Auto exposure and auto gain are turned off, since the sequencer cannot run
+    with them on. Use disable_sequencer() to return to normal acquisition.
+
+    :param nodemap: Device GenICam nodemap
+    :type nodemap: INodeMap
+    :param exposures: The list of exposure times (in usec), one per sequencer set.
+    :param gains: The list of gains (in dB), one per sequencer set, or None to use the current gain for all sets.
+    :return: True if successful, False otherwise.
+    :rtype: bool
+    """
+
+    nsets = len(exposures)
+    if (gains is not None) and (len(gains) != nsets):
+        print('configure_sequencer(): the number of gains must match the number of exposures.')
+        return(False)
+
+    try:
+        ## The sequencer must be off before it can be configured.
+        if not set_enumeration_value(nodemap, 'SequencerMode', 'Off'):
+            return(False)
+        set_autoexposure_off(nodemap)
+        set_autogain_off(nodemap)
+        if not set_enumeration_value(nodemap, 'SequencerConfigurationMode', 'On'):
+            return(False)
+
+        node_set_selector = PySpin.CIntegerPtr(nodemap.GetNode('SequencerSetSelector'))
+        node_set_next = PySpin.CIntegerPtr(nodemap.GetNode('SequencerSetNext'))
+        node_set_save = PySpin.CCommandPtr(nodemap.GetNode('SequencerSetSave'))
+        node_exposure_time = PySpin.CFloatPtr(nodemap.GetNode('ExposureTime'))
+        node_gain = PySpin.CFloatPtr(nodemap.GetNode('Gain'))
+
+        for node,name in ((node_set_selector,'SequencerSetSelector'), (node_set_next,'SequencerSetNext'),
+                          (node_set_save,'SequencerSetSave'), (node_exposure_time,'ExposureTime')):
+            if not PySpin.IsAvailable(node) or not PySpin.IsWritable(node):
+                print(f'{name} node is not available...')
+                set_enumeration_value(nodemap, 'SequencerConfigurationMode', 'Off')
+                return(False)
+
+        if (nsets < 1) or (nsets > node_set_selector.GetMax() + 1):
+            print(f'Cannot program {nsets} sequencer sets. The maximum is {node_set_selector.GetMax() + 1}.')
+            set_enumeration_value(nodemap, 'SequencerConfigurationMode', 'Off')
+            return(False)
+
+        for i in range(nsets):
+            node_set_selector.SetValue(i)
+
+            exposure = min(max(exposures[i], node_exposure_time.GetMin()), node_exposure_time.GetMax())
+            node_exposure_time.SetValue(exposure)
+            if (gains is not None):
+                node_gain.SetValue(min(max(gains[i], node_gain.GetMin()), node_gain.GetMax()))
+
+            ## Each set advances to the next one on the start of every frame, and the last set wraps back to the first.
+            set_enumeration_value(nodemap, 'SequencerTriggerSource', 'FrameStart')
+            node_set_next.SetValue((i + 1) % nsets)
+            node_set_save.Execute()
+
+            if verbose:
+                print(f'Sequencer set {i}: exposure = {exposure:.1f} us' + ('' if (gains is None) else f', gain = {gains[i]:.1f} dB'))
+
+        node_set_start = PySpin.CIntegerPtr(nodemap.GetNode('SequencerSetStart'))
+        if PySpin.IsAvailable(node_set_start) and PySpin.IsWritable(node_set_start):
+            node_set_start.SetValue(0)
+
+        node_valid = PySpin.CEnumerationPtr(nodemap.GetNode('SequencerConfigurationValid'))
+        if PySpin.IsAvailable(node_valid) and PySpin.IsReadable(node_valid):
+            if (node_valid.GetCurrentEntry().GetSymbolic() != 'Yes'):
+                print('The sequencer configuration is not valid...')
+                set_enumeration_value(nodemap, 'SequencerConfigurationMode', 'Off')
+                return(False)
+
+        if not set_enumeration_value(nodemap, 'SequencerConfigurationMode', 'Off'):
+            return(False)
+        if not set_enumeration_value(nodemap, 'SequencerMode', 'On'):
+            return(False)
+    except PySpin.SpinnakerException as ex:
+        print('configure_sequencer() Error: %s' % ex)
+        return(False)
+
+    return(True)
+
+## ====================================================================================
+def disable_sequencer(nodemap, verbose=False):
+    """
+    Turn the sequencer off. The exposure and gain are left at the values of the last set used.
+
+    :param nodemap: Device GenICam nodemap
+    :type nodemap: INodeMap
+    :return: True if successful, False otherwise.
+    :rtype: bool
+    """
+
+    return(set_enumeration_value(nodemap, 'SequencerMode', 'Off', verbose=verbose))
+
+## ====================================================================================
+def set_stream_buffer_count(nodemap_tlstream, buffer_count, verbose=False):
+    """
+    Set the number of buffers that the host allocates for the image stream. A buffer count of 0 returns the
+    buffer count to "Auto" mode. This must be applied before BeginAcquisition() is called.
+
+    :param nodemap_tlstream: Transport layer stream nodemap (from cam.GetTLStreamNodeMap()).
+    :type nodemap_tlstream: INodeMap
+    :param buffer_count: uint
+    :return: True if successful, False otherwise.
+    :rtype: bool
+    """
+
+    try:
+        node_count_mode = PySpin.CEnumerationPtr(nodemap_tlstream.GetNode('StreamBufferCountMode'))
+        if not PySpin.IsAvailable(node_count_mode) or not PySpin.IsWritable(node_count_mode):
+            print('StreamBufferCountMode node is not available...')
+            return(False)
+
+        mode = 'Auto' if (buffer_count == 0) else 'Manual'
+        node_count_mode_entry = node_count_mode.GetEntryByName(mode)
+        if not PySpin.IsAvailable(node_count_mode_entry) or not PySpin.IsReadable(node_count_mode_entry):
+            print(f'StreamBufferCountMode_{mode} node is not available...')
+            return(False)
+
+        node_count_mode.SetIntValue(node_count_mode_entry.GetValue())
+        if (mode == 'Auto'):
+            if verbose:
+                print('Stream buffer count set to Auto')
+            return(True)
+
+        node_buffer_count = PySpin.CIntegerPtr(nodemap_tlstream.GetNode('StreamBufferCountManual'))
+        if not PySpin.IsAvailable(node_buffer_count) or not PySpin.IsWritable(node_buffer_count):
+            print('StreamBufferCountManual node is not available...')
+            return(False)
+
+        min_count = node_buffer_count.GetMin()
+        max_count = node_buffer_count.GetMax()
+        set_count = max((buffer_count, min_count))
+        set_count = min((set_count, max_count))
+        node_buffer_count.SetValue(set_count)
+        if verbose:
+            print(f'Stream buffer count: limits = ({min_count},{max_count}), value set to {node_buffer_count.GetValue()}')
+    except PySpin.SpinnakerException as ex:
+        print('set_stream_buffer_count() Error: %s' % ex)
+        return(False)
+
+    return(True)
+
+## ====================================================================================
+def set_stream_buffer_handling_mode(nodemap_tlstream, mode, verbose=False):
+    """
+    Set the order in which the stream hands out its buffered images. "NewestOnly" gives the lowest display latency,
+    while "OldestFirst" (with a deep buffer) keeps every frame when the consumer temporarily falls behind. This must
+    be applied before BeginAcquisition() is called.
+
+    :param nodemap_tlstream: Transport layer stream nodemap (from cam.GetTLStreamNodeMap()).
+    :type nodemap_tlstream: INodeMap
+    :param mode: String, options are: ['NewestOnly', 'NewestFirst', 'OldestFirst', 'OldestFirstOverwrite']
+    :return: True if successful, False otherwise.
+    :rtype: bool
+    """
+
+    try:
+        node_handling_mode = PySpin.CEnumerationPtr(nodemap_tlstream.GetNode('StreamBufferHandlingMode'))
+        if not PySpin.IsAvailable(node_handling_mode) or not PySpin.IsWritable(node_handling_mode):
+            print('StreamBufferHandlingMode node is not available...')
+            return(False)
+
+        node_handling_mode_entry = node_handling_mode.GetEntryByName(mode)
+        if not PySpin.IsAvailable(node_handling_mode_entry) or not PySpin.IsReadable(node_handling_mode_entry):
+            print(f'Cannot recognize stream buffer handling mode "{mode}"...')
+            return(False)
+
+        node_handling_mode.SetIntValue(node_handling_mode_entry.GetValue())
+        if verbose:
+            print(f'Stream buffer handling mode set to {mode}')
+    except PySpin.SpinnakerException as ex:
+        print('set_stream_buffer_handling_mode() Error: %s' % ex)
+        return(False)
+
+    return(True)
+
+## ====================================================================================
+def get_stream_buffer_settings(nodemap_tlstream, verbose=False):
+    """
+    Get the current stream buffer settings.
+
+    :param nodemap_tlstream: Transport layer stream nodemap (from cam.GetTLStreamNodeMap()).
+    :type nodemap_tlstream: INodeMap
+    :return: The buffer count (0 if in "Auto" mode) and the buffer handling mode, or (0, '') if an error occurred.
+    :rtype: tuple
+    """
+
+    buffer_count = 0
+    handling_mode = ''
+
+    try:
+        node_count_mode = PySpin.CEnumerationPtr(nodemap_tlstream.GetNode('StreamBufferCountMode'))
+        node_buffer_count = PySpin.CIntegerPtr(nodemap_tlstream.GetNode('StreamBufferCountManual'))
+        if PySpin.IsAvailable(node_count_mode) and PySpin.IsReadable(node_count_mode):
+            if (node_count_mode.GetCurrentEntry().GetSymbolic() == 'Manual') and PySpin.IsReadable(node_buffer_count):
+                buffer_count = node_buffer_count.GetValue()
+        else:
+            print('StreamBufferCountMode node is not available...')
+
+        node_handling_mode = PySpin.CEnumerationPtr(nodemap_tlstream.GetNode('StreamBufferHandlingMode'))
+        if PySpin.IsAvailable(node_handling_mode) and PySpin.IsReadable(node_handling_mode):
+            handling_mode = node_handling_mode.GetCurrentEntry().GetSymbolic()
+        else:
+            print('StreamBufferHandlingMode node is not available...')
+
+        if verbose:
+            print(f'Stream buffer count = {buffer_count if buffer_count else "Auto"}, handling mode = {handling_mode}')
+    except PySpin.SpinnakerException as ex:
+        print('get_stream_buffer_settings() Error: %s' % ex)
+
+    return(buffer_count, handling_mode)
+
+## ====================================================================================
+def set_integer_value(nodemap, node_name, value, verbose=False):
+    """
+    Set an integer node, clipping the value to the node's limits and truncating it to a multiple of the node's
+    increment.
+
+    :param nodemap: Device GenICam nodemap
+    :type nodemap: INodeMap
+    :param node_name: String, such as 'GevSCPSPacketSize'.
+    :param value: int
+    :return: True if successful, False otherwise.
+    :rtype: bool
+    """
+
+    try:
+        node = PySpin.CIntegerPtr(nodemap.GetNode(node_name))
+        if not PySpin.IsAvailable(node) or not PySpin.IsWritable(node):
+            print(f'{node_name} node is not available...')
+            return(False)
+
+        min_value = node.GetMin()
+        max_value = node.GetMax()
+        set_value = min((max((int(value), min_value)), max_value))
+        set_value = max((min_value + truncate_multiple(set_value - min_value, node.GetInc()), min_value))
+        node.SetValue(set_value)
+        if verbose:
+            print(f'{node_name}: limits = ({min_value},{max_value}), value set to {set_value}')
+    except PySpin.SpinnakerException as ex:
+        print('set_integer_value() Error: %s' % ex)
+        return(False)
+
+    return(True)
+
+## ====================================================================================
+def get_link_settings(nodemap, verbose=False):
+    """
+    Get the settings that control how much of the camera link's bandwidth the camera uses: the throughput limit
+    (bytes/sec), and for GigE cameras the stream packet size (bytes) and the delay between packets (in timestamp
+    ticks). The throughput limit caps the camera's frame rate, so that several cameras (or one high resolution camera)
+    can share a bus without the host receiving incomplete images.
+
+    :param nodemap: Device GenICam nodemap
+    :type nodemap: INodeMap
+    :return: A dict with keys 'DeviceLinkThroughputLimit', 'GevSCPSPacketSize' and 'GevSCPD'. The value is None for
+        any node the camera does not have (such as the GigE nodes on a USB3 camera).
+    :rtype: dict
+    """
+
+    settings = {}
+    for node_name in ('DeviceLinkThroughputLimit', 'GevSCPSPacketSize', 'GevSCPD'):
+        settings[node_name] = None
+        try:
+            node = PySpin.CIntegerPtr(nodemap.GetNode(node_name))
+            if PySpin.IsAvailable(node) and PySpin.IsReadable(node):
+                settings[node_name] = node.GetValue()
+        except PySpin.SpinnakerException as ex:
+            print('get_link_settings() Error: %s' % ex)
+
+    if verbose:
+        print(f'Link throughput limit = {settings["DeviceLinkThroughputLimit"]}, packet size = '
+              f'{settings["GevSCPSPacketSize"]}, packet delay = {settings["GevSCPD"]}')
+
+    return(settings)
+
+## ====================================================================================
+def set_link_settings(nodemap, throughput_limit=None, packet_size=None, packet_delay=None, verbose=False):
+    """
+    Set the link bandwidth settings (see get_link_settings()). The packet size can only be changed while the camera
+    is not acquiring.
+
+    :param nodemap: Device GenICam nodemap
+    :type nodemap: INodeMap
+    :param throughput_limit: The link throughput limit in bytes/sec, or None to leave unchanged.
+    :param packet_size: The GigE stream packet size in bytes, or None to leave unchanged.
+    :param packet_delay: The GigE inter-packet delay in timestamp ticks, or None to leave unchanged.
+    :return: True if successful, False otherwise.
+    :rtype: bool
+    """
+
+    ok = True
+
+    if (throughput_limit is not None):
+        ## Some cameras only apply the limit when the limit mode is on.
+        try:
+            node_limit_mode = PySpin.CEnumerationPtr(nodemap.GetNode('DeviceLinkThroughputLimitMode'))
+            if PySpin.IsAvailable(node_limit_mode) and PySpin.IsWritable(node_limit_mode):
+                node_limit_mode.SetIntValue(node_limit_mode.GetEntryByName('On').GetValue())
+        except PySpin.SpinnakerException as ex:
+            print('set_link_settings() Error: %s' % ex)
+            return(False)
+        ok &= set_integer_value(nodemap, 'DeviceLinkThroughputLimit', throughput_limit, verbose=verbose)
+
+    if (packet_size is not None):
+        ok &= set_integer_value(nodemap, 'GevSCPSPacketSize', packet_size, verbose=verbose)
+    if (packet_delay is not None):
+        ok &= set_integer_value(nodemap, 'GevSCPD', packet_delay, verbose=verbose)
+
+    return(ok)
+
+## ====================================================================================
+def measure_link_quality(cam, nodemap, num_images=100):
+    """
+    Stream a number of frames and measure how many of them fail to arrive complete.
+
+    :param cam: Camera to acquire images from.
+    :type cam: CameraPtr
+    :param nodemap: Device GenICam nodemap
+    :type nodemap: INodeMap
+    :param num_images: The number of frames to grab.
+    :return: The fraction of frames that were dropped, incomplete or timed out, and the camera's frame rate (Hz)
+        measured from the frame timestamps.
+    :rtype: tuple
+    """
+
+    session = AcquisitionSession(cam, nodemap)
+    if not session.start():
+        return(1.0, 0.0)
+
+    (image_width, image_height) = get_image_size(nodemap)
+    out = zeros((image_height,image_width), 'uint16')
+    ## The bad frames are what is being counted here, so silence the message printed for each one.
+    try:
+        with io.StringIO() as buf, redirect_stdout(buf):
+            for i in range(num_images):
+                session.get_next_image(out=out)
+    finally:
+        session.stop()
+
+    d = session.report.summary()
+    num_frames = max(num_images, d['delivered'] + d['dropped'] + d['incomplete'])
+    bad_fraction = 1.0 - d['delivered'] / num_frames
+    fps = (1000.0 / d['interval_mean_ms']) if (d['interval_mean_ms'] > 0.0) else 0.0
+
+    return(bad_fraction, fps)
+
+## ====================================================================================
+def tune_link_throughput(cam, nodemap, num_images=100, max_bad_fraction=0.0, min_fraction=0.2, num_steps=9,
+                         packet_sizes=(9000,1500,1400), verbose=False):
+    """
+    Find the highest link throughput that delivers clean frames. The throughput is stepped down from the link's
+    maximum, and at each step (for GigE cameras) the packet sizes are tried from largest to smallest, until a setting
+    is found whose fraction of bad (dropped, incomplete or timed out) frames is no more than "max_bad_fraction". GigE
+    cameras without a throughput limit node are throttled with the inter-packet delay instead. If no setting is
+    clean, the setting with the fewest bad frames is used.
+
+    The camera must be free-running (trigger off) and not acquiring. When tuning a camera that shares a bus, the other
+    cameras should be streaming at the same time, since it is the total load on the bus that causes the losses.
+
+    :param cam: Camera to acquire images from.
+    :type cam: CameraPtr
+    :param nodemap: Device GenICam nodemap
+    :type nodemap: INodeMap
+    :param num_images: The number of frames to grab for each trial setting.
+    :param max_bad_fraction: The largest fraction of bad frames counted as clean.
+    :param min_fraction: The lowest throughput to try, as a fraction of the maximum.
+    :param num_steps: The number of throughput steps between the maximum and the lowest throughput.
+    :param packet_sizes: The GigE packet sizes (bytes) to try, besides the largest the camera allows. Jumbo packets
+        only work if the network adapter has jumbo frames enabled.
+    :return: The chosen settings (as from get_link_settings()), and a list of the trials, each a dict of the settings
+        along with the measured 'bad_fraction' and 'fps'.
+    :rtype: tuple
+    """
+
+    start_settings = get_link_settings(nodemap)
+    has_limit = (start_settings['DeviceLinkThroughputLimit'] is not None)
+    has_packet_size = (start_settings['GevSCPSPacketSize'] is not None)
+    has_delay = (start_settings['GevSCPD'] is not None)
+    fractions = [1.0 - (1.0 - min_fraction) * i / max(num_steps - 1, 1) for i in range(num_steps)]
+
+    ## The packet sizes to try, from largest to smallest.
+    packet_candidates = [None]
+    if has_packet_size:
+        node_packet_size = PySpin.CIntegerPtr(nodemap.GetNode('GevSCPSPacketSize'))
+        (min_size, max_size, inc) = (node_packet_size.GetMin(), node_packet_size.GetMax(), node_packet_size.GetInc())
+        sizes = [min_size + truncate_multiple(min((max((size, min_size)), max_size)) - min_size, inc)
+                 for size in ((max_size,) + tuple(packet_sizes))]
+        packet_candidates = sorted(set(sizes), reverse=True)
+
+    ## The throughput settings to try, from highest to lowest: either limits, or inter-packet delays. A delay is
+    ## converted from a fraction of the throughput by assuming a 1 Gbit/s link.
+    throughput_candidates = []
+    if has_limit:
+        node_limit = PySpin.CIntegerPtr(nodemap.GetNode('DeviceLinkThroughputLimit'))
+        (min_limit, max_limit) = (node_limit.GetMin(), node_limit.GetMax())
+        for f in fractions:
+            throughput_candidates.append({'DeviceLinkThroughputLimit':max(int(f * max_limit), min_limit)})
+    elif has_delay:
+        node_tick_frequency = PySpin.CIntegerPtr(nodemap.GetNode('GevTimestampTickFrequency'))
+        tick_frequency = node_tick_frequency.GetValue() if PySpin.IsReadable(node_tick_frequency) else 1000000000
+        packet_size = start_settings['GevSCPSPacketSize'] if has_packet_size else 1500
+        packet_time = packet_size / 125.0E6
+        for f in fractions:
+            throughput_candidates.append({'GevSCPD':int(packet_time * (1.0 / f - 1.0) * tick_frequency)})
+    else:
+        print('tune_link_throughput(): this camera has no link throughput settings...')
+        return(start_settings, [])
+
+    trials = []
+    chosen = None
+    for throughput_setting in throughput_candidates:
+        for packet_size in packet_candidates:
+            trial = dict(throughput_setting)
+            if (packet_size is not None):
+                trial['GevSCPSPacketSize'] = packet_size
+            set_link_settings(nodemap, throughput_limit=trial.get('DeviceLinkThroughputLimit'),
+                              packet_size=trial.get('GevSCPSPacketSize'), packet_delay=trial.get('GevSCPD'))
+
+            (trial['bad_fraction'], trial['fps']) = measure_link_quality(cam, nodemap, num_images)
+            trials.append(trial)
+            if verbose:
+                print(f'tune_link_throughput(): {throughput_setting}, packet size = {packet_size}: '
+                      f'{100.0 * trial["bad_fraction"]:.1f}% bad frames at {trial["fps"]:.1f} fps')
+
+            if (trial['bad_fraction'] <= max_bad_fraction):
+                chosen = trial
+                break
+        if chosen is not None:
+            break
+
+    ## If nothing was clean, then fall back to the trial with the fewest losses (the earliest, if tied).
+    if chosen is None:
+        chosen = min(trials, key=lambda t: t['bad_fraction'])
+        print(f'tune_link_throughput(): no setting was clean; using the one with the fewest bad frames '
+              f'({100.0 * chosen["bad_fraction"]:.1f}%)')
+
+    set_link_settings(nodemap, throughput_limit=chosen.get('DeviceLinkThroughputLimit'),
+                      packet_size=chosen.get('GevSCPSPacketSize'), packet_delay=chosen.get('GevSCPD'))
+    settings = get_link_settings(nodemap, verbose=verbose)
+
+    return(settings, trials)
+
+## ====================================================================================
+def unpack_mono12p(packed, height, width, out=None, left_align=True):
+    """
+    Unpack a Mono12p image (two 12-bit pixels packed into every three bytes) into a uint16 array. The packing follows
+    the GenICam convention: pixel 0 is byte 0 plus the low nibble of byte 1, and pixel 1 is the high nibble of byte 1
+    plus byte 2.
+
+    :param packed: The raw image bytes (a 1D uint8 array, as returned by ImagePtr.GetData()).
+    :param height: uint
+    :param width: uint
+    :param out: A preallocated contiguous uint16 destination of shape (height,width). If None, then a new array is
+        allocated.
+    :param left_align: If True, then shift the 12-bit values into the top of the 16-bit range, so that the result has
+        the same scale as an unbinned Mono16 image. (A binned Mono16 image sums the binned pixels and so has more than
+        12 significant bits, while a Mono12p image always has 12.)
+    :return: The unpacked image.
+    :rtype: ndarray
+    """
+
+    npixels = height * width
+    if out is None:
+        out = empty((height,width), 'uint16')
+    out_flat = out.reshape(-1)
+
+    npairs = npixels // 2
+    triplets = packed[:3*npairs].reshape(npairs, 3)
+    byte0 = triplets[:,0]
+    byte1 = triplets[:,1]
+    byte2 = triplets[:,2]
+
+    even = out_flat[0:2*npairs:2]
+    odd = out_flat[1:2*npairs:2]
+    even[:] = byte1 & 0x0F
+    even <<= 8
+    even |= byte0
+    odd[:] = byte2
+    odd <<= 4
+    odd |= (byte1 >> 4)
+
+    ## An odd number of pixels leaves one pixel in a final pair of bytes.
+    if (npixels % 2 == 1):
+        out_flat[-1] = uint16(packed[3*npairs]) | (uint16(packed[3*npairs+1] & 0x0F) << 8)
+
+    if left_align:
+        out_flat <<= 4
+
+    return(out)
+
+## ====================================================================================
+def copy_image_data(image_result, out=None):
+    """
+    Copy the pixels of an image retrieved from the camera into a caller-owned array, in a single pass. GetNDArray()
+    returns a view onto the camera buffer rather than a copy, so once this function returns, the image can (and
+    should) be released right away. Mono12p images are unpacked on the way, into the same scale as Mono16 images.
+
+    :param image_result: The image retrieved from the camera.
+    :type image_result: ImagePtr
+    :param out: A preallocated contiguous destination, such as one frame of a stack or a ring buffer slot. If None,
+        then a new array is allocated.
+    :return: The destination array.
+    :rtype: ndarray
+    """
+
+    if (image_result.GetPixelFormatName() == 'Mono12p'):
+        (height, width) = (image_result.GetHeight(), image_result.GetWidth())
+        if (out is not None) and (out.shape != (height,width)):
+            raise ValueError(f'Image shape {(height,width)} does not match the destination shape {out.shape}')
+        return(unpack_mono12p(image_result.GetData(), height, width, out=out))
+
+    image_view = image_result.GetNDArray()
+    if out is None:
+        out = empty(image_view.shape, image_view.dtype)
+    elif (out.shape != image_view.shape):
+        raise ValueError(f'Image shape {image_view.shape} does not match the destination shape {out.shape}')
+
+    copyto(out, image_view)
+
+    return(out)
+
+## ====================================================================================
+## The record layout used for per-frame metadata. With chunk data enabled, every field is carried in-band with the
+## image; otherwise only the frame ID and timestamp are available, and the exposure time and gain are set to NaN.
+FRAME_METADATA_DTYPE = [('frame_id','uint64'), ('timestamp','uint64'), ('exposure_time','float64'), ('gain','float64')]
+
+## ====================================================================================
+def enable_chunk_data(nodemap, chunk_names=('Timestamp','ExposureTime','Gain','FrameID'), verbose=False):
+    """
+    Turn on GenICam chunk data, so that the camera appends the selected per-frame values to every image. These are
+    then decoded from each image without any extra reads of the nodemap. This must be applied before
+    BeginAcquisition() is called.
+
+    :param nodemap: Device GenICam nodemap
+    :type nodemap: INodeMap
+    :param chunk_names: The names of the chunk entries to enable.
+    :return: True if successful, False otherwise.
+    :rtype: bool
+    """
+
+    try:
+        node_chunk_mode_active = PySpin.CBooleanPtr(nodemap.GetNode('ChunkModeActive'))
+        if not PySpin.IsAvailable(node_chunk_mode_active) or not PySpin.IsWritable(node_chunk_mode_active):
+            print('ChunkModeActive node is not available...')
+            return(False)
+        node_chunk_mode_active.SetValue(True)
+
+        ## Each chunk entry is enabled by first selecting it, and then setting the "ChunkEnable" switch.
+        node_chunk_selector = PySpin.CEnumerationPtr(nodemap.GetNode('ChunkSelector'))
+        if not PySpin.IsAvailable(node_chunk_selector) or not PySpin.IsWritable(node_chunk_selector):
+            print('ChunkSelector node is not available...')
+            return(False)
+
+        result = True
+        for name in chunk_names:
+            node_chunk_entry = node_chunk_selector.GetEntryByName(name)
+            if not PySpin.IsAvailable(node_chunk_entry) or not PySpin.IsReadable(node_chunk_entry):
+                print(f'Chunk entry "{name}" is not available...')
+                result = False
+                continue
+            node_chunk_selector.SetIntValue(node_chunk_entry.GetValue())
+
+            node_chunk_enable = PySpin.CBooleanPtr(nodemap.GetNode('ChunkEnable'))
+            if PySpin.IsAvailable(node_chunk_enable) and PySpin.IsWritable(node_chunk_enable):
+                node_chunk_enable.SetValue(True)
+            elif not (PySpin.IsAvailable(node_chunk_enable) and PySpin.IsReadable(node_chunk_enable) and node_chunk_enable.GetValue()):
+                ## Some entries are always on, in which case "ChunkEnable" is read-only and already True.
+                print(f'Cannot enable chunk entry "{name}"...')
+                result = False
+                continue
+
+            if verbose:
+                print(f'Chunk entry "{name}" enabled')
+    except PySpin.SpinnakerException as ex:
+        print('enable_chunk_data() Error: %s' % ex)
+        return(False)
+
+    return(result)
+
+## ====================================================================================
+def disable_chunk_data(nodemap, verbose=False):
+    """
+    Turn off GenICam chunk data. This must be applied before BeginAcquisition() is called.
+
+    :param nodemap: Device GenICam nodemap
+    :type nodemap: INodeMap
+    :return: True if successful, False otherwise.
+    :rtype: bool
+    """
+
+    try:
+        node_chunk_mode_active = PySpin.CBooleanPtr(nodemap.GetNode('ChunkModeActive'))
+        if not PySpin.IsAvailable(node_chunk_mode_active) or not PySpin.IsWritable(node_chunk_mode_active):
+            print('ChunkModeActive node is not available...')
+            return(False)
+        node_chunk_mode_active.SetValue(False)
+        if verbose:
+            print('Chunk data disabled')
+    except PySpin.SpinnakerException as ex:
+        print('disable_chunk_data() Error: %s' % ex)
+        return(False)
+
+    return(True)
+
+## ====================================================================================
+def read_frame_metadata(image_result, metadata, index, chunk_data=True):
+    """
+    Decode the per-frame metadata of an image into one record of a FRAME_METADATA_DTYPE array.
+
+    :param image_result: The image retrieved from the camera.
+    :type image_result: ImagePtr
+    :param metadata: A numpy record array with dtype FRAME_METADATA_DTYPE.
+    :param index: The record to write.
+    :param chunk_data: Whether chunk data is enabled on the camera (see enable_chunk_data()).
+    """
+
+    if chunk_data:
+        chunk = image_result.GetChunkData()
+        metadata[index] = (chunk.GetFrameID(), chunk.GetTimestamp(), chunk.GetExposureTime(), chunk.GetGain())
+    else:
+        metadata[index] = (image_result.GetFrameID(), image_result.GetTimeStamp(), nan, nan)
+
+    return
+
+## ====================================================================================
+class FramePool:
+    """
+    A pool of reusable image buffers, so that a steady stream of frames of the same size is processed without
+    allocating new arrays for every frame. Buffers are keyed by shape and dtype, and are reference counted: acquire()
+    hands out a buffer with one reference, retain() adds a reference for each extra owner, and release() drops one.
+    When the last reference is dropped the buffer goes back to the pool, and its contents may be overwritten by the
+    next acquire(). A view of a pooled buffer (such as one frame of a pooled video stack) can be passed to retain()
+    and release() in place of the buffer itself. Arrays that did not come from the pool are ignored by both, so the
+    owner of an image does not need to know where it came from.
+
+    :param max_free: The largest number of released buffers kept for each shape and dtype. Any more are dropped.
+    """
+
+    def __init__(self, max_free=4):
+        self.max_free = max_free
+        self.free = {}              ## (shape, dtype) -> list of released buffers
+        self.refcounts = {}         ## id(buffer) -> [buffer, reference count], for the buffers handed out
+        self.num_allocated = 0      ## the number of buffers allocated so far (for checking that buffers are reused)
+        self.lock = threading.Lock()
+
+    ## ===================================
+    def acquire(self, shape, dtype='uint16'):
+        """
+        Get a buffer with one reference. Its contents are undefined.
+
+        :param shape: tuple
+        :param dtype: The numpy dtype of the buffer.
+        :return: The buffer.
+        :rtype: ndarray
+        """
+
+        key = (tuple(shape), numpy_dtype(dtype))
+        with self.lock:
+            free_list = self.free.get(key)
+            if free_list:
+                buffer = free_list.pop()
+            else:
+                buffer = empty(key[0], key[1])
+                self.num_allocated += 1
+            self.refcounts[id(buffer)] = [buffer, 1]
+
+        return(buffer)
+
+    ## ===================================
+    def _find(self, array):
+        ## Follow a view back to the pooled buffer it was taken from. Call with the lock held.
+        while (array is not None):
+            entry = self.refcounts.get(id(array))
+            if (entry is not None) and (entry[0] is array):
+                return(entry)
+            array = getattr(array, 'base', None)
+        return(None)
+
+    ## ===================================
+    def retain(self, array):
+        """
+        Add a reference to the pooled buffer holding "array".
+
+        :return: True if the array came from the pool, False otherwise.
+        :rtype: bool
+        """
+
+        with self.lock:
+            entry = self._find(array)
+            if entry is None:
+                return(False)
+            entry[1] += 1
+
+        return(True)
+
+    ## ===================================
+    def release(self, array):
+        """
+        Drop a reference to the pooled buffer holding "array", returning the buffer to the pool when no references
+        remain.
+
+        :return: True if the array came from the pool, False otherwise.
+        :rtype: bool
+        """
+
+        with self.lock:
+            entry = self._find(array)
+            if entry is None:
+                return(False)
+            entry[1] -= 1
+            if (entry[1] > 0):
+                return(True)
+
+            buffer = entry[0]
+            del self.refcounts[id(buffer)]
+            free_list = self.free.setdefault((buffer.shape, buffer.dtype), [])
+            if (len(free_list) < self.max_free):
+                free_list.append(buffer)
+
+        return(True)
+
+    ## ===================================
+    def frame(self, shape, dtype='uint16'):
+        """
+        Get a buffer for use in a "with" block, which releases it at the end of the block.
+
+        :rtype: contextlib.AbstractContextManager
+        """
+
+        return(_PooledFrame(self, shape, dtype))
+
+    ## ===================================
+    def clear(self):
+        """
+        Drop all of the released buffers, such as after the image size has changed. Buffers still in use are not
+        affected, and return to the pool when they are released.
+        """
+
+        with self.lock:
+            self.free.clear()
+        return
+
+class _PooledFrame:
+    def __init__(self, pool, shape, dtype):
+        (self.pool, self.shape, self.dtype) = (pool, shape, dtype)
+
+    def __enter__(self):
+        self.buffer = self.pool.acquire(self.shape, self.dtype)
+        return(self.buffer)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.pool.release(self.buffer)
+        return(False)
+
+## ====================================================================================
+class AcquisitionReport:
+    """
+    Per-acquisition accounting of the frames delivered by the camera. Each frame's camera FrameID and timestamp are
+    recorded, so that gaps in the FrameID sequence (frames dropped before they reached the host) and incomplete
+    frames are counted, and the inter-frame intervals show whether the acquisition actually ran at the rate that was
+    configured.
+
+    :param num_expected: The number of frames the acquisition was asked for (0 if open-ended).
+    """
+
+    def __init__(self, num_expected=0):
+        self.num_expected = num_expected
+        self.num_delivered = 0          ## complete frames handed to the caller
+        self.num_dropped = 0            ## frames missing from the FrameID sequence
+        self.num_incomplete = 0         ## frames that arrived incomplete
+        self.num_retries = 0            ## extra grabs needed to replace incomplete or failed frames
+        self.last_frame_id = None
+        self.last_timestamp = None
+
+        ## Running statistics of the intervals (in ns) between complete frames, so that long streams use no extra memory.
+        self.num_intervals = 0
+        self.interval_sum = 0
+        self.interval_sumsq = 0
+        self.interval_min = 0
+        self.interval_max = 0
+
+    ## ===================================
+    def _check_frame_id(self, frame_id):
+        if (self.last_frame_id is not None) and (frame_id > self.last_frame_id + 1):
+            self.num_dropped += frame_id - self.last_frame_id - 1
+        self.last_frame_id = frame_id
+        return
+
+    ## ===================================
+    def add_frame(self, frame_id, timestamp):
+        """
+        Record a complete frame.
+        """
+
+        self._check_frame_id(frame_id)
+        self.num_delivered += 1
+
+        if self.last_timestamp is not None:
+            interval = timestamp - self.last_timestamp
+            if (self.num_intervals == 0):
+                (self.interval_min, self.interval_max) = (interval, interval)
+            else:
+                self.interval_min = min((self.interval_min, interval))
+                self.interval_max = max((self.interval_max, interval))
+            self.interval_sum += interval
+            self.interval_sumsq += interval**2
+            self.num_intervals += 1
+        self.last_timestamp = timestamp
+        return
+
+    ## ===================================
+    def add_incomplete(self, frame_id):
+        """
+        Record an incomplete frame. It still uses up a FrameID, so it is not counted as dropped.
+        """
+
+        self._check_frame_id(frame_id)
+        self.num_incomplete += 1
+        return
+
+    ## ===================================
+    def add_image(self, image_result):
+        """
+        Record an image retrieved from the camera, complete or not.
+
+        :type image_result: ImagePtr
+        """
+
+        if image_result.IsIncomplete():
+            self.add_incomplete(image_result.GetFrameID())
+        else:
+            self.add_frame(image_result.GetFrameID(), image_result.GetTimeStamp())
+        return
+
+    ## ===================================
+    def summary(self):
+        """
+        Get the report as a dict. The inter-frame intervals are in ms, and are 0 if fewer than two frames arrived. The
+        standard deviation of the intervals ("interval_std_ms") is the frame jitter.
+
+        :rtype: dict
+        """
+
+        d = {}
+        d['expected'] = self.num_expected
+        d['delivered'] = self.num_delivered
+        d['dropped'] = self.num_dropped
+        d['incomplete'] = self.num_incomplete
+        d['retries'] = self.num_retries
+        d['interval_min_ms'] = self.interval_min / 1.0E6
+        d['interval_mean_ms'] = (self.interval_sum / self.num_intervals / 1.0E6) if (self.num_intervals > 0) else 0.0
+        d['interval_max_ms'] = self.interval_max / 1.0E6
+        d['interval_std_ms'] = 0.0
+        if (self.num_intervals > 1):
+            variance = (self.interval_sumsq - self.interval_sum**2 / self.num_intervals) / (self.num_intervals - 1)
+            d['interval_std_ms'] = max(variance, 0.0)**0.5 / 1.0E6
+        return(d)
+
+    ## ===================================
+    def __str__(self):
+        d = self.summary()
+        s = f'delivered={d["delivered"]}'
+        if d['expected']:
+            s += f'/{d["expected"]}'
+        s += f', dropped={d["dropped"]}, incomplete={d["incomplete"]}'
+        if d['retries']:
+            s += f', retries={d["retries"]}'
+        if (d['interval_mean_ms'] > 0.0):
+            s += f', frame interval (ms): min={d["interval_min_ms"]:.2f}, mean={d["interval_mean_ms"]:.2f}, max={d["interval_max_ms"]:.2f}'
+            s += f' ({1000.0 / d["interval_mean_ms"]:.1f} fps)'
+        return(s)
+
+## ====================================================================================
+def acquire_num_images(cam, nodemap, num_images, do_filesave=False, out=None, report=None, metadata=None, chunk_data=False,
+                       max_retries=None, timeout=None, verbose=False):
+    """
+    This function acquires and saves N images from a device. Incomplete frames are not counted, so the camera is read
+    until N complete frames have been collected, or until the retry budget or the timeout runs out. The camera must not
+    have image events registered (see AcquisitionSession.disable_image_events()), since GetNextImage() does not return
+    frames that are delivered to an image event handler.
+
+    :param cam: Camera to acquire images from.
+    :param nodemap: Device nodemap.
+    :param nodemap_tldevice: Transport layer device nodemap.
+    :type cam: CameraPtr
+    :param out: A preallocated contiguous stack of shape (num_images,Nx,Ny) to copy the frames into. If None, then a
+        new stack is allocated.
+    :param report: An AcquisitionReport to fill in with the dropped and incomplete frame counts, or None.
+    :type report: AcquisitionReport
+    :param metadata: A FRAME_METADATA_DTYPE record array of length num_images to fill in with each frame's metadata,
+        or None.
+    :param chunk_data: Whether chunk data is enabled on the camera (see enable_chunk_data()).
+    :param max_retries: The number of incomplete (or failed) frames to tolerate before giving up. If None, then up to
+        num_images retries are allowed.
+    :param timeout: The maximum time (in sec) for the whole acquisition, or None for no limit.
+    :return: The image set (a view of shape (Nx,Ny,num_images) onto the frame stack) and the array of timestamps, or
+        (None, 0) if N complete frames could not be collected.
+    :rtype: tuple
+    """
+
+    (image_width, image_height) = get_image_size(nodemap, verbose=False)
+    if max_retries is None:
+        max_retries = num_images
+    if report is None:
+        report = AcquisitionReport(num_images)
+    image_set = None
+    ts_set = 0
+
+    try:
+        ## Set acquisition mode to continuous.
+        if not set_acquisition_mode(nodemap, 'Continuous'):
+            return(None, 0)
+
+        ## Keep each frame contiguous in memory, so that it can be copied from the camera buffer in one pass.
+        frame_stack = zeros((num_images,image_height,image_width), 'uint16') if (out is None) else out
+        image_set = moveaxis(frame_stack, 0, -1)
+        ts_set = zeros(num_images, 'uint64')
+
+        ## Begin acquiring images. Image acquisition must be ended when no more images are needed, so it is ended in a
+        ## "finally" clause, whichever way the loop below exits.
+        grab_timeout = get_grab_timeout(nodemap)
+        cam.BeginAcquisition()
+
+        try:
+            ## Retrieve, convert, and save images. "i" only advances on a complete frame, so that no slice of the image
+            ## set is left as zeros.
+            deadline = None if (timeout is None) else (time.time() + timeout)
+            i = 0
+            while (i < num_images):
+                if (report.num_retries > max_retries) or ((deadline is not None) and (time.time() > deadline)):
+                    print(f'acquire_num_images(): collected only {i} of {num_images} complete frames after {report.num_retries} retries. Aborting...')
+                    return(None, 0)
+
+                image_result = None
+                try:
+                    ## Retrieve the next received image. Capturing an image houses images on the camera buffer. Trying to
+                    ## capture an image that does not exist will hang the camera. Once an image from the buffer is saved
+                    ## and/or no longer needed, the image must be released in order to keep the buffer from filling up.
+                    image_result = cam.GetNextImage(grab_timeout)
+                    report.add_image(image_result)
+
+                    ## Ensure image completion. This should be done whenever a complete image is expected or required.
+                    if image_result.IsIncomplete():
+                        print('Image incomplete with image status %d ...' % image_result.GetImageStatus())
+                        report.num_retries += 1
+                        continue
+                    else:
+                        ## Get the image height and width. Image objects have quite a bit of available metadata including
+                        ## things such as CRC, image status, and offset values, to name a few.
+                        #width = image_result.GetWidth()
+                        #height = image_result.GetHeight()
+                        #fmt = image_result.GetPixelFormatName()
+                        ts_set[i] = image_result.GetTimeStamp()
+                        #msg = 'Grabbed Image width=%d, height=%d, fmt=%s, timestamp(ns)=%d' % (width, height, fmt, ts)
+
+                    if do_filesave:
+                        ## Convert image for saving. PySpin can save 16-bit data in RAW format, but all other formats must be 8-bit.
+                        filename = f'{i:05d}.tif'
+                        if filename.endswith('raw') and (image_result.GetPixelFormatName() in ('Mono16','Mono12p')):
+                            image_converted = image_result.Convert(PySpin.PixelFormat_Mono16, PySpin.HQ_LINEAR)
+                        else:
+                            image_converted = image_result.Convert(PySpin.PixelFormat_Mono8, PySpin.HQ_LINEAR)
+                        image_converted.Save(filename)
+
+                    ## This is the numpy array result to return.
+                    copy_image_data(image_result, frame_stack[i])
+                    if metadata is not None:
+                        read_frame_metadata(image_result, metadata, i, chunk_data=chunk_data)
+                    #print(i, f'amin(image_set[:,:,i])={amin(image_set[:,:,i]):.1f}, amax(image_set[:,:,i])={amax(image_set[:,:,i]):.1f}')
+                    i += 1
+
+                except PySpin.SpinnakerException as ex:
+                    print('acquire_num_images(): Error 1: %s' % ex)
+                    report.num_retries += 1
+                finally:
+                    ## Release image. Images retrieved directly from the camera (i.e. non-converted
+                    ## images) need to be released in order to keep from filling the buffer.
+                    if image_result is not None:
+                        image_result.Release()
+
+        finally:
+            ## End acquisition. Ending acquisition appropriately helps ensure that devices clean up
+            ## properly and do not need to be power-cycled to maintain integrity.
+            cam.EndAcquisition()
+
+        if verbose and (report.num_retries > 0):
+            print(f'acquire_num_images(): {report.num_retries} retries were needed to collect {num_images} complete frames')
+
+    except PySpin.SpinnakerException as ex:
+        print('acquire_num_images(): Error 2: %s' % ex)
+        return(None, 0)
+    except ValueError as ex:
+        ## Such as a destination stack whose shape does not match the images.
+        print('acquire_num_images() Error: %s' % ex)
+        return(None, 0)
+
+    return(image_set, ts_set)
+
+## ====================================================================================
+def acquire_burst(cam, nodemap, num_images, out=None, report=None, metadata=None, chunk_data=False, verbose=False):
+    """
+    Acquire a burst of N back-to-back frames in MultiFrame mode. The camera emits exactly N frames at its full frame
+    rate, and these are drained into a preallocated stack, so there are no trailing buffered frames and the spacing
+    between frames is as tight as the camera allows. The camera must not be streaming or have image events registered
+    (see AcquisitionSession.disable_image_events()) when this is called, and is returned to Continuous mode afterward.
+
+    :param cam: Camera to acquire images from.
+    :type cam: CameraPtr
+    :param nodemap: Device nodemap.
+    :param num_images: uint
+    :param out: A preallocated contiguous stack of shape (num_images,Nx,Ny) to copy the frames into. If None, then a
+        new stack is allocated.
+    :param report: An AcquisitionReport to fill in with the dropped and incomplete frame counts, or None.
+    :type report: AcquisitionReport
+    :param metadata: A FRAME_METADATA_DTYPE record array of length num_images to fill in, or None.
+    :param chunk_data: Whether chunk data is enabled on the camera (see enable_chunk_data()).
+    :return: The image set (a view of shape (Nx,Ny,n) onto the frame stack) and the array of timestamps, where n is
+        the number of complete frames (incomplete or dropped frames cannot be replaced within a burst), or (None, 0)
+        if an error occurred or no complete frame arrived.
+    :rtype: tuple
+    """
+
+    (image_width, image_height) = get_image_size(nodemap, verbose=False)
+    if report is None:
+        report = AcquisitionReport(num_images)
+
+    try:
+        if not set_acquisition_mode(nodemap, 'MultiFrame'):
+            return(None, 0)
+
+        node_frame_count = PySpin.CIntegerPtr(nodemap.GetNode('AcquisitionFrameCount'))
+        if not PySpin.IsAvailable(node_frame_count) or not PySpin.IsWritable(node_frame_count):
+            print('AcquisitionFrameCount node is not available...')
+            set_acquisition_mode(nodemap, 'Continuous')
+            return(None, 0)
+
+        max_frame_count = node_frame_count.GetMax()
+        if (num_images < node_frame_count.GetMin()) or (num_images > max_frame_count):
+            print(f'Cannot acquire a burst of {num_images} frames. The allowed range is ({node_frame_count.GetMin()},{max_frame_count}).')
+            set_acquisition_mode(nodemap, 'Continuous')
+            return(None, 0)
+        node_frame_count.SetValue(num_images)
+
+        frame_stack = zeros((num_images,image_height,image_width), 'uint16') if (out is None) else out
+        ts_set = zeros(num_images, 'uint64')
+
+        grab_timeout = get_grab_timeout(nodemap)
+        cam.BeginAcquisition()
+
+        ## Drain the burst. Complete frames are packed at the front of the stack.
+        n = 0
+        num_dropped_before = report.num_dropped
+        try:
+            for i in range(num_images):
+                ## The camera sends exactly N frames, so once a frame has been dropped in transfer, the wait for the last
+                ## one times out. The frames already collected are kept, and the missing ones are counted as dropped
+                ## (the FrameID gaps only show the frames missing between two that arrived).
+                try:
+                    image_result = cam.GetNextImage(grab_timeout)
+                except PySpin.SpinnakerException as ex:
+                    num_missing = (num_images - i) - (report.num_dropped - num_dropped_before)
+                    report.num_dropped += max(num_missing, 0)
+                    print(f'acquire_burst(): only {i} of {num_images} frames arrived ({ex})')
+                    break
+
+                try:
+                    report.add_image(image_result)
+
+                    if image_result.IsIncomplete():
+                        print('Image incomplete with image status %d ...' % image_result.GetImageStatus())
+                    else:
+                        copy_image_data(image_result, frame_stack[n])
+                        ts_set[n] = image_result.GetTimeStamp()
+                        if metadata is not None:
+                            read_frame_metadata(image_result, metadata, n, chunk_data=chunk_data)
+                        n += 1
+                finally:
+                    image_result.Release()
+        finally:
+            cam.EndAcquisition()
+            set_acquisition_mode(nodemap, 'Continuous')
+
+    except PySpin.SpinnakerException as ex:
+        print('acquire_burst() Error: %s' % ex)
+        return(None, 0)
+    except ValueError as ex:
+        ## Such as a destination stack whose shape does not match the images.
+        print('acquire_burst() Error: %s' % ex)
+        return(None, 0)
+
+    if verbose:
+        print(f'acquire_burst(): {report}')
+
+    if (n == 0):
+        return(None, 0)
+
+    return(moveaxis(frame_stack[:n], 0, -1), ts_set[:n])
+
+## ====================================================================================
+def acquire_exposure_bracket(cam, nodemap, exposures, gains=None, num_cycles=1, out=None, metadata=None, chunk_data=False,
+                             verbose=False):
+    """
+    Acquire an exposure-bracketed burst using the camera's sequencer: each frame of the burst uses the next exposure
+    in the bracket, and the bracket is repeated num_cycles times. The camera must not be streaming when this is called.
+
+    :param cam: Camera to acquire images from.
+    :type cam: CameraPtr
+    :param nodemap: Device nodemap.
+    :param exposures: The list of exposure times (in usec) in the bracket.
+    :param gains: The list of gains (in dB) in the bracket, or None to use the current gain throughout.
+    :param num_cycles: The number of times to repeat the bracket.
+    :param out: A preallocated contiguous stack of shape (len(exposures)*num_cycles,Nx,Ny), or None.
+    :param metadata: A FRAME_METADATA_DTYPE record array of length len(exposures)*num_cycles to fill in, or None.
+    :param chunk_data: Whether chunk data is enabled on the camera (see enable_chunk_data()). If so, then the exposure
+        tags are the exposure times the camera reports for each frame; otherwise they are the programmed exposures.
+    :return: The image set (a view of shape (Nx,Ny,n)) and the array of n exposure tags (in usec), or (None, 0) if an
+        error occurred.
+    :rtype: tuple
+    """
+
+    num_images = len(exposures) * num_cycles
+    if metadata is None:
+        metadata = zeros(num_images, FRAME_METADATA_DTYPE)
+
+    if not configure_sequencer(nodemap, exposures, gains, verbose=verbose):
+        disable_sequencer(nodemap)
+        return(None, 0)
+
+    report = AcquisitionReport(num_images)
+    try:
+        (img_set, ts_set) = acquire_burst(cam, nodemap, num_images, out=out, report=report, metadata=metadata,
+                                          chunk_data=chunk_data, verbose=verbose)
+    finally:
+        disable_sequencer(nodemap)
+
+    if img_set is None:
+        return(None, 0)
+
+    if chunk_data:
+        exposure_tags = array(metadata['exposure_time'][:img_set.shape[2]])
+    elif (img_set.shape[2] == num_images):
+        exposure_tags = array(list(exposures) * num_cycles, 'float64')
+    else:
+        ## Without chunk data, a missing frame would shift all the programmed exposures after it.
+        print(f'acquire_exposure_bracket(): {num_images - img_set.shape[2]} incomplete or dropped frames; cannot assign exposure tags without chunk data.')
+        return(None, 0)
+
+    return(img_set, exposure_tags)
+
+## ====================================================================================
+def acquire_one_image(cam, nodemap, filename='', out=None, verbose=False):
+    """
+    This function acquires and saves one image from a device.
+
+    :param cam: Camera to acquire images from.
+    :type cam: CameraPtr
+    :param nodemap: Device nodemap.
+    :param filename: The filename to use if saving the image. Otherwise null string.
+    :param out: A preallocated contiguous array to copy the image into. If None, then a new array is allocated.
+    :return: The image (a numpy array) and its timestamp in ns, or (None, 0) if an error occurred.
+    :rtype: tuple
+    """
+
+    image_data = None
+    ts = 0
+
+    try:
+        ## Begin image acquisition. Image acquisition must be ended when no more images are needed.
+        grab_timeout = get_grab_timeout(nodemap)
+        cam.BeginAcquisition()
+
+        ## Retrieve, convert, and save the image.
+        try:
+            ## Retrieve the next received image. Capturing an image houses images on the camera buffer. Trying to
+            ## capture an image that does not exist will hang the camera. Once an image from the buffer is saved
+            ## and/or no longer needed, the image must be released in order to keep the buffer from filling up.
+            image_result = cam.GetNextImage(grab_timeout)
+
+            ## Ensure image completion. This should be done whenever a complete image is expected or required.
+            if image_result.IsIncomplete():
+                print('Image incomplete with image status %d ...' % image_result.GetImageStatus())
+            else:
+                ## Get the image height and width. Image objects have quite a bit of available metadata including
+                ## things such as CRC, image status, and offset values, to name a few.
+                #width = image_result.GetWidth()
+                #height = image_result.GetHeight()
+                #fmt = image_result.GetPixelFormatName()
+                #msg = 'Grabbed Image width=%d, height=%d, fmt=%s, timestamp(ns)=%d' % (width, height, fmt, ts)
+
+                if filename:
+                    ## Convert image for saving. PySpin can save 16-bit data in RAW format, but all other formats must be 8-bit.
+                    if filename.endswith('raw') and (image_result.GetPixelFormatName() in ('Mono16','Mono12p')):
+                        image_converted = image_result.Convert(PySpin.PixelFormat_Mono16, PySpin.HQ_LINEAR)
+                    else:
+                        image_converted = image_result.Convert(PySpin.PixelFormat_Mono8, PySpin.HQ_LINEAR)
+                    image_converted.Save(filename)
+                    if verbose:
+                        print(msg + ', Image saved as: %s' % filename)
+                elif verbose:
+                    print(msg)
+
+                ## This is the numpy array result to return. Flip up-down to fit bottom-left origin display.
+                image_data = copy_image_data(image_result, out)
+                ts = image_result.GetTimeStamp()
+
+                ## Release image. Images retrieved directly from the camera (i.e. non-converted
+                ## images) need to be released in order to keep from filling the buffer.
+                image_result.Release()
+
+        except PySpin.SpinnakerException as ex:
+            print('acquire_one_image(): Error 1: %s' % ex)
+            return(None, 0)
+
+        ## End acquisition. Ending acquisition appropriately helps ensure that devices clean up
+        ## properly and do not need to be power-cycled to maintain integrity.
+        cam.EndAcquisition()
+
+    except PySpin.SpinnakerException as ex:
+        print('acquire_one_image(): Error 2: %s' % ex)
+        return(None, 0)
+
+    return(image_data, ts)
+
+## ====================================================================================
+## The record layout of a recording log (see video_fastsave()), with one record per frame grabbed. The status is 0 for a
+## frame saved to disk, the camera's image status for an incomplete frame, LOG_WRITE_FAILED if saving the frame failed,
+## or LOG_NOT_ACQUIRED if the frame was never grabbed (a timeout or an aborted recording). The file index is -1 for a
+## frame that was not saved, and the host timestamp is in ns since the epoch.
+RECORDING_LOG_DTYPE = [('frame_id','uint64'), ('file_index','int64'), ('timestamp','uint64'), ('host_timestamp','int64'),
+                       ('status','int32')]
+LOG_WRITE_FAILED = -1
+LOG_NOT_ACQUIRED = -2
+
+## ====================================================================================
+def summarize_recording_log(log, single_file=False):
+    """
+    Summarize a recording log in one line.
+
+    :param log: A RECORDING_LOG_DTYPE record array, as returned by video_fastsave() or loaded from its sidecar file.
+    :param single_file: Whether the recording was saved as a single file (the RAW_RECORDING_SUFFIX format), in which
+        case the log's file_index values are frame positions within that file rather than file numbers.
+    :rtype: str
+    """
+
+    saved = log[log['status'] == 0]
+    grabbed = log[log['status'] != LOG_NOT_ACQUIRED]
+    num_incomplete = int((log['status'] > 0).sum())
+    num_failed = int((log['status'] == LOG_WRITE_FAILED).sum())
+    num_missing = len(log) - len(grabbed)
+
+    s = f'saved {len(saved)} of {len(log)} frames'
+    if (len(saved) > 0):
+        if single_file:
+            s += f' (frames {saved["file_index"].min()}-{saved["file_index"].max()} of the recording file)'
+        else:
+            s += f' (files {saved["file_index"].min():05}-{saved["file_index"].max():05})'
+    if (len(grabbed) > 1):
+        ## Frames missing from the FrameID sequence never reached the host.
+        duration = (int(grabbed['timestamp'][-1]) - int(grabbed['timestamp'][0])) / 1.0E9
+        num_dropped = int(grabbed['frame_id'][-1]) - int(grabbed['frame_id'][0]) + 1 - len(grabbed)
+        if (duration > 0.0):
+            s += f', {(len(grabbed) + num_dropped - 1) / duration:.1f} fps over {duration:.2f} s'
+        if (num_dropped > 0):
+            s += f', dropped={num_dropped}'
+    if num_incomplete:
+        s += f', incomplete={num_incomplete}'
+    if num_failed:
+        s += f', write errors={num_failed}'
+    if num_missing:
+        s += f', not acquired={num_missing}'
+
+    return(s)
+
+## ====================================================================================
+class WriterReport:
+    """
+    Accounting of the writer side of a pipelined recording (see video_fastsave()): how full the queue between the
+    grab loop and the writers got, and how often and for how long the grab loop had to wait because the writers had
+    fallen behind. Any wait means that the camera's stream buffers were filling up during that time.
+
+    :param queue_size: The capacity of the queue between the grab loop and the writers.
+    """
+
+    def __init__(self, queue_size=0):
+        self.queue_size = queue_size
+        self.num_written = 0            ## frames written to disk
+        self.num_bytes = 0              ## bytes written to disk
+        self.write_time = 0.0           ## total time (sec) spent writing, summed over the writer threads
+        self.max_queue_depth = 0        ## the most frames waiting in the queue at once
+        self.num_stalls = 0             ## the number of times the grab loop found the queue full
+        self.stall_time = 0.0           ## total time (sec) the grab loop spent waiting for room in the queue
+        self.num_errors = 0
+        self.first_error = ''
+        self.lock = threading.Lock()
+
+    ## ===================================
+    def add_write(self, nbytes, write_time):
+        with self.lock:
+            self.num_written += 1
+            self.num_bytes += nbytes
+            self.write_time += write_time
+        return
+
+    ## ===================================
+    def add_error(self, message):
+        with self.lock:
+            self.num_errors += 1
+            if not self.first_error:
+                self.first_error = message
+        return
+
+    ## ===================================
+    def fell_behind(self):
+        """
+        Whether the writers ever made the grab loop wait.
+
+        :rtype: bool
+        """
+
+        return(self.num_stalls > 0)
+
+    ## ===================================
+    def summary(self):
+        """
+        Get the report as a dict. The write rate is in MB/sec of writer time.
+
+        :rtype: dict
+        """
+
+        d = {}
+        d['written'] = self.num_written
+        d['errors'] = self.num_errors
+        d['queue_size'] = self.queue_size
+        d['max_queue_depth'] = self.max_queue_depth
+        d['stalls'] = self.num_stalls
+        d['stall_time_s'] = self.stall_time
+        d['write_rate_mbps'] = (self.num_bytes / 1.0E6 / self.write_time) if (self.write_time > 0.0) else 0.0
+        return(d)
+
+    ## ===================================
+    def __str__(self):
+        d = self.summary()
+        s = f'written={d["written"]}, max queue depth={d["max_queue_depth"]}/{d["queue_size"]}'
+        if (d['write_rate_mbps'] > 0.0):
+            s += f', write rate={d["write_rate_mbps"]:.1f} MB/s per writer'
+        if d['stalls']:
+            s += f', WRITERS FELL BEHIND {d["stalls"]} times (grab loop waited {d["stall_time_s"]:.3f} s)'
+        if d['errors']:
+            s += f', write errors={d["errors"]} (first: {self.first_error})'
+        return(s)
+
+## ====================================================================================
+def _write_frames(frame_queue, writer_report, log):
+    ## A writer thread of video_fastsave(): save converted frames from the queue until the end marker (None) arrives.
+    while True:
+        item = frame_queue.get()
+        if item is None:
+            return
+
+        (row, filename, image_converted) = item
+        try:
+            t0 = time.perf_counter()
+            image_converted.Save(filename)
+            writer_report.add_write(image_converted.GetBufferSize(), time.perf_counter() - t0)
+        except Exception as ex:
+            writer_report.add_error(f'{filename}: {ex}')
+            log[row]['status'] = LOG_WRITE_FAILED
+            log[row]['file_index'] = -1
+
+    return
+
+## ====================================================================================
+def _write_recording_frames(frame_queue, writer_report, log):
+    ## The writer thread of video_fastsave() for a single-file recording: append converted frames from the queue to
+    ## the recording, in order, until the end marker (None) arrives.
+    while True:
+        item = frame_queue.get()
+        if item is None:
+            return
+
+        (row, recording, image_converted) = item
+        try:
+            t0 = time.perf_counter()
+            log[row]['file_index'] = recording.write_frame(image_converted.GetNDArray(), log[row]['frame_id'],
+                                                           log[row]['timestamp'], log[row]['host_timestamp'])
+            writer_report.add_write(recording.frame_bytes, time.perf_counter() - t0)
+        except Exception as ex:
+            writer_report.add_error(f'{recording.filename}: {ex}')
+            log[row]['status'] = LOG_WRITE_FAILED
+            log[row]['file_index'] = -1
+
+    return
+
+## ====================================================================================
+def video_fastsave(cam, nodemap, num_images, file_dir='', file_prefix='', file_suffix='raw', start_num=0,
+                   buffer_count=200, buffer_handling_mode='OldestFirst', report=None, num_writers=2, queue_size=64,
+                   writer_report=None, log=None, save_log=True, verbose=False):
+    """
+    This function acquires and saves N images, in RAW format, from a device. The camera must not have image events
+    registered (see AcquisitionSession.disable_image_events()), since GetNextImage() does not return frames that are
+    delivered to an image event handler.
+
+    The recording is pipelined: this thread only grabs each frame, converts it (which copies it out of the stream
+    buffer, so that the buffer can be released at once) and puts it on a bounded queue, while writer threads save the
+    queued frames to disk. A disk stall therefore only delays the writers. If the stall lasts long enough to fill the
+    queue, then the grab loop waits for room (backpressure), the camera's stream buffers take up the slack, and the
+    wait is counted in the writer report. Frames are only dropped if the stream buffers run out as well.
+
+    If file_suffix is RAW_RECORDING_SUFFIX ('rawseq'), then all of the frames go into the single file
+    "{file_prefix}_{start_num:05}.rawseq" (see flir_raw_recording.py) instead of one file per frame. A single writer
+    then appends the frames in order, and each frame's file_index in the log is its position in the recording.
+
+    :param cam: Camera to acquire images from.
+    :param nodemap: Device nodemap.
+    :param nodemap_tldevice: Transport layer device nodemap.
+    :type cam: CameraPtr
+    :param buffer_count: The number of stream buffers to use while recording. A deep buffer absorbs bursts of disk
+        latency without dropping frames.
+    :param buffer_handling_mode: The stream buffer handling mode to use while recording. The previous stream buffer
+        settings are restored afterward.
+    :param report: An AcquisitionReport to fill in with the dropped and incomplete frame counts, or None.
+    :type report: AcquisitionReport
+    :param num_writers: The number of writer threads.
+    :param queue_size: The number of converted frames that can wait for the writers.
+    :param writer_report: A WriterReport to fill in with the queue and writer accounting, or None.
+    :type writer_report: WriterReport
+    :param log: A preallocated RECORDING_LOG_DTYPE record array of length num_images to fill in, or None to allocate
+        one. Each frame's record is filled in as it is grabbed, so that nothing grows during the recording.
+    :param save_log: Whether to save the log next to the images, as "{file_prefix}_{start_num:05}_log.npy".
+    :return: The recording log, or None if an error occurred.
+    :rtype: ndarray
+    """
+
+    if log is None:
+        log = zeros(num_images, RECORDING_LOG_DTYPE)
+    log['file_index'] = -1
+    log['status'] = LOG_NOT_ACQUIRED
+
+    if writer_report is None:
+        writer_report = WriterReport(queue_size)
+    writer_report.queue_size = queue_size
+
+    ## Recording wants every frame in order, rather than the newest frame.
+    nodemap_tlstream = cam.GetTLStreamNodeMap()
+    (prev_buffer_count, prev_handling_mode) = get_stream_buffer_settings(nodemap_tlstream)
+    set_stream_buffer_count(nodemap_tlstream, buffer_count, verbose=verbose)
+    set_stream_buffer_handling_mode(nodemap_tlstream, buffer_handling_mode, verbose=verbose)
+
+    ## A single-file recording is opened at the first complete frame, once the frame size and format are known.
+    single_file = (file_suffix == RAW_RECORDING_SUFFIX)
+    recording = None
+    if single_file:
+        recording_filename = f'{file_dir}{file_prefix}_{start_num:05}.{file_suffix}'
+        node_binning = PySpin.CIntegerPtr(nodemap.GetNode('BinningVertical'))
+        binning = node_binning.GetValue() if (PySpin.IsAvailable(node_binning) and PySpin.IsReadable(node_binning)) else 1
+
+    frame_queue = queue.Queue(maxsize=queue_size)
+    if single_file:
+        writers = [threading.Thread(target=_write_recording_frames, args=(frame_queue, writer_report, log), daemon=True)]
+    else:
+        writers = [threading.Thread(target=_write_frames, args=(frame_queue, writer_report, log), daemon=True)
+                   for n in range(max(num_writers, 1))]
+    for writer in writers:
+        writer.start()
+
+    result = log
+    acquiring = False
+    try:
+        ## Set acquisition mode to continuous.
+        if not set_acquisition_mode(nodemap, 'Continuous'):
+            return(None)
+
+        ## Begin acquiring images. Image acquisition must be ended when no more images are needed, which is done in the
+        ## "finally" clause below, whichever way the loop exits.
+        grab_timeout = get_grab_timeout(nodemap)
+        cam.BeginAcquisition()
+        acquiring = True
+
+        ## Retrieve and convert images, and hand them to the writers.
+        for i in range(num_images):
+            filename = recording_filename if single_file else f'{file_dir}{file_prefix}_{start_num+i:05}.{file_suffix}'
+
+            if writer_report.num_errors:
+                print(f'video_fastsave(): Error saving frames ({writer_report.first_error}). Aborting...')
+                result = None
+                break
+
+            image_result = None
+            try:
+                ## Retrieve the next received image. Capturing an image houses images on the camera buffer. Trying to
+                ## capture an image that does not exist will hang the camera. Once an image from the buffer is saved
+                ## and/or no longer needed, the image must be released in order to keep the buffer from filling up.
+                image_result = cam.GetNextImage(grab_timeout)
+                log[i]['host_timestamp'] = time.time_ns()
+                log[i]['frame_id'] = image_result.GetFrameID()
+                log[i]['timestamp'] = image_result.GetTimeStamp()
+                if report is not None:
+                    report.add_image(image_result)
+
+                ## Ensure image completion. This should be done whenever a complete image is expected or required.
+                if image_result.IsIncomplete():
+                    log[i]['status'] = image_result.GetImageStatus()
+                    print('Image incomplete with image status %d ...' % image_result.GetImageStatus())
+                    continue
+                else:
+                    pixel_format = image_result.GetPixelFormatName()
+                    if filename.endswith(('raw','tif',RAW_RECORDING_SUFFIX)) and (pixel_format in ('Mono16','Mono12p')):
+                        image_converted = image_result.Convert(PySpin.PixelFormat_Mono16, PySpin.HQ_LINEAR)
+                        dtype = 'uint16'
+                    else:
+                        image_converted = image_result.Convert(PySpin.PixelFormat_Mono8, PySpin.HQ_LINEAR)
+                        dtype = 'uint8'
+                    if not single_file:
+                        log[i]['file_index'] = start_num + i
+                    elif recording is None:
+                        recording = RawRecordingWriter(recording_filename, image_converted.GetHeight(),
+                                                       image_converted.GetWidth(), dtype, pixel_format, binning,
+                                                       num_frames=num_images)
+                    log[i]['status'] = 0
+
+            except PySpin.SpinnakerException as ex:
+                print('video_fastsave(): Error 1: %s' % ex)
+                result = None
+                break
+            except OSError as ex:
+                print('video_fastsave(): could not create the recording file: %s' % ex)
+                result = None
+                break
+            finally:
+                ## Release image. Images retrieved directly from the camera (i.e. non-converted
+                ## images) need to be released in order to keep from filling the buffer.
+                if image_result is not None:
+                    image_result.Release()
+
+            ## Queue the frame for the writers, waiting for room if they have fallen behind.
+            item = (i, recording if single_file else filename, image_converted)
+            try:
+                frame_queue.put_nowait(item)
+            except queue.Full:
+                t0 = time.perf_counter()
+                frame_queue.put(item)
+                writer_report.num_stalls += 1
+                writer_report.stall_time += time.perf_counter() - t0
+            writer_report.max_queue_depth = max(writer_report.max_queue_depth, frame_queue.qsize())
+
+    except PySpin.SpinnakerException as ex:
+        print('video_fastsave(): Error 2: %s' % ex)
+        result = None
+    finally:
+        ## End acquisition. Ending acquisition appropriately helps ensure that devices clean up
+        ## properly and do not need to be power-cycled to maintain integrity.
+        if acquiring:
+            try:
+                cam.EndAcquisition()
+            except PySpin.SpinnakerException as ex:
+                print('video_fastsave(): Error 2: %s' % ex)
+                result = None
+
+        ## Let the writers finish what is queued, then stop them.
+        for writer in writers:
+            frame_queue.put(None)
+        for writer in writers:
+            writer.join()
+        if recording is not None:
+            try:
+                recording.close()
+                if verbose:
+                    print(f'Saved {recording.num_frames} frames to "{recording.filename}"')
+            except OSError as ex:
+                print('video_fastsave(): could not finish the recording file: %s' % ex)
+                result = None
+
+        set_stream_buffer_count(nodemap_tlstream, prev_buffer_count)
+        if prev_handling_mode:
+            set_stream_buffer_handling_mode(nodemap_tlstream, prev_handling_mode)
+
+    if writer_report.fell_behind():
+        print(f'video_fastsave(): the writers fell behind the camera: {writer_report}')
+
+    ## The log is written once, after the recording, so that it adds nothing to the per-frame work.
+    if save_log:
+        log_filename = f'{file_dir}{file_prefix}_{start_num:05}_log.npy'
+        try:
+            save(log_filename, log)
+        except OSError as ex:
+            print('video_fastsave(): could not save the recording log: %s' % ex)
+        if verbose:
+            print(f'Saved the recording log to "{log_filename}"')
+
+    return(result)
+
+## ====================================================================================
+class CameraControl:
+    """
+    A camera-control object that resolves the GenICam nodes it uses once, and then keeps the node pointers and the
+    enumeration entry values for every later call. This avoids the GetNode() lookup, the pointer cast and the
+    availability check that the module-level helpers repeat on every call, which matters in tight loops such as
+    exposure sweeps. The cache is only valid for one Init() of the device, so use init() to (re)initialize the camera,
+    or call invalidate() if the camera was reinitialized elsewhere.
+
+    :param cam: Camera to control.
+    :type cam: CameraPtr
+    """
+
+    ## The pointer type used to access each node.
+    NODE_TYPES = {
+        'AcquisitionMode': PySpin.CEnumerationPtr,
+        'AcquisitionFrameRate': PySpin.CFloatPtr,
+        'BinningHorizontal': PySpin.CIntegerPtr,
+        'BinningVertical': PySpin.CIntegerPtr,
+        'ExposureAuto': PySpin.CEnumerationPtr,
+        'ExposureTime': PySpin.CFloatPtr,
+        'Gain': PySpin.CFloatPtr,
+        'GainAuto': PySpin.CEnumerationPtr,
+        'Height': PySpin.CIntegerPtr,
+        'HeightMax': PySpin.CIntegerPtr,
+        'OffsetX': PySpin.CIntegerPtr,
+        'OffsetY': PySpin.CIntegerPtr,
+        'PixelFormat': PySpin.CEnumerationPtr,
+        'Width': PySpin.CIntegerPtr,
+        'WidthMax': PySpin.CIntegerPtr,
+    }
+
+    def __init__(self, cam, verbose=False):
+        self.cam = cam
+        self.verbose = verbose
+        self.invalidate()
+
+    ## ===================================
+    def init(self):
+        """
+        Initialize (or reinitialize) the camera, and drop any nodes cached from a previous initialization.
+        """
+
+        if self.cam.IsInitialized():
+            self.cam.DeInit()
+        self.cam.Init()
+        self.invalidate()
+        return
+
+    ## ===================================
+    def invalidate(self):
+        """
+        Drop all cached node pointers and entry values. They are resolved again on first use.
+        """
+
+        self.nodemap = None
+        self.nodes = {}
+        self.entry_values = {}
+        self.state = {}             ## the last known pixel format, binning, image region and exposure (see read_state())
+        return
+
+    ## ===================================
+    def node(self, name):
+        """
+        Get the (cached) pointer to a node.
+
+        :param name: The node name, such as 'ExposureTime'.
+        :return: The node pointer, or None if the node is not available on this camera.
+        """
+
+        if name in self.nodes:
+            return(self.nodes[name])
+
+        if self.nodemap is None:
+            self.nodemap = self.cam.GetNodeMap()
+
+        node_type = self.NODE_TYPES.get(name, PySpin.CValuePtr)
+        node = node_type(self.nodemap.GetNode(name))
+        if not PySpin.IsAvailable(node):
+            if self.verbose:
+                print(f'{name} node is not available...')
+            node = None
+
+        self.nodes[name] = node
+        return(node)
+
+    ## ===================================
+    def entry_value(self, name, entry_name):
+        """
+        Get the (cached) integer value of an enumeration entry.
+
+        :param name: The enumeration node name, such as 'ExposureAuto'.
+        :param entry_name: The entry name, such as 'Off'.
+        :return: The integer value of the entry, or None if the entry is not available.
+        """
+
+        key = (name, entry_name)
+        if key in self.entry_values:
+            return(self.entry_values[key])
+
+        node = self.node(name)
+        value = None
+        if node is not None:
+            node_entry = node.GetEntryByName(entry_name)
+            if PySpin.IsAvailable(node_entry) and PySpin.IsReadable(node_entry):
+                value = node_entry.GetValue()
+
+        self.entry_values[key] = value
+        return(value)
+
+    ## ===================================
+    def set_enum(self, name, entry_name):
+        """
+        Set an enumeration node to one of its entries. The node is only written if its value actually changes.
+
+        :return: True if successful, False otherwise.
+        :rtype: bool
+        """
+
+        node = self.node(name)
+        value = self.entry_value(name, entry_name)
+        if (node is None) or (value is None):
+            print(f'{name}_{entry_name} node is not available...')
+            return(False)
+
+        try:
+            if (node.GetIntValue() != value):
+                node.SetIntValue(value)
+        except PySpin.SpinnakerException as ex:
+            print('CameraControl.set_enum() Error: %s' % ex)
+            return(False)
+
+        return(True)
+
+    ## ===================================
+    def get_value(self, name, default=0):
+        """
+        Read the value of a numeric or boolean node.
+
+        :return: The node value, or the default if the node is not available.
+        """
+
+        node = self.node(name)
+        if node is None:
+            return(default)
+
+        try:
+            return(node.GetValue())
+        except PySpin.SpinnakerException as ex:
+            print('CameraControl.get_value() Error: %s' % ex)
+            return(default)
+
+    ## ===================================
+    def set_value(self, name, value, verbose=False):
+        """
+        Write a numeric node, clipping the value to the node's current limits (and, for integer nodes, truncating it
+        to a multiple of the node's increment).
+
+        :return: True if successful, False otherwise.
+        :rtype: bool
+        """
+
+        node = self.node(name)
+        if node is None:
+            print(f'{name} node is not available...')
+            return(False)
+
+        try:
+            min_value = node.GetMin()
+            max_value = node.GetMax()
+            set_value = min((max((value, min_value)), max_value))
+            if (self.NODE_TYPES.get(name) is PySpin.CFloatPtr):
+                node.SetValue(float(set_value), False)
+            else:
+                set_value = max((truncate_multiple(int(set_value), node.GetInc()), min_value))
+                node.SetValue(int(set_value))
+            if verbose:
+                print(f'{name}: limits = ({min_value},{max_value}), value set to {set_value}')
+        except PySpin.SpinnakerException as ex:
+            print('CameraControl.set_value() Error: %s' % ex)
+            return(False)
+
+        return(True)
+
+    ## ===================================
+    def set_exposure_time(self, time_in_usec, verbose=False):
+        """
+        Turn off automatic exposure (if needed) and set the exposure time, clipped to the allowed range.
+
+        :return: True if successful, False otherwise.
+        :rtype: bool
+        """
+
+        if not self.set_enum('ExposureAuto', 'Off'):
+            return(False)
+        ok = self.set_value('ExposureTime', time_in_usec, verbose=verbose)
+        if self.state:
+            self.state['exposure'] = self.get_value('ExposureTime', 0.0)
+        return(ok)
+
+    ## ===================================
+    def get_exposure(self):
+        """
+        Get the current exposure time (in usec), or 0.0 if it is not available.
+        """
+
+        return(self.get_value('ExposureTime', 0.0))
+
+    ## ===================================
+    def get_exposure_minmax(self):
+        """
+        Get the allowed exposure time range (in usec), or (0.0, 0.0) if it is not available.
+        """
+
+        node = self.node('ExposureTime')
+        if node is None:
+            return(0.0, 0.0)
+
+        try:
+            return(node.GetMin(), node.GetMax())
+        except PySpin.SpinnakerException as ex:
+            print('CameraControl.get_exposure_minmax() Error: %s' % ex)
+            return(0.0, 0.0)
+
+    ## ===================================
+    def get_framerate(self):
+        """
+        Get the current frame rate (in Hz), or 0 if it is not available.
+        """
+
+        return(self.get_value('AcquisitionFrameRate', 0))
+
+    ## ===================================
+    def set_binning(self, binning_value, verbose=False):
+        """
+        Set the camera binning. As in set_binning(), cameras without a separate horizontal binning node use the
+        vertical binning for both dimensions.
+
+        :return: True if successful, False otherwise.
+        :rtype: bool
+        """
+
+        node_binning_h = self.node('BinningHorizontal')
+        if (node_binning_h is not None) and PySpin.IsWritable(node_binning_h):
+            self.set_value('BinningHorizontal', binning_value, verbose=verbose)
+
+        ## A binning change also changes the image region, so the whole cached state is read back.
+        ok = self.set_value('BinningVertical', binning_value, verbose=verbose)
+        if self.state:
+            self.read_state()
+        return(ok)
+
+    ## ===================================
+    def set_pixel_format(self, pixel_format):
+        """
+        Set the pixel format, such as 'Mono16'.
+
+        :return: True if successful, False otherwise.
+        :rtype: bool
+        """
+
+        ok = self.set_enum('PixelFormat', pixel_format)
+        if ok and self.state:
+            self.state['pixel_format'] = pixel_format
+        return(ok)
+
+    ## ===================================
+    def read_state(self):
+        """
+        Read the stream-related settings back from the camera, and cache them as the current state.
+
+        :return: A dict with keys 'pixel_format', 'binning', 'roi' (height, width, height_offset, width_offset) and
+            'exposure'.
+        :rtype: dict
+        """
+
+        node_pixel_format = self.node('PixelFormat')
+        try:
+            pixel_format = node_pixel_format.GetCurrentEntry().GetSymbolic() if (node_pixel_format is not None) else None
+        except PySpin.SpinnakerException as ex:
+            print('CameraControl.read_state() Error: %s' % ex)
+            pixel_format = None
+
+        self.state = {}
+        self.state['pixel_format'] = pixel_format
+        self.state['binning'] = self.get_value('BinningVertical', 1)
+        self.state['roi'] = (self.get_value('Height'), self.get_value('Width'), self.get_value('OffsetY'), self.get_value('OffsetX'))
+        self.state['exposure'] = self.get_value('ExposureTime', 0.0)
+
+        return(self.state)
+
+    ## ===================================
+    def set_roi(self, roi, verbose=False):
+        """
+        Set the image region. The offsets are first reduced to zero, so that the new width and height are always
+        allowed, and then the new offsets are applied.
+
+        :param roi: Either (height, width, height_offset, width_offset), or 'full' for the largest image allowed at
+            the current binning.
+        :return: True if successful, False otherwise.
+        :rtype: bool
+        """
+
+        ok = self.set_value('OffsetX', 0)
+        ok &= self.set_value('OffsetY', 0)
+
+        if (roi == 'full'):
+            (height, width, height_offset, width_offset) = (self.node('Height').GetMax(), self.node('Width').GetMax(), 0, 0)
+        else:
+            (height, width, height_offset, width_offset) = roi
+
+        ok &= self.set_value('Width', width, verbose=verbose)
+        ok &= self.set_value('Height', height, verbose=verbose)
+        if (width_offset > 0):
+            ok &= self.set_value('OffsetX', width_offset, verbose=verbose)
+        if (height_offset > 0):
+            ok &= self.set_value('OffsetY', height_offset, verbose=verbose)
+
+        if self.state:
+            self.state['roi'] = (self.get_value('Height'), self.get_value('Width'), self.get_value('OffsetY'), self.get_value('OffsetX'))
+
+        return(ok)
+
+    ## ===================================
+    def get_full_roi(self):
+        """
+        Get the largest image region allowed at the current binning. The Height and Width maxima shrink with the
+        current offsets, so the offset-independent HeightMax and WidthMax are used where the camera has them.
+
+        :return: (height, width, 0, 0), or None if the image size nodes are not available.
+        :rtype: tuple
+        """
+
+        for (height_name, width_name) in (('HeightMax','WidthMax'), ('Height','Width')):
+            node_height = self.node(height_name)
+            node_width = self.node(width_name)
+            if (node_height is None) or (node_width is None):
+                continue
+            try:
+                if (height_name == 'Height'):
+                    return(node_height.GetMax() + self.get_value('OffsetY'), node_width.GetMax() + self.get_value('OffsetX'), 0, 0)
+                return(node_height.GetValue(), node_width.GetValue(), 0, 0)
+            except PySpin.SpinnakerException as ex:
+                print('CameraControl.get_full_roi() Error: %s' % ex)
+                return(None)
+
+        return(None)
+
+    ## ===================================
+    def configure(self, pixel_format=None, binning=None, roi=None, exposure=None, stop_stream=None, start_stream=None, verbose=False):
+        """
+        Move the camera to a desired state in one transaction. The current state is read back from the camera (so that
+        changes made outside this object are seen), the desired settings are compared with it, and only the settings
+        that differ are written, in an order the camera accepts: pixel format,
+        then binning, then image region, then exposure. If any stream-locked setting (pixel format, binning, image
+        region) changes, then the stream is stopped once before the changes and started once afterward. If any write
+        fails, the settings already changed are rolled back.
+
+        :param pixel_format: String, such as 'Mono16', or None to leave unchanged.
+        :param binning: uint, or None to leave unchanged. Changing the binning without giving an roi resets the image
+            region to the full image at the new binning.
+        :param roi: (height, width, height_offset, width_offset), 'full', or None to leave unchanged.
+        :param exposure: The exposure time in usec, or None to leave unchanged.
+        :param stop_stream: A function that stops the acquisition stream (such as AcquisitionSession.stop), or None if
+            the camera is not streaming.
+        :param start_stream: A function that restarts the acquisition stream, or None.
+        :return: True if successful, False otherwise.
+        :rtype: bool
+        """
+
+        old_state = dict(self.read_state())
+
+        ## Work out which settings actually differ from the current state.
+        changes = {}
+        if (pixel_format is not None) and (pixel_format != old_state['pixel_format']):
+            changes['pixel_format'] = pixel_format
+        if (binning is not None) and (binning != old_state['binning']):
+            changes['binning'] = binning
+            if roi is None:
+                roi = 'full'
+        if (roi == 'full') and ('binning' not in changes):
+            roi = self.get_full_roi() or 'full'
+        if (roi is not None) and (roi != old_state['roi']):
+            changes['roi'] = roi
+        if (exposure is not None) and (abs(exposure - old_state['exposure']) >= 0.5):
+            changes['exposure'] = exposure
+
+        if not changes:
+            return(True)
+
+        needs_restart = any((key in changes) for key in ('pixel_format', 'binning', 'roi'))
+        if needs_restart and (stop_stream is not None):
+            stop_stream()
+
+        ## Apply the changes in a legal order, keeping track of what has been written so far in case of a rollback.
+        applied = []
+        ok = True
+        for key in ('pixel_format', 'binning', 'roi', 'exposure'):
+            if key not in changes:
+                continue
+            ok = self._apply_setting(key, changes[key], verbose=verbose)
+            applied.append(key)
+            if not ok:
+                print(f'CameraControl.configure(): failed to set {key} = {changes[key]}. Rolling back...')
+                break
+
+        if not ok:
+            for key in applied:
+                self._apply_setting(key, old_state[key])
+
+        self.read_state()
+        if needs_restart and (start_stream is not None):
+            start_stream()
+
+        return(ok)
+
+    ## ===================================
+    def _apply_setting(self, key, value, verbose=False):
+        if (key == 'pixel_format'):
+            return(self.set_pixel_format(value))
+        elif (key == 'binning'):
+            return(self.set_binning(value, verbose=verbose))
+        elif (key == 'roi'):
+            return(self.set_roi(value, verbose=verbose))
+        elif (key == 'exposure'):
+            return(self.set_exposure_time(value, verbose=verbose))
+        else:
+            raise ValueError(f'Unknown camera setting "{key}"')
+
+## ====================================================================================
+def enable_device_event(nodemap, event_name, enabled=True, verbose=False):
+    """
+    Turn the camera's notification of a device event on or off. The event is then delivered to any registered
+    DeviceEventDispatcher under the name 'Event' + event_name (such as 'EventExposureEnd').
+
+    :param nodemap: Device GenICam nodemap
+    :type nodemap: INodeMap
+    :param event_name: The EventSelector entry, such as 'ExposureEnd'.
+    :param enabled: bool
+    :return: True if successful, False otherwise.
+    :rtype: bool
+    """
+
+    if not set_enumeration_value(nodemap, 'EventSelector', event_name, verbose=verbose):
+        return(False)
+
+    return(set_enumeration_value(nodemap, 'EventNotification', 'On' if enabled else 'Off', verbose=verbose))
+
+## ====================================================================================
+class DeviceEventDispatcher(PySpin.DeviceEventHandler):
+    """
+    A device event handler that counts each GenICam device event (such as 'EventExposureEnd') as it arrives and calls
+    the callbacks registered for it. Spinnaker calls the handler on its event thread, so callbacks should be quick.
+    The counts let a caller wait for the next event, such as the end of an exposure, after a given point.
+    """
+
+    def __init__(self, verbose=False):
+        super().__init__()
+        self.verbose = verbose
+        self.callbacks = {}                 ## event name -> list of callback(event_name, event_id)
+        self.counts = {}                    ## event name -> number of events received
+        self.event_ready = threading.Condition()
+
+    ## ===================================
+    def add_callback(self, event_name, callback):
+        with self.event_ready:
+            self.callbacks.setdefault(event_name, []).append(callback)
+        return
+
+    ## ===================================
+    def remove_callback(self, event_name, callback):
+        with self.event_ready:
+            if callback in self.callbacks.get(event_name, []):
+                self.callbacks[event_name].remove(callback)
+        return
+
+    ## ===================================
+    def OnDeviceEvent(self, event_name):
+        event_id = self.GetDeviceEventId()
+        with self.event_ready:
+            self.counts[event_name] = self.counts.get(event_name, 0) + 1
+            callbacks = list(self.callbacks.get(event_name, []))
+            self.event_ready.notify_all()
+
+        if self.verbose:
+            print(f'Device event {event_name} (id={event_id})')
+
+        for callback in callbacks:
+            callback(event_name, event_id)
+
+        return
+
+    ## ===================================
+    def get_count(self, event_name):
+        """
+        Get the number of times an event has been received, to pass to wait_for_event() later.
+        """
+
+        with self.event_ready:
+            return(self.counts.get(event_name, 0))
+
+    ## ===================================
+    def wait_for_event(self, event_name, after, timeout=1.0):
+        """
+        Wait until an event has been received more than "after" times.
+
+        :param event_name: The event name, such as 'EventExposureEnd'.
+        :param after: The event count (from get_count()) taken before the event was caused.
+        :param timeout: Maximum time (in sec) to wait.
+        :return: True if the event arrived, False if the wait timed out.
+        :rtype: bool
+        """
+
+        with self.event_ready:
+            return(self.event_ready.wait_for(lambda: self.counts.get(event_name, 0) > after, timeout))
+
+## ====================================================================================
+class FrameEventHandler(PySpin.ImageEventHandler):
+    """
+    An image event handler that Spinnaker calls as soon as each frame arrives, and which pushes a copy of the frame to
+    its subscribers. This replaces polling with GetNextImage(), so frames are delivered with a latency set by the
+    transfer time rather than by a polling interval. While the handler is registered, GetNextImage() must not be used.
+
+    Each subscriber is a callback of the form callback(image, ts, metadata), where image is a numpy array, ts is the
+    camera timestamp in ns, and metadata is a one-record FRAME_METADATA_DTYPE array. Subscribers that want every frame
+    are called in order on Spinnaker's event thread, so they should be quick (such as copying into a ring or putting
+    onto a queue). Subscribers that want only the latest frame are called from a separate dispatcher thread, and any
+    frames that arrive while they are busy are skipped.
+
+    The image and metadata arrays are taken from the handler's frame_pool, so that a steady stream of frames does not
+    allocate new arrays. They are only valid during the callback: a subscriber that keeps them longer must call
+    frame_pool.retain() on them (and frame_pool.release() when done), or copy them.
+
+    :param chunk_data: Whether chunk data is enabled on the camera (see enable_chunk_data()).
+    """
+
+    def __init__(self, chunk_data=False, verbose=False):
+        super().__init__()
+        self.chunk_data = chunk_data
+        self.verbose = verbose
+        self.report = AcquisitionReport()       ## replaced by the session each time the stream is started
+
+        self.subscribers = []               ## list of (callback, latest_only) tuples
+        self.lock = threading.Lock()
+
+        self.frame_pool = FramePool()       ## the image and metadata buffers handed to the subscribers
+        self.latest_frame = None            ## the newest frame not yet handed to the latest-only subscribers
+        self.latest_ready = threading.Condition()
+        self.dispatcher = None
+
+    ## ===================================
+    def subscribe(self, callback, latest_only=False):
+        """
+        Add a subscriber.
+
+        :param callback: The function to call with each frame, as callback(image, ts, metadata).
+        :param latest_only: If True, then the subscriber is only given the newest frame whenever it is ready for one.
+        :return: A subscription handle for unsubscribe().
+        """
+
+        subscription = (callback, latest_only)
+        with self.lock:
+            self.subscribers.append(subscription)
+            if latest_only and (self.dispatcher is None):
+                self.dispatcher = threading.Thread(target=self._dispatch_latest, daemon=True)
+                self.dispatcher.start()
+
+        return(subscription)
+
+    ## ===================================
+    def unsubscribe(self, subscription):
+        """
+        Remove a subscriber. The latest-only dispatcher thread exits once it has no subscribers left.
+
+        :param subscription: The handle returned by subscribe().
+        """
+
+        with self.lock:
+            if subscription in self.subscribers:
+                self.subscribers.remove(subscription)
+
+        ## Drop any frame still waiting for the latest-only subscribers if none are left.
+        with self.latest_ready:
+            stale_frame = None
+            if not self._has_latest_subscribers():
+                (stale_frame, self.latest_frame) = (self.latest_frame, None)
+            self.latest_ready.notify_all()
+        if stale_frame is not None:
+            self._release_frame(stale_frame)
+
+        return
+
+    ## ===================================
+    def OnImageEvent(self, image):
+        ## Called by Spinnaker on its event thread. The image is released by Spinnaker once this function returns, so
+        ## the pixels are copied out first.
+        try:
+            self.report.add_image(image)
+            if image.IsIncomplete():
+                if self.verbose:
+                    print('Image incomplete with image status %d ...' % image.GetImageStatus())
+                return
+
+            if (image.GetPixelFormatName() == 'Mono12p'):
+                (shape, dtype) = ((image.GetHeight(), image.GetWidth()), 'uint16')
+            else:
+                image_view = image.GetNDArray()
+                (shape, dtype) = (image_view.shape, image_view.dtype)
+            image_data = self.frame_pool.acquire(shape, dtype)
+            metadata = self.frame_pool.acquire((1,), FRAME_METADATA_DTYPE)
+        except PySpin.SpinnakerException as ex:
+            print('FrameEventHandler.OnImageEvent() Error: %s' % ex)
+            return
+
+        try:
+            copy_image_data(image, out=image_data)
+            ts = image.GetTimeStamp()
+            read_frame_metadata(image, metadata, 0, chunk_data=self.chunk_data)
+        except (PySpin.SpinnakerException, ValueError) as ex:
+            print('FrameEventHandler.OnImageEvent() Error: %s' % ex)
+            self._release_frame((image_data, 0, metadata))
+            return
+
+        with self.lock:
+            subscribers = list(self.subscribers)
+
+        for (callback, latest_only) in subscribers:
+            if not latest_only:
+                callback(image_data, ts, metadata)
+
+        ## The latest-frame slot holds its own reference, which the dispatcher drops once it has handed the frame on. A
+        ## frame that was never dispatched is released as soon as a newer one replaces it.
+        frame = (image_data, ts, metadata)
+        if any(latest_only for (callback, latest_only) in subscribers):
+            self.frame_pool.retain(image_data)
+            self.frame_pool.retain(metadata)
+            with self.latest_ready:
+                (skipped_frame, self.latest_frame) = (self.latest_frame, frame)
+                self.latest_ready.notify_all()
+            if skipped_frame is not None:
+                self._release_frame(skipped_frame)
+
+        self._release_frame(frame)
+
+        return
+
+    ## ===================================
+    def _release_frame(self, frame):
+        self.frame_pool.release(frame[0])
+        self.frame_pool.release(frame[2])
+        return
+
+    ## ===================================
+    def _dispatch_latest(self):
+        while True:
+            with self.latest_ready:
+                self.latest_ready.wait_for(lambda: (self.latest_frame is not None) or not self._has_latest_subscribers())
+                frame = self.latest_frame
+                self.latest_frame = None
+
+            ## Checking for subscribers and clearing the dispatcher are done together, so that a new subscriber either
+            ## sees this thread still running or starts a new one.
+            with self.lock:
+                subscribers = [callback for (callback, latest_only) in self.subscribers if latest_only]
+                if not subscribers:
+                    self.dispatcher = None
+                    if frame is not None:
+                        self._release_frame(frame)
+                    return
+
+            if frame is not None:
+                for callback in subscribers:
+                    callback(*frame)
+                self._release_frame(frame)
+
+    ## ===================================
+    def _has_latest_subscribers(self):
+        with self.lock:
+            return(any(latest_only for (callback, latest_only) in self.subscribers))
+
+## ====================================================================================
+class AcquisitionSession:
+    """
+    A long-lived acquisition stream for one camera. The stream is started once in Continuous mode and then frames are
+    handed out one at a time, so that live viewing does not pay the BeginAcquisition()/EndAcquisition() cost on every
+    frame. Call stop() before changing any setting that is locked while streaming (pixel format, binning, image
+    region), and start() again afterward.
+
+    :param cam: Camera to acquire images from.
+    :type cam: CameraPtr
+    :param nodemap: Device nodemap.
+    :type nodemap: INodeMap
+    :param chunk_data: Whether chunk data is enabled on the camera (see enable_chunk_data()), so that the exposure time
+        and gain of each frame can be decoded along with the pixels.
+    """
+
+    def __init__(self, cam, nodemap, chunk_data=False, verbose=False):
+        self.cam = cam
+        self.nodemap = nodemap
+        self.chunk_data = chunk_data
+        self.verbose = verbose
+        self.is_streaming = False
+        self.report = AcquisitionReport()      ## frame accounting since the stream was last started
+        self.event_handler = None              ## the registered FrameEventHandler, if frames are pushed rather than polled
+        self.grab_timeout = 1000               ## the GetNextImage() timeout in ms; see update_grab_timeout()
+        self.is_triggered = False              ## whether the trigger is on, in which case waiting for a frame is normal
+        self.device_events = None              ## the registered DeviceEventDispatcher, if device events are enabled
+        self.device_event_names = []           ## the device events whose notification was turned on by enable_device_events()
+
+    def __enter__(self):
+        self.start()
+        return(self)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return(False)
+
+    ## ===================================
+    def start(self):
+        """
+        Set the camera to Continuous mode and begin acquiring. Does nothing if the stream is already running.
+
+        :return: True if successful, False otherwise.
+        :rtype: bool
+        """
+
+        if self.is_streaming:
+            return(True)
+
+        try:
+            if not set_acquisition_mode(self.nodemap, 'Continuous'):
+                return(False)
+
+            ## Begin acquiring images. Image acquisition must be ended when no more images are needed.
+            self.update_grab_timeout()
+            self.cam.BeginAcquisition()
+            self.is_streaming = True
+            self.report = AcquisitionReport()
+            if self.event_handler is not None:
+                self.event_handler.report = self.report
+            if self.verbose:
+                print('Acquisition stream started')
+        except PySpin.SpinnakerException as ex:
+            print('AcquisitionSession.start() Error: %s' % ex)
+            return(False)
+
+        return(True)
+
+    ## ===================================
+    def stop(self):
+        """
+        End the acquisition stream. Ending acquisition appropriately helps ensure that devices clean up properly
+        and do not need to be power-cycled to maintain integrity.
+
+        :return: True if successful, False otherwise.
+        :rtype: bool
+        """
+
+        if not self.is_streaming:
+            return(True)
+
+        try:
+            self.cam.EndAcquisition()
+            if self.verbose:
+                print('Acquisition stream stopped')
+        except PySpin.SpinnakerException as ex:
+            print('AcquisitionSession.stop() Error: %s' % ex)
+            return(False)
+        finally:
+            self.is_streaming = False
+
+        return(True)
+
+    ## ===================================
+    def update_grab_timeout(self):
+        """
+        Recompute the frame timeout from the camera's current exposure, frame rate and trigger settings. This is done
+        when the stream starts, and should be called again after any of these settings is changed while streaming.
+
+        :return: The timeout in ms.
+        :rtype: int
+        """
+
+        self.grab_timeout = get_grab_timeout(self.nodemap, verbose=self.verbose)
+        self.is_triggered = get_trigger_mode(self.nodemap)
+        return(self.grab_timeout)
+
+    ## ===================================
+    def enable_device_events(self, event_names=('ExposureEnd',)):
+        """
+        Turn on the camera's notification of the given device events and register a DeviceEventDispatcher to receive
+        them. This should be done while the stream is stopped.
+
+        :param event_names: The EventSelector entries to turn on, such as ('ExposureEnd',).
+        :return: The dispatcher, or None if the events could not be enabled.
+        :rtype: DeviceEventDispatcher
+        """
+
+        for event_name in event_names:
+            if not enable_device_event(self.nodemap, event_name, verbose=self.verbose):
+                return(None)
+            if event_name not in self.device_event_names:
+                self.device_event_names.append(event_name)
+
+        if self.device_events is not None:
+            return(self.device_events)
+
+        try:
+            device_events = DeviceEventDispatcher(verbose=self.verbose)
+            self.cam.RegisterEventHandler(device_events)
+            self.device_events = device_events
+        except PySpin.SpinnakerException as ex:
+            print('AcquisitionSession.enable_device_events() Error: %s' % ex)
+            return(None)
+
+        return(self.device_events)
 
-    return(current_framerate)
+    ## ===================================
+    def disable_device_events(self):
+        """
+        Turn off the notification of the device events turned on by enable_device_events(), and unregister the
+        DeviceEventDispatcher.
 
-## ====================================================================================
-def set_framerate(nodemap, new_framerate, verbose=False):
-    """
-    This function sets the framerate (in Hz) of the camera.
+        :return: True if successful, False otherwise.
+        :rtype: bool
+        """
 
-    :param nodemap: Device GenICam nodemap
-    :type nodemap: CameraPtr
-    :param new_framerate: double
-    :return: True if successful, False otherwise.
-    :rtype: bool
-    """
+        for event_name in self.device_event_names:
+            enable_device_event(self.nodemap, event_name, enabled=False, verbose=self.verbose)
+        self.device_event_names = []
 
-    try:
-        result = True
+        if self.device_events is None:
+            return(True)
 
-        node_framerateenable = PySpin.CBooleanPtr(nodemap.GetNode('AcquisitionFrameRateEnable'))
-        if not PySpin.IsAvailable(node_framerateenable) and not PySpin.IsReadable(node_framerateenable):
-            print('AcquisitionFrameRateEnable node is not available...')
+        try:
+            self.cam.UnregisterEventHandler(self.device_events)
+        except PySpin.SpinnakerException as ex:
+            print('AcquisitionSession.disable_device_events() Error: %s' % ex)
             return(False)
+        finally:
+            self.device_events = None
 
-        node_acquisition_framerate = PySpin.CFloatPtr(nodemap.GetNode('AcquisitionFrameRate'))
-        if not PySpin.IsAvailable(node_acquisition_framerate) and not PySpin.IsReadable(node_acquisition_framerate):
-            print('AcquisitionFrameRate node is not available...')
-            return(False)
+        return(True)
 
-        old_framerate = node_acquisition_framerate.SetValue(float(new_framerate))
-        min_framerate = node_acquisition_framerate.GetMin()
-        max_framerate = node_acquisition_framerate.GetMax()
+    ## ===================================
+    def enable_image_events(self):
+        """
+        Register a FrameEventHandler with the camera, so that frames are pushed to its subscribers as they arrive
+        instead of being retrieved with get_next_image(). This should be done while the stream is stopped.
 
-        if (new_framerate > max_framerate):
-            print('Cannot set the frame rate to {new_framerate:.1f} Hz, which is above the max allowed value of {max_framerate:.1f} Hz.')
-            print('Defaulting to {max_framerate:.1f} Hz ...')
-            new_framerate = max_framerate
+        :return: The event handler, or None if it could not be registered.
+        :rtype: FrameEventHandler
+        """
 
-        if (new_framerate < min_framerate):
-            print('Cannot set the frame rate to {new_framerate:.1f} Hz, which is below the min allowed value of {min_framerate:.1f} Hz.')
-            print('Defaulting to {min_framerate:.1f} Hz ...')
-            new_framerate = min_framerate
+        if self.event_handler is not None:
+            return(self.event_handler)
 
-        node_acquisition_framerate.SetValue(double(new_framerate))
-        if verbose:
-            print(f'Old frame rate = {old_framerate:.1f} Hz,   new frame rate: {new_framerate:.1f} Hz')
-    except PySpin.SpinnakerException as ex:
-        print('set_framerate() Error: %s' % ex)
-        result = False
+        try:
+            event_handler = FrameEventHandler(chunk_data=self.chunk_data, verbose=self.verbose)
+            event_handler.report = self.report
+            self.cam.RegisterEventHandler(event_handler)
+            self.event_handler = event_handler
+        except PySpin.SpinnakerException as ex:
+            print('AcquisitionSession.enable_image_events() Error: %s' % ex)
+            return(None)
 
-    return(result)
+        return(self.event_handler)
 
-## ====================================================================================
-def acquire_num_images(cam, nodemap, num_images, do_filesave=False, verbose=False):
-    """
-    This function acquires and saves N images from a device.
+    ## ===================================
+    def disable_image_events(self):
+        """
+        Unregister the FrameEventHandler, returning to polled frame retrieval.
 
-    :param cam: Camera to acquire images from.
-    :param nodemap: Device nodemap.
-    :param nodemap_tldevice: Transport layer device nodemap.
-    :type cam: CameraPtr
-    :return: True if successful, False otherwise.
-    :rtype: bool
-    """
+        :return: True if successful, False otherwise.
+        :rtype: bool
+        """
 
-    (image_width, image_height) = get_image_width_height(nodemap, verbose=False)
-    image_set = None
-    ts_set = 0
+        if self.event_handler is None:
+            return(True)
 
-    try:
-        ## Set acquisition mode to continuous.
-        ## In order to access the node entries, they have to be casted to a pointer type (CEnumerationPtr here)
-        node_acquisition_mode = PySpin.CEnumerationPtr(nodemap.GetNode('AcquisitionMode'))
-        if not PySpin.IsAvailable(node_acquisition_mode) or not PySpin.IsWritable(node_acquisition_mode):
-            print('Unable to set acquisition mode to continuous (enum retrieval). Aborting...')
+        try:
+            self.cam.UnregisterEventHandler(self.event_handler)
+        except PySpin.SpinnakerException as ex:
+            print('AcquisitionSession.disable_image_events() Error: %s' % ex)
+            return(False)
+        finally:
+            self.event_handler = None
+
+        return(True)
+
+    ## ===================================
+    def get_next_image(self, out=None, metadata=None, index=0, verbose=False):
+        """
+        Retrieve the next complete frame from the running stream.
+
+        :param out: A preallocated contiguous array (such as a ring buffer slot) to copy the frame into. If None, then
+            a new array is allocated.
+        :param metadata: A FRAME_METADATA_DTYPE record array to write the frame's metadata into, or None.
+        :param index: The record of the metadata array to write.
+        :return: The image (a numpy array) and its timestamp in ns, or (None, 0) if the frame could not be retrieved.
+        :rtype: tuple
+        """
+
+        if not self.is_streaming and not self.start():
+            return(None, 0)
+        if self.event_handler is not None:
+            print('AcquisitionSession.get_next_image(): frames are being delivered by image events.')
             return(None, 0)
 
-        ## Retrieve entry node from enumeration node
-        node_acquisition_mode_continuous = node_acquisition_mode.GetEntryByName('Continuous')
-        if not PySpin.IsAvailable(node_acquisition_mode_continuous) or not PySpin.IsReadable(node_acquisition_mode_continuous):
-            print('Unable to set acquisition mode to continuous (entry retrieval). Aborting...')
+        try:
+            image_result = self.cam.GetNextImage(self.grab_timeout)
+            self.report.add_image(image_result)
+
+            if image_result.IsIncomplete():
+                print('Image incomplete with image status %d ...' % image_result.GetImageStatus())
+                image_result.Release()
+                return(None, 0)
+
+            ## The stream reuses its buffers, so the pixels have to be copied out before the image is released.
+            try:
+                image_data = copy_image_data(image_result, out)
+                if metadata is not None:
+                    read_frame_metadata(image_result, metadata, index, chunk_data=self.chunk_data)
+            finally:
+                ts = image_result.GetTimeStamp()
+                image_result.Release()
+        except PySpin.SpinnakerException as ex:
+            ## With the trigger on, the wait simply times out whenever no trigger has been sent.
+            if not (self.is_triggered and (ex.errorcode == PySpin.SPINNAKER_ERR_TIMEOUT)):
+                print('AcquisitionSession.get_next_image() Error: %s' % ex)
+            return(None, 0)
+        except ValueError as ex:
+            print('AcquisitionSession.get_next_image() Error: %s' % ex)
             return(None, 0)
 
-        ## Retrieve integer value from entry node
-        acquisition_mode_continuous = node_acquisition_mode_continuous.GetValue()
+        if verbose:
+            print(f'Grabbed image {image_data.shape}, timestamp(ns)={ts}')
 
-        ## Set integer value from entry node as new value of enumeration node
-        node_acquisition_mode.SetIntValue(acquisition_mode_continuous)
+        return(image_data, ts)
 
-        ## Begin acquiring images. Image acquisition must be ended when no more images are needed.
-        cam.BeginAcquisition()
+    ## ===================================
+    def fire_software_trigger(self):
+        """
+        Send a software trigger to the camera, so that it takes one frame. See configure_trigger().
 
-        image_set = zeros((image_height,image_width,num_images), 'uint16')
-        ts_set = zeros(num_images, 'uint64')
+        :return: True if successful, False otherwise.
+        :rtype: bool
+        """
 
-        ## Retrieve, convert, and save images
-        for i in range(num_images):
-            try:
-                ## Retrieve the next received image. Capturing an image houses images on the camera buffer. Trying to
-                ## capture an image that does not exist will hang the camera. Once an image from the buffer is saved
-                ## and/or no longer needed, the image must be released in order to keep the buffer from filling up.
-                image_result = cam.GetNextImage(1000)
+        if not self.is_streaming and not self.start():
+            return(False)
 
-                ## Ensure image completion. This should be done whenever a complete image is expected or required.
-                if image_result.IsIncomplete():
-                    print('Image incomplete with image status %d ...' % image_result.GetImageStatus())
-                    continue
-                else:
-                    ## Get the image height and width. Image objects have quite a bit of available metadata including
-                    ## things such as CRC, image status, and offset values, to name a few.
-                    #width = image_result.GetWidth()
-                    #height = image_result.GetHeight()
-                    #fmt = image_result.GetPixelFormatName()
-                    ts_set[i] = image_result.GetTimeStamp()
-                    #msg = 'Grabbed Image width=%d, height=%d, fmt=%s, timestamp(ns)=%d' % (width, height, fmt, ts)
-
-                if do_filesave:
-                    ## Convert image for saving. PySpin can save 16-bit data in RAW format, but all other formats must be 8-bit.
-                    if filename.endswith('raw') and (image_result.GetPixelFormatName() == 'Mono16'):
-                        image_converted = image_result.Convert(PySpin.PixelFormat_Mono16, PySpin.HQ_LINEAR)
-                    else:
-                        image_converted = image_result.Convert(PySpin.PixelFormat_Mono8, PySpin.HQ_LINEAR)
-                    filename = f'{i:05d}.tif'
-                    image_converted.Save(filename)
+        return(fire_software_trigger(self.nodemap, verbose=self.verbose))
 
-                ## This is the numpy array result to return.
-                image_set[:,:,i] = array(image_result.GetNDArray())
-                #print(i, f'amin(image_set[:,:,i])={amin(image_set[:,:,i]):.1f}, amax(image_set[:,:,i])={amax(image_set[:,:,i]):.1f}')
+    ## ===================================
+    def get_triggered_image(self, out=None, metadata=None, index=0, on_exposure_end=None, verbose=False):
+        """
+        Send a software trigger and retrieve the frame it produces. This gives exactly one frame per call, such as one
+        frame per step of a device-sequenced scan.
 
-                ## Release image. Images retrieved directly from the camera (i.e. non-converted
-                ## images) need to be released in order to keep from filling the buffer.
-                image_result.Release()
+        :param on_exposure_end: A function to call once the exposure has ended, such as the next move of a scan, so
+            that it overlaps the sensor readout. This needs the 'ExposureEnd' device event (see enable_device_events());
+            without it, the function is called after the frame has arrived.
+        :return: The image (a numpy array) and its timestamp in ns, or (None, 0) if the frame could not be retrieved.
+        :rtype: tuple
+        """
 
-            except PySpin.SpinnakerException as ex:
-                print('acquire_num_images(): Error 1: %s' % ex)
+        if (on_exposure_end is not None) and (self.device_events is not None):
+            event_count = self.device_events.get_count('EventExposureEnd')
+            if not self.fire_software_trigger():
                 return(None, 0)
+            if not self.device_events.wait_for_event('EventExposureEnd', event_count, self.grab_timeout / 1000.0):
+                print('AcquisitionSession.get_triggered_image(): timed out waiting for the end of the exposure.')
+            on_exposure_end()
+            return(self.get_next_image(out=out, metadata=metadata, index=index, verbose=verbose))
 
-        ## End acquisition. Ending acquisition appropriately helps ensure that devices clean up
-        ## properly and do not need to be power-cycled to maintain integrity.
-        cam.EndAcquisition()
+        if not self.fire_software_trigger():
+            return(None, 0)
 
-    except PySpin.SpinnakerException as ex:
-        print('acquire_num_images(): Error 2: %s' % ex)
-        return(None, 0)
+        result = self.get_next_image(out=out, metadata=metadata, index=index, verbose=verbose)
+        if on_exposure_end is not None:
+            on_exposure_end()
+
+        return(result)
+
+    ## ===================================
+    def get_num_images(self, num_images, out=None, metadata=None, max_retries=None, verbose=False):
+        """
+        Retrieve the next N complete frames from the running stream. Incomplete (or failed) frames are retried, up to
+        a budget of max_retries (num_images if None).
+
+        :param num_images: uint
+        :param out: A preallocated contiguous stack of shape (num_images,Nx,Ny) to copy the frames into. If None, then
+            a new stack is allocated.
+        :param metadata: A FRAME_METADATA_DTYPE record array of length num_images to fill in, or None.
+        :return: The image set (a view of shape (Nx,Ny,num_images) onto the frame stack) and the array of timestamps,
+            or (None, 0) if N complete frames could not be collected within the retry budget.
+        :rtype: tuple
+        """
+
+        if max_retries is None:
+            max_retries = num_images
+
+        if out is None:
+            (image_width, image_height) = get_image_size(self.nodemap)
+            out = zeros((num_images,image_height,image_width), 'uint16')
+        ts_set = zeros(num_images, 'uint64')
 
-    return(image_set, ts_set)
+        num_retries = 0
+        i = 0
+        while (i < num_images):
+            (image_data, ts) = self.get_next_image(out=out[i], metadata=metadata, index=i, verbose=verbose)
+            if image_data is None:
+                num_retries += 1
+                self.report.num_retries += 1
+                if (num_retries > max_retries):
+                    print(f'AcquisitionSession.get_num_images(): collected only {i} of {num_images} complete frames. Aborting...')
+                    return(None, 0)
+                continue
+            ts_set[i] = ts
+            i += 1
+
+        return(moveaxis(out, 0, -1), ts_set)
 
 ## ====================================================================================
-def acquire_one_image(cam, nodemap, filename='', verbose=False):
+class FrameGrabber(threading.Thread):
     """
-    This function acquires and saves one image from a device.
+    A background thread that pulls frames from a running AcquisitionSession into a fixed ring of preallocated uint16
+    arrays, and publishes the index of the newest frame. Acquisition therefore keeps running at the full sensor rate
+    no matter how slowly the frames are consumed. The grabber has to be stopped before the session is stopped, and a
+    new grabber created whenever the image size changes.
 
-    :param cam: Camera to acquire images from.
-    :type cam: CameraPtr
-    :param nodemap: Device nodemap.
-    :param filename: The filename to use if saving the image. Otherwise null string.
-    :return: True if successful, False otherwise.
-    :rtype: bool
+    A slot returned by get_latest() is not overwritten until another (nbuffers - 1) frames have arrived, so a reader
+    that needs to hold on to a frame longer than that should copy it. Likewise, get_next_frames() can only catch up on
+    the last (nbuffers - 1) frames; any older frames that it has to skip are counted in num_overruns.
+
+    If the session has image events enabled (see AcquisitionSession.enable_image_events()), then no thread is run:
+    the grabber instead subscribes to every frame pushed by the session's event handler and writes it into the ring.
+
+    :param session: The acquisition stream to pull frames from.
+    :type session: AcquisitionSession
+    :param nbuffers: The number of frames in the ring.
     """
 
-    image_data = None
-    ts = 0
+    def __init__(self, session, nbuffers=8, verbose=False):
+        super().__init__(daemon=True)
+        self.session = session
+        self.nbuffers = nbuffers
+        self.verbose = verbose
+        self.subscription = None    ## the event handler subscription, when frames are pushed rather than pulled
+
+        (image_width, image_height) = get_image_size(session.nodemap)
+        self.ring = zeros((nbuffers,image_height,image_width), 'uint16')
+        self.ring_ts = zeros(nbuffers, 'uint64')
+        self.ring_metadata = zeros(nbuffers, FRAME_METADATA_DTYPE)
+        self.latest_index = -1      ## the ring slot holding the newest frame (-1 until the first frame arrives)
+        self.frame_count = 0        ## the total number of frames written into the ring
+        self.num_overruns = 0       ## the number of frames overwritten before get_next_frames() could copy them
+        self.pipeline_depth = 2     ## frames that can already be exposed or exposing when a setting changes (readout + exposure)
+
+        self.new_frame = threading.Condition()
+        self.stop_event = threading.Event()
+
+    ## ===================================
+    def start(self):
+        if self.session.event_handler is None:
+            super().start()
+        else:
+            self.subscription = self.session.event_handler.subscribe(self.push, latest_only=False)
+        return
+
+    ## ===================================
+    def is_running(self):
+        if self.subscription is not None:
+            return(not self.stop_event.is_set())
+        return(self.is_alive())
+
+    ## ===================================
+    def push(self, image_data, ts, metadata):
+        """
+        Write one frame into the ring. This is the event handler callback used when frames are pushed.
+        """
+
+        index = self.frame_count % self.nbuffers
+        copyto(self.ring[index], image_data)
+        self.ring_ts[index] = ts
+        self.ring_metadata[index] = metadata[0]
+
+        with self.new_frame:
+            self.latest_index = index
+            self.frame_count += 1
+            self.new_frame.notify_all()
+
+        return
+
+    ## ===================================
+    def run(self):
+        while not self.stop_event.is_set() and self.session.is_streaming:
+            ## Copy straight into the slot after the newest one. Readers only look at the (nbuffers - 1) published frames
+            ## before it, so this one is free.
+            index = self.frame_count % self.nbuffers
+            (image_data, ts) = self.session.get_next_image(out=self.ring[index], metadata=self.ring_metadata, index=index)
+            if image_data is None:
+                continue
+            self.ring_ts[index] = ts
+
+            with self.new_frame:
+                self.latest_index = index
+                self.frame_count += 1
+                self.new_frame.notify_all()
+
+        ## Wake up anyone still waiting for a frame.
+        with self.new_frame:
+            self.new_frame.notify_all()
+
+        if self.verbose:
+            print(f'FrameGrabber stopped after {self.frame_count} frames')
+
+        return
+
+    ## ===================================
+    def stop(self):
+        """
+        Stop the grabber thread and wait for it to finish. The session is left running.
+        """
+
+        self.stop_event.set()
+        if self.subscription is not None:
+            self.session.event_handler.unsubscribe(self.subscription)
+            with self.new_frame:
+                self.new_frame.notify_all()
+        elif self.is_alive():
+            self.join()
+        return
+
+    ## ===================================
+    def get_latest(self, timeout=None):
+        """
+        Get the newest frame in the ring, waiting for the first frame to arrive if necessary.
+
+        :param timeout: Maximum time (in sec) to wait for the first frame, or None to use twice the session's frame
+            timeout.
+        :return: The ring slot holding the newest frame, its timestamp in ns, and the frame count, or (None, 0, 0) if
+            no frame is available.
+        :rtype: tuple
+        """
+
+        if timeout is None:
+            timeout = 2 * self.session.grab_timeout / 1000.0
+
+        with self.new_frame:
+            if not self.new_frame.wait_for(lambda: (self.frame_count > 0) or not self.is_running(), timeout):
+                return(None, 0, 0)
+            if (self.frame_count == 0):
+                return(None, 0, 0)
+            index = self.latest_index
+            return(self.ring[index], self.ring_ts[index], self.frame_count)
+
+    ## ===================================
+    def wait_for_exposure(self, exposure_time, timeout=None, max_frames=None):
+        """
+        Find the first frame taken with a newly set exposure time. Frames that were already exposed, or being exposed,
+        when the exposure was changed still arrive after the change, so waiting for the next frame is not enough. With
+        chunk data, the frames are read until one reports the new exposure time. Without it, the frames that may have
+        been in flight (pipeline_depth + 1) are skipped.
+
+        :param exposure_time: The exposure time (in usec) read back from the camera after setting it.
+        :param timeout: Maximum time (in sec) to wait for each frame, or None to use twice the session's frame timeout.
+        :param max_frames: The number of frames to check before giving up, or None for (pipeline_depth + nbuffers).
+        :return: A frame count to pass to get_next_frames() as "after", so that the next frame it returns is the first
+            one taken with the new exposure.
+        :rtype: int
+        """
+
+        with self.new_frame:
+            next_count = self.frame_count + 1
+        if not self.session.chunk_data:
+            return(next_count + self.pipeline_depth)
+
+        if timeout is None:
+            timeout = 2 * self.session.grab_timeout / 1000.0
+        if max_frames is None:
+            max_frames = self.pipeline_depth + self.nbuffers
+        tolerance = max(1.0, 1.0e-3 * exposure_time)
+
+        for _ in range(max_frames):
+            with self.new_frame:
+                if not self.new_frame.wait_for(lambda: (self.frame_count >= next_count) or not self.is_running(), timeout):
+                    break
+                if (self.frame_count < next_count):
+                    break
+                next_count = max(next_count, self.frame_count - self.nbuffers + 2)
+                if (abs(self.ring_metadata[(next_count - 1) % self.nbuffers]['exposure_time'] - exposure_time) <= tolerance):
+                    return(next_count - 1)
+                next_count += 1
+
+        print(f'FrameGrabber.wait_for_exposure(): no frame with the exposure time {exposure_time}us arrived.')
+        return(next_count - 1)
+
+    ## ===================================
+    def get_next_frames(self, num_frames, out=None, metadata=None, timeout=None, after=None):
+        """
+        Wait for and copy out, in order, the next N frames that arrive after this function is called (or after the
+        frame count given by "after"). If the reader falls more than (nbuffers - 1) frames behind, then the frames that
+        have already been overwritten are skipped and counted in num_overruns.
+
+        :param num_frames: uint
+        :param out: A preallocated contiguous stack of shape (num_frames,Nx,Ny) to copy the frames into. If None, then
+            a new stack is allocated.
+        :param metadata: A FRAME_METADATA_DTYPE record array of length num_frames to fill in, or None.
+        :param timeout: Maximum time (in sec) to wait for each frame, or None to use twice the session's frame timeout.
+        :param after: A frame_count value taken earlier, such as just before sending a trigger, so that a frame which
+            arrives before this function is called is not missed. If None, then the current frame count is used.
+        :return: The image set (a view of shape (Nx,Ny,num_frames) onto the frame stack) and the array of timestamps,
+            or (None, 0) if a frame did not arrive in time.
+        :rtype: tuple
+        """
+
+        if out is None:
+            out = zeros((num_frames,) + self.ring.shape[1:], 'uint16')
+        ts_set = zeros(num_frames, 'uint64')
+        if timeout is None:
+            timeout = 2 * self.session.grab_timeout / 1000.0
+
+        ## Frame number n (counting from 1) is held in ring slot (n - 1) % nbuffers.
+        with self.new_frame:
+            next_count = (self.frame_count if (after is None) else after) + 1
+
+        i = 0
+        while (i < num_frames):
+            with self.new_frame:
+                if not self.new_frame.wait_for(lambda: (self.frame_count >= next_count) or not self.is_running(), timeout):
+                    return(None, 0)
+                if (self.frame_count < next_count):
+                    return(None, 0)
+
+                ## The slot after the newest frame may already be being overwritten, so it is not read.
+                oldest_count = min(self.frame_count - self.nbuffers + 2, self.frame_count)
+                if (next_count < oldest_count):
+                    self.num_overruns += oldest_count - next_count
+                    if self.verbose:
+                        print(f'FrameGrabber: {oldest_count - next_count} frames were overwritten before they could be read')
+                    next_count = oldest_count
+
+                while (next_count <= self.frame_count) and (i < num_frames):
+                    index = (next_count - 1) % self.nbuffers
+                    copyto(out[i], self.ring[index])
+                    ts_set[i] = self.ring_ts[index]
+                    if metadata is not None:
+                        metadata[i] = self.ring_metadata[index]
+                    next_count += 1
+                    i += 1
+
+        return(moveaxis(out, 0, -1), ts_set)
 
-    try:
-        ## Begin image acquisition. Image acquisition must be ended when no more images are needed.
-        cam.BeginAcquisition()
+## ====================================================================================
+def latch_timestamp(nodemap):
+    """
+    Latch the camera's timestamp counter and read the latched value (in ns). This is used to measure the offsets
+    between the clocks of several cameras.
 
-        ## Retrieve, convert, and save the image.
+    :param nodemap: Device GenICam nodemap
+    :type nodemap: INodeMap
+    :return: The latched timestamp, or None if the camera cannot latch its timestamp.
+    :rtype: int
+    """
+
+    ## Older (GigE Vision) cameras use the "Gev" names for these nodes.
+    for (latch_name, value_name) in (('TimestampLatch','TimestampLatchValue'), ('GevTimestampControlLatch','GevTimestampValue')):
         try:
-            ## Retrieve the next received image. Capturing an image houses images on the camera buffer. Trying to
-            ## capture an image that does not exist will hang the camera. Once an image from the buffer is saved
-            ## and/or no longer needed, the image must be released in order to keep the buffer from filling up.
-            image_result = cam.GetNextImage(1000)
+            node_latch = PySpin.CCommandPtr(nodemap.GetNode(latch_name))
+            node_value = PySpin.CIntegerPtr(nodemap.GetNode(value_name))
+            if not PySpin.IsAvailable(node_latch) or not PySpin.IsWritable(node_latch):
+                continue
+            if not PySpin.IsAvailable(node_value) or not PySpin.IsReadable(node_value):
+                continue
 
-            ## Ensure image completion. This should be done whenever a complete image is expected or required.
-            if image_result.IsIncomplete():
-                print('Image incomplete with image status %d ...' % image_result.GetImageStatus())
-            else:
-                ## Get the image height and width. Image objects have quite a bit of available metadata including
-                ## things such as CRC, image status, and offset values, to name a few.
-                #width = image_result.GetWidth()
-                #height = image_result.GetHeight()
-                #fmt = image_result.GetPixelFormatName()
-                #msg = 'Grabbed Image width=%d, height=%d, fmt=%s, timestamp(ns)=%d' % (width, height, fmt, ts)
+            node_latch.Execute()
+            return(node_value.GetValue())
+        except PySpin.SpinnakerException as ex:
+            print('latch_timestamp() Error: %s' % ex)
+            return(None)
 
-                if filename:
-                    ## Convert image for saving. PySpin can save 16-bit data in RAW format, but all other formats must be 8-bit.
-                    if filename.endswith('raw') and (image_result.GetPixelFormatName() == 'Mono16'):
-                        image_converted = image_result.Convert(PySpin.PixelFormat_Mono16, PySpin.HQ_LINEAR)
-                    else:
-                        image_converted = image_result.Convert(PySpin.PixelFormat_Mono8, PySpin.HQ_LINEAR)
-                    image_converted.Save(filename)
-                    if verbose:
-                        print(msg + ', Image saved as: %s' % filename)
-                elif verbose:
-                    print(msg)
+    print('TimestampLatch node is not available...')
+    return(None)
 
-                ## This is the numpy array result to return. Flip up-down to fit bottom-left origin display.
-                image_data = image_result.GetNDArray()
-                ts = image_result.GetTimeStamp()
+## ====================================================================================
+class MultiCameraEngine:
+    """
+    Acquisition from every camera in a camera list, returned as matched frame sets. Each camera gets its own
+    AcquisitionSession and FrameGrabber thread, so that the cameras are read in parallel rather than one after
+    another. The cameras are either driven by the same trigger, which synchronizes their exposures: 'Software' sends
+    a software trigger to every camera for each frame set, and a hardware line (such as 'Line0') expects the cameras'
+    trigger inputs to be wired to a common source. Or they run freely (trigger=None), in which case their exposures
+    are not synchronized, and the frames are only matched by timestamp after capture, to within the tolerance given
+    to get_matched_frames().
+
+    Each camera's clock starts at its own power-up, so start() measures the offsets between the clocks with
+    calibrate_timestamps(), and all timestamps returned are on the clock of the first camera. Free-running frames
+    are not matched until the clocks have been calibrated.
+
+    :param camera_list: The Spinnaker camera list, such as from System.GetCameras().
+    :type camera_list: CameraList
+    :param trigger: None, 'Software', or a hardware trigger line such as 'Line0'.
+    :param nbuffers: The number of frames in each camera's ring.
+    :param chunk_data: Whether to enable chunk data on every camera.
+    """
 
-                ## Release image. Images retrieved directly from the camera (i.e. non-converted
-                ## images) need to be released in order to keep from filling the buffer.
-                image_result.Release()
+    def __init__(self, camera_list, trigger=None, nbuffers=8, chunk_data=False, verbose=False):
+        self.cameras = [camera_list.GetByIndex(i) for i in range(camera_list.GetSize())]
+        self.trigger = trigger
+        self.nbuffers = nbuffers
+        self.chunk_data = chunk_data
+        self.verbose = verbose
+
+        self.serial_numbers = []
+        self.nodemaps = []
+        self.sessions = []
+        self.grabbers = []
+        self.ts_offsets = zeros(len(self.cameras), 'int64')     ## the offset of each camera's clock from the first camera's (ns)
+        self.is_calibrated = False                              ## whether ts_offsets has been measured
+
+    def __enter__(self):
+        self.open()
+        self.start()
+        return(self)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return(False)
 
+    ## ===================================
+    def open(self):
+        """
+        Initialize every camera, set up its trigger and create its acquisition session.
+
+        :return: True if successful, False otherwise.
+        :rtype: bool
+        """
+
+        if (len(self.cameras) == 0):
+            print('MultiCameraEngine.open(): no cameras found.')
+            return(False)
+
+        try:
+            for cam in self.cameras:
+                serial_number = ''
+                node_serial = PySpin.CStringPtr(cam.GetTLDeviceNodeMap().GetNode('DeviceSerialNumber'))
+                if PySpin.IsAvailable(node_serial) and PySpin.IsReadable(node_serial):
+                    serial_number = node_serial.GetValue()
+                self.serial_numbers.append(serial_number)
+
+                cam.Init()
+                nodemap = cam.GetNodeMap()
+                self.nodemaps.append(nodemap)
+
+                if (self.trigger is None):
+                    set_trigger_mode(nodemap, False)
+                elif not configure_trigger(nodemap, source=self.trigger):
+                    print(f'MultiCameraEngine.open(): could not set up the trigger on camera {serial_number}.')
+                    return(False)
+
+                chunk_data = self.chunk_data and enable_chunk_data(nodemap)
+                self.sessions.append(AcquisitionSession(cam, nodemap, chunk_data=chunk_data, verbose=self.verbose))
         except PySpin.SpinnakerException as ex:
-            print('acquire_one_image(): Error 1: %s' % ex)
-            return(None, 0)
+            print('MultiCameraEngine.open() Error: %s' % ex)
+            return(False)
 
-        ## End acquisition. Ending acquisition appropriately helps ensure that devices clean up
-        ## properly and do not need to be power-cycled to maintain integrity.
-        cam.EndAcquisition()
+        if self.verbose:
+            print(f'MultiCameraEngine: opened {len(self.cameras)} cameras {self.serial_numbers}')
+
+        return(True)
+
+    ## ===================================
+    def calibrate_timestamps(self, nrepeats=5):
+        """
+        Measure the offset of each camera's clock from the first camera's, by latching the timestamps of all cameras
+        in quick succession. The host time elapsed between the latches is subtracted, and the measurement with the
+        shortest round trip is kept.
+
+        :param nrepeats: The number of measurements to take.
+        :return: The array of offsets (in ns), or None if a camera cannot latch its timestamp.
+        """
+
+        best_offsets = None
+        best_spread = None
+
+        for r in range(nrepeats):
+            latched = []
+            host_times = []
+            for nodemap in self.nodemaps:
+                host_times.append(time.perf_counter_ns())
+                latched.append(latch_timestamp(nodemap))
+            spread = time.perf_counter_ns() - host_times[0]
+
+            if any(ts is None for ts in latched):
+                return(None)
+
+            if (best_spread is None) or (spread < best_spread):
+                best_spread = spread
+                best_offsets = [(latched[i] - latched[0]) - (host_times[i] - host_times[0]) for i in range(len(latched))]
+
+        self.ts_offsets = array(best_offsets, 'int64')
+        self.is_calibrated = True
+        if self.verbose:
+            print(f'MultiCameraEngine: timestamp offsets (ns) = {self.ts_offsets}, latch spread = {best_spread / 1000.0:.0f} usec')
+
+        return(self.ts_offsets)
+
+    ## ===================================
+    def start(self):
+        """
+        Start the stream and the grab thread of every camera, calibrating the camera clocks first if that has not
+        been done yet.
+
+        :return: True if successful, False otherwise.
+        :rtype: bool
+        """
+
+        if not self.is_calibrated and (self.calibrate_timestamps() is None):
+            print('MultiCameraEngine.start(): could not calibrate the camera clocks. Timestamps are on each camera\'s own clock.')
+            if (self.trigger is None):
+                print('MultiCameraEngine.start(): free-running frames cannot be matched without calibrated clocks.')
+
+        for session in self.sessions:
+            if not session.start():
+                self.stop()
+                return(False)
 
-    except PySpin.SpinnakerException as ex:
-        print('acquire_one_image(): Error 2: %s' % ex)
-        return(None, 0)
+        self.grabbers = [FrameGrabber(session, nbuffers=self.nbuffers, verbose=self.verbose) for session in self.sessions]
+        for grabber in self.grabbers:
+            grabber.start()
 
-    return(image_data, ts)
+        return(True)
 
-## ====================================================================================
-def video_fastsave(cam, nodemap, num_images, file_dir='', file_prefix='', file_suffix='raw', start_num=0, verbose=False):
-    """
-    This function acquires and saves N images, in RAW format, from a device.
+    ## ===================================
+    def stop(self):
+        """
+        Stop the grab threads and then the streams.
+        """
 
-    :param cam: Camera to acquire images from.
-    :param nodemap: Device nodemap.
-    :param nodemap_tldevice: Transport layer device nodemap.
-    :type cam: CameraPtr
-    :return: True if successful, False otherwise.
-    :rtype: bool
-    """
+        for grabber in self.grabbers:
+            grabber.stop()
+        self.grabbers = []
 
-    (image_width, image_height) = get_image_width_height(nodemap, verbose=False)
+        for session in self.sessions:
+            session.stop()
 
-    try:
-        ## Set acquisition mode to continuous.
-        ## In order to access the node entries, they have to be casted to a pointer type (CEnumerationPtr here)
-        node_acquisition_mode = PySpin.CEnumerationPtr(nodemap.GetNode('AcquisitionMode'))
-        if not PySpin.IsAvailable(node_acquisition_mode) or not PySpin.IsWritable(node_acquisition_mode):
-            print('Unable to set acquisition mode to continuous (enum retrieval). Aborting...')
-            return(None, 0)
+        return
 
-        ## Retrieve entry node from enumeration node
-        node_acquisition_mode_continuous = node_acquisition_mode.GetEntryByName('Continuous')
-        if not PySpin.IsAvailable(node_acquisition_mode_continuous) or not PySpin.IsReadable(node_acquisition_mode_continuous):
-            print('Unable to set acquisition mode to continuous (entry retrieval). Aborting...')
-            return(None, 0)
+    ## ===================================
+    def close(self):
+        """
+        Stop acquiring and deinitialize every camera.
+        """
 
-        ## Retrieve integer value from entry node
-        acquisition_mode_continuous = node_acquisition_mode_continuous.GetValue()
+        self.stop()
+        for cam in self.cameras:
+            try:
+                cam.DeInit()
+            except PySpin.SpinnakerException as ex:
+                print('MultiCameraEngine.close() Error: %s' % ex)
+
+        self.sessions = []
+        self.nodemaps = []
+        self.is_calibrated = False
+        return
+
+    ## ===================================
+    def get_matched_frames(self, tolerance=None, timeout=None):
+        """
+        Get one frame from every camera, all exposed at the same time. With a software trigger, every camera is
+        triggered and the frames it produces are collected. Otherwise, the next frame from each camera is taken, and
+        any camera whose frame is earlier than the others by more than the tolerance is advanced to its next frame
+        until the frames line up. This needs the camera clocks to have been calibrated (see calibrate_timestamps()).
+
+        :param tolerance: The largest allowed spread (in ns) of the frame timestamps, or None to use half the frame
+            period of the first camera.
+        :param timeout: Maximum time (in sec) to wait for each frame, or None to use the sessions' frame timeouts.
+        :return: The list of images (one per camera) and the array of their timestamps on the first camera's clock, or
+            (None, None) if a matched set could not be collected.
+        :rtype: tuple
+        """
+
+        ncameras = len(self.grabbers)
+        if (ncameras == 0):
+            return(None, None)
+
+        if (tolerance is None):
+            framerate = get_framerate(self.nodemaps[0])
+            tolerance = 0.5e9 / framerate if (framerate > 0) else 1.0e6
+
+        images = [None] * ncameras
+        ts_set = zeros(ncameras, 'int64')
+
+        if (self.trigger == 'Software'):
+            frame_counts = [grabber.frame_count for grabber in self.grabbers]
+            for session in self.sessions:
+                if not session.fire_software_trigger():
+                    return(None, None)
+            for i in range(ncameras):
+                (img_set, ts) = self.grabbers[i].get_next_frames(1, timeout=timeout, after=frame_counts[i])
+                if img_set is None:
+                    return(None, None)
+                images[i] = img_set[:,:,0]
+                ts_set[i] = int(ts[0]) - self.ts_offsets[i]
+        else:
+            ## Without the clock offsets, the timestamps of different cameras cannot be compared.
+            if not self.is_calibrated and (ncameras > 1):
+                print('MultiCameraEngine.get_matched_frames(): the camera clocks have not been calibrated.')
+                return(None, None)
+
+            for i in range(ncameras):
+                (img_set, ts) = self.grabbers[i].get_next_frames(1, timeout=timeout)
+                if img_set is None:
+                    return(None, None)
+                images[i] = img_set[:,:,0]
+                ts_set[i] = int(ts[0]) - self.ts_offsets[i]
+
+            ## Advance the lagging cameras. Each camera only has so many frames in its ring, so give up after that many.
+            max_attempts = self.nbuffers * ncameras
+            for attempt in range(max_attempts + 1):
+                latest = amax(ts_set)
+                lagging = [i for i in range(ncameras) if (latest - ts_set[i] > tolerance)]
+                if not lagging:
+                    break
+                if (attempt == max_attempts):
+                    print('MultiCameraEngine.get_matched_frames(): could not match the frame timestamps.')
+                    return(None, None)
+                for i in lagging:
+                    (img_set, ts) = self.grabbers[i].get_next_frames(1, timeout=timeout)
+                    if img_set is None:
+                        return(None, None)
+                    images[i] = img_set[:,:,0]
+                    ts_set[i] = int(ts[0]) - self.ts_offsets[i]
+
+        if (amax(ts_set) - amin(ts_set) > tolerance):
+            print(f'MultiCameraEngine.get_matched_frames(): frame timestamps differ by {(amax(ts_set) - amin(ts_set)) / 1000.0:.0f} usec.')
+
+        return(images, ts_set)
 
-        ## Set integer value from entry node as new value of enumeration node
-        node_acquisition_mode.SetIntValue(acquisition_mode_continuous)
+## ====================================================================================
+class AsyncCamera:
+    """
+    An asyncio interface to one camera's acquisition stream, so that a scan can await frames from the camera while
+    also awaiting other devices (such as the LCTF, a motor or the projector) in the same event loop. For example:
 
-        ## Begin acquiring images. Image acquisition must be ended when no more images are needed.
-        cam.BeginAcquisition()
+        async with AsyncCamera(cam) as acam:
+            await acam.set_exposure(5000)
+            async for (image_data, ts, metadata) in acam.stream(num_frames=10):
+                ...
 
-        s = ''
+    Every blocking Spinnaker call is run on a single worker thread that belongs to this camera, so the calls are
+    made one at a time and in the order they were awaited, and no other thread ever touches the camera. A settings
+    change awaited while a frame is being waited for therefore runs once that frame has arrived (or timed out).
+    Cancelling an await does not interrupt the call already running on the worker.
 
-        ## Retrieve, convert, and save images
-        for i in range(num_images):
-            filename = f'{file_dir}{file_prefix}_{start_num+i:05}.{file_suffix}'
+    :param cam: Camera to acquire images from.
+    :type cam: CameraPtr
+    :param chunk_data: Whether to enable chunk data, so that the exposure time and gain of each frame are decoded
+        into its metadata.
+    """
 
-            try:
-                ## Retrieve the next received image. Capturing an image houses images on the camera buffer. Trying to
-                ## capture an image that does not exist will hang the camera. Once an image from the buffer is saved
-                ## and/or no longer needed, the image must be released in order to keep the buffer from filling up.
-                image_result = cam.GetNextImage(1000)
+    def __init__(self, cam, chunk_data=False, verbose=False):
+        self.cam = cam
+        self.chunk_data = chunk_data
+        self.verbose = verbose
+        self.camctrl = CameraControl(cam, verbose=verbose)
+        self.nodemap = None
+        self.session = None
+        self.initialized_here = False       ## whether open() initialized the camera, so that close() should deinitialize it
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='spinnaker')
+
+    async def __aenter__(self):
+        await self.open()
+        await self.start()
+        return(self)
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+        return(False)
 
-                ## Ensure image completion. This should be done whenever a complete image is expected or required.
-                if image_result.IsIncomplete():
-                    print('Image incomplete with image status %d ...' % image_result.GetImageStatus())
-                    continue
-                else:
-                    if filename.endswith('raw') and (image_result.GetPixelFormatName() == 'Mono16'):
-                        image_converted = image_result.Convert(PySpin.PixelFormat_Mono16, PySpin.HQ_LINEAR)
-                    elif filename.endswith('tif') and (image_result.GetPixelFormatName() == 'Mono16'):
-                        image_converted = image_result.Convert(PySpin.PixelFormat_Mono16, PySpin.HQ_LINEAR)
-                    else:
-                        image_converted = image_result.Convert(PySpin.PixelFormat_Mono8, PySpin.HQ_LINEAR)
-                    image_converted.Save(filename)
+    ## ===================================
+    async def call(self, func, *args, **kwargs):
+        """
+        Run a blocking function (such as any of the module-level helpers) on the camera's worker thread, and return
+        its result.
+        """
 
-                    if verbose:
-                        s += f'Saved "{filename}": ts={image_result.GetTimeStamp()}\n'
-                        #print(f'Saved "{filename}": ts={image_result.GetTimeStamp()}')
+        loop = asyncio.get_running_loop()
+        return(await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs)))
 
-                ## Release image. Images retrieved directly from the camera (i.e. non-converted
-                ## images) need to be released in order to keep from filling the buffer.
-                image_result.Release()
+    ## ===================================
+    async def open(self):
+        """
+        Initialize the camera (if it is not already initialized) and create its acquisition session.
 
-            except PySpin.SpinnakerException as ex:
-                print('video_fastsave(): Error 1: %s' % ex)
-                return(None, 0)
+        :return: True if successful, False otherwise.
+        :rtype: bool
+        """
 
-        ## End acquisition. Ending acquisition appropriately helps ensure that devices clean up
-        ## properly and do not need to be power-cycled to maintain integrity.
-        cam.EndAcquisition()
+        return(await self.call(self._open))
 
-    except PySpin.SpinnakerException as ex:
-        print('video_fastsave(): Error 2: %s' % ex)
-        return(None, 0)
+    def _open(self):
+        try:
+            if not self.cam.IsInitialized():
+                self.cam.Init()
+                self.initialized_here = True
+            self.camctrl.invalidate()
+            self.nodemap = self.cam.GetNodeMap()
+        except PySpin.SpinnakerException as ex:
+            print('AsyncCamera.open() Error: %s' % ex)
+            return(False)
 
-    return(s)
+        chunk_data = self.chunk_data and enable_chunk_data(self.nodemap)
+        self.session = AcquisitionSession(self.cam, self.nodemap, chunk_data=chunk_data, verbose=self.verbose)
+        return(True)
+
+    ## ===================================
+    async def close(self):
+        """
+        Stop the stream, deinitialize the camera if open() initialized it, and shut down the worker thread.
+        """
+
+        if self.session is not None:
+            await self.call(self._close)
+        self.executor.shutdown(wait=True)
+        return
+
+    def _close(self):
+        self.session.stop()
+        if self.session.chunk_data:
+            disable_chunk_data(self.nodemap)
+        if self.initialized_here:
+            try:
+                self.cam.DeInit()
+            except PySpin.SpinnakerException as ex:
+                print('AsyncCamera.close() Error: %s' % ex)
+        self.session = None
+        return
+
+    ## ===================================
+    async def start(self):
+        """
+        Start the acquisition stream.
+
+        :return: True if successful, False otherwise.
+        :rtype: bool
+        """
+
+        return(await self.call(self.session.start))
+
+    async def stop(self):
+        """
+        Stop the acquisition stream.
+
+        :return: True if successful, False otherwise.
+        :rtype: bool
+        """
+
+        return(await self.call(self.session.stop))
+
+    ## ===================================
+    async def next_frame(self):
+        """
+        Wait for the next frame from the running stream.
+
+        :return: The image (a newly allocated numpy array), its timestamp in ns, and its FRAME_METADATA_DTYPE record,
+            or (None, 0, None) if the frame was incomplete or did not arrive in time.
+        :rtype: tuple
+        """
+
+        return(await self.call(self._next_frame))
+
+    def _next_frame(self):
+        metadata = zeros(1, FRAME_METADATA_DTYPE)
+        (image_data, ts) = self.session.get_next_image(metadata=metadata)
+        if image_data is None:
+            return(None, 0, None)
+        return(image_data, ts, metadata[0])
+
+    ## ===================================
+    async def stream(self, num_frames=None):
+        """
+        Iterate over the complete frames from the running stream, as (image, timestamp, metadata) tuples. Incomplete
+        frames are skipped.
+
+        :param num_frames: The number of frames to yield, or None to keep going until the stream is stopped or a
+            frame times out.
+        """
+
+        i = 0
+        while (num_frames is None) or (i < num_frames):
+            if not self.session.is_streaming:
+                return
+            report = self.session.report
+            num_incomplete = report.num_incomplete
+            (image_data, ts, metadata) = await self.next_frame()
+            if image_data is None:
+                ## Skip an incomplete frame, but stop on a timeout or error.
+                if (report.num_incomplete > num_incomplete):
+                    continue
+                return
+            yield (image_data, ts, metadata)
+            i += 1
+
+        return
+
+    ## ===================================
+    async def get_triggered_frame(self):
+        """
+        Fire a software trigger and wait for the frame it produces. The trigger must already be set up, such as with
+        "await acam.call(configure_trigger, acam.nodemap, 'Software')" while the stream is stopped.
+
+        :return: The image, its timestamp in ns, and its metadata record, or (None, 0, None) if no complete frame
+            arrived.
+        :rtype: tuple
+        """
+
+        return(await self.call(self._get_triggered_frame))
+
+    def _get_triggered_frame(self):
+        metadata = zeros(1, FRAME_METADATA_DTYPE)
+        (image_data, ts) = self.session.get_triggered_image(metadata=metadata)
+        if image_data is None:
+            return(None, 0, None)
+        return(image_data, ts, metadata[0])
+
+    ## ===================================
+    async def configure(self, pixel_format=None, binning=None, roi=None, exposure=None):
+        """
+        Change the image format and exposure, as with CameraControl.configure(). The stream is restarted if a setting
+        that is locked while streaming changes.
+
+        :return: True if successful, False otherwise.
+        :rtype: bool
+        """
+
+        return(await self.call(self._configure, pixel_format, binning, roi, exposure))
+
+    def _configure(self, pixel_format, binning, roi, exposure):
+        was_streaming = self.session.is_streaming
+        ok = self.camctrl.configure(pixel_format=pixel_format, binning=binning, roi=roi, exposure=exposure,
+                                    stop_stream=self.session.stop if was_streaming else None,
+                                    start_stream=self.session.start if was_streaming else None)
+        self.session.update_grab_timeout()
+        return(ok)
+
+    ## ===================================
+    async def set_exposure(self, time_in_usec):
+        """
+        Set the exposure time (in usec). The stream keeps running.
+
+        :return: True if successful, False otherwise.
+        :rtype: bool
+        """
+
+        return(await self.call(self._set_exposure, time_in_usec))
+
+    def _set_exposure(self, time_in_usec):
+        ok = self.camctrl.set_exposure_time(time_in_usec, verbose=self.verbose)
+        self.session.update_grab_timeout()
+        return(ok)
+
+    ## ===================================
+    async def set_framerate(self, framerate):
+        """
+        Set the frame rate (in Hz). The stream keeps running.
+
+        :return: True if successful, False otherwise.
+        :rtype: bool
+        """
+
+        return(await self.call(self._set_framerate, framerate))
+
+    def _set_framerate(self, framerate):
+        ok = set_framerate(self.nodemap, framerate, verbose=self.verbose)
+        self.session.update_grab_timeout()
+        return(ok)
 
 ## ====================================================================================
 def get_image_minmax(nodemap, verbose=False):
@@ -1249,6 +4654,8 @@ class ReadType:
     VALUE = 0,
     INDIVIDUAL = 1
 
+CHOSEN_READ = ReadType.INDIVIDUAL
+
 ## ====================================================================================
 def recursive_print_dict(d, indent = 0 ):
     for k, v in d.items():
@@ -1705,7 +5112,6 @@ def get_camera_statusdict(cam):
 ## ====================================================================================
 def print_all_camera_node_info():
     result = True
-    CHOSEN_READ = ReadType.INDIVIDUAL
 
     # Retrieve singleton reference to system object
     system = PySpin.System.GetInstance()
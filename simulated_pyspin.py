@@ -0,0 +1,1257 @@
+"""
+A simulated stand-in for the PySpin module, for running the library and the GUI without a camera attached (such as
+for benchmarking and regression testing on a headless machine). It emulates the parts of the PySpin API that this
+repository uses: the System and camera list, the GenICam device, TL device and TL stream nodemaps, acquisition with
+GetNextImage() at the frame rate implied by the camera settings, stream buffer handling, triggers, chunk data, the
+sequencer, and image and device events.
+
+To use it, set the environment variable FLIR_SIMULATED_CAMERA=1 before importing flir_spin_library (or starting the
+GUI). The simulated cameras are configured through the SIMULATION dictionary below, whose defaults can be overridden
+with environment variables (such as FLIR_SIM_DROP_RATE=0.01) or by changing the dictionary before the cameras are
+first listed.
+
+The frames show a fixed test scene, scaled by the exposure time and gain, plus read noise. Dropped frames (the frame
+ID advances but the frame never arrives) and incomplete frames can be injected at random. The cameras can also share a
+bus of limited capacity, in which case frames arrive incomplete whenever the streaming cameras together try to send
+more than the bus can carry. GigE cameras additionally lose every frame if their packets are larger than the host
+accepts (as when jumbo frames are not enabled on the network adapter).
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from numpy import empty, uint8, uint16, float32, clip, indices, exp, sqrt, random, minimum
+
+## Settings of the simulated cameras.
+SIMULATION = {
+    'num_cameras': int(os.environ.get('FLIR_SIM_NUM_CAMERAS', 1)),
+    'sensor_width': int(os.environ.get('FLIR_SIM_WIDTH', 1440)),
+    'sensor_height': int(os.environ.get('FLIR_SIM_HEIGHT', 1080)),
+    'max_framerate': float(os.environ.get('FLIR_SIM_MAX_FRAMERATE', 226.0)),     ## sensor readout limit at full height (Hz)
+    'link_throughput': int(os.environ.get('FLIR_SIM_LINK_THROUGHPUT',                ## link capacity (bytes/sec)
+                                          125000000 if (os.environ.get('FLIR_SIM_INTERFACE') == 'GigEVision') else 380000000)),
+    'drop_rate': float(os.environ.get('FLIR_SIM_DROP_RATE', 0.0)),             ## fraction of frames lost in transfer
+    'incomplete_rate': float(os.environ.get('FLIR_SIM_INCOMPLETE_RATE', 0.0)), ## fraction of frames delivered incomplete
+    'interface': os.environ.get('FLIR_SIM_INTERFACE', 'U3V'),                   ## 'U3V' (USB3) or 'GigEVision'
+    'bus_capacity': int(os.environ.get('FLIR_SIM_BUS_CAPACITY', 0)),          ## capacity shared by all cameras (bytes/sec, 0 = unlimited)
+    'max_packet_size': int(os.environ.get('FLIR_SIM_MAX_PACKET_SIZE', 9000)), ## largest GigE packet the host accepts (bytes)
+    'read_noise': float(os.environ.get('FLIR_SIM_READ_NOISE', 6.0)),           ## read noise (12-bit counts, rms)
+    'seed': int(os.environ.get('FLIR_SIM_SEED', 0)),
+}
+
+## The PySpin version being emulated.
+SIMULATED_LIBRARY_VERSION = (2, 7, 0, 128)
+
+## Error codes, as in Spinnaker's spinError enumeration.
+SPINNAKER_ERR_SUCCESS = 0
+SPINNAKER_ERR_ERROR = -1001
+SPINNAKER_ERR_NOT_INITIALIZED = -1002
+SPINNAKER_ERR_NOT_IMPLEMENTED = -1003
+SPINNAKER_ERR_RESOURCE_IN_USE = -1004
+SPINNAKER_ERR_ACCESS_DENIED = -1005
+SPINNAKER_ERR_INVALID_PARAMETER = -1009
+SPINNAKER_ERR_IO = -1010
+SPINNAKER_ERR_TIMEOUT = -1011
+SPINNAKER_ERR_NOT_AVAILABLE = -1014
+SPINNAKER_ERR_INVALID_VALUE = -1019
+SPINNAKER_ERR_GENICAM_OUT_OF_RANGE = -2002
+SPINNAKER_ERR_GENICAM_ACCESS = -2006
+
+EVENT_TIMEOUT_INFINITE = 0xFFFFFFFFFFFFFFFF
+
+## Node interface types.
+intfIValue = 0
+intfIBase = 1
+intfIInteger = 2
+intfIBoolean = 3
+intfICommand = 4
+intfIFloat = 5
+intfIString = 6
+intfIRegister = 7
+intfICategory = 8
+intfIEnumeration = 9
+intfIEnumEntry = 10
+intfIPort = 11
+
+## Pixel formats and color processing algorithms (the latter are accepted but have no effect on mono images).
+PixelFormat_Mono8 = 0
+PixelFormat_Mono12p = 1
+PixelFormat_Mono16 = 2
+PIXEL_FORMAT_NAMES = {PixelFormat_Mono8:'Mono8', PixelFormat_Mono12p:'Mono12p', PixelFormat_Mono16:'Mono16'}
+PIXEL_FORMAT_BYTES = {'Mono8':1.0, 'Mono12p':1.5, 'Mono16':2.0}
+
+## The per-packet overhead (bytes) of the GigE Vision stream protocol and its IP/UDP headers.
+GVSP_PACKET_OVERHEAD = 36
+
+DEFAULT = 0
+NO_COLOR_PROCESSING = 1
+NEAREST_NEIGHBOR = 2
+EDGE_SENSING = 3
+HQ_LINEAR = 4
+RIGOROUS = 5
+IPP = 6
+DIRECTIONAL_FILTER = 7
+
+## Image status codes.
+IMAGE_NO_ERROR = 0
+IMAGE_CRC_CHECK_FAILED = 1
+IMAGE_DATA_OVERFLOW = 2
+IMAGE_MISSING_PACKETS = 3
+
+## ====================================================================================
+class SpinnakerException(Exception):
+    def __init__(self, message, errorcode=SPINNAKER_ERR_ERROR):
+        self.message = message
+        self.errorcode = errorcode
+        super().__init__(f'Spinnaker: {message} [{errorcode}]')
+
+## ====================================================================================
+## Node access checks and pointer "casts". A cast returns the node itself if it has the right interface type, and
+## None otherwise, so that IsAvailable() is False for a node of the wrong type, as with PySpin's smart pointers.
+def IsAvailable(node):
+    return((node is not None) and node.is_available())
+
+def IsReadable(node):
+    return((node is not None) and node.is_available() and node.is_readable())
+
+def IsWritable(node):
+    return((node is not None) and node.is_available() and node.is_writable())
+
+def _cast(node, interface_types):
+    if (node is None) or (node.GetPrincipalInterfaceType() not in interface_types):
+        return(None)
+    return(node)
+
+def CIntegerPtr(node):
+    return(_cast(node, (intfIInteger,)))
+
+def CFloatPtr(node):
+    return(_cast(node, (intfIFloat,)))
+
+def CBooleanPtr(node):
+    return(_cast(node, (intfIBoolean,)))
+
+def CCommandPtr(node):
+    return(_cast(node, (intfICommand,)))
+
+def CStringPtr(node):
+    return(_cast(node, (intfIString,)))
+
+def CEnumerationPtr(node):
+    return(_cast(node, (intfIEnumeration,)))
+
+def CEnumEntryPtr(node):
+    return(_cast(node, (intfIEnumEntry,)))
+
+def CCategoryPtr(node):
+    return(_cast(node, (intfICategory,)))
+
+def CValuePtr(node):
+    return(_cast(node, (intfIInteger, intfIFloat, intfIBoolean, intfICommand, intfIString, intfIEnumeration, intfIEnumEntry)))
+
+## ====================================================================================
+class Node:
+    """
+    The base of the simulated GenICam nodes. "writable" and "available" may be callables, so that a node can be
+    locked while the camera is streaming, or depend on another node's value, as on a real camera.
+    """
+
+    interface_type = intfIBase
+
+    def __init__(self, name, display_name=None, tooltip='', readable=True, writable=True, available=True):
+        self.name = name
+        self.display_name = display_name if (display_name is not None) else name
+        self.tooltip = tooltip
+        self._readable = readable
+        self._writable = writable
+        self._available = available
+
+    def is_available(self):
+        return(self._available() if callable(self._available) else self._available)
+
+    def is_readable(self):
+        return(self._readable() if callable(self._readable) else self._readable)
+
+    def is_writable(self):
+        return(self._writable() if callable(self._writable) else self._writable)
+
+    def _check_readable(self):
+        if not IsReadable(self):
+            raise SpinnakerException(f'Node {self.name} is not readable', SPINNAKER_ERR_GENICAM_ACCESS)
+
+    def _check_writable(self):
+        if not IsWritable(self):
+            raise SpinnakerException(f'Node {self.name} is not writable', SPINNAKER_ERR_GENICAM_ACCESS)
+
+    def GetName(self):
+        return(self.name)
+
+    def GetDisplayName(self):
+        return(self.display_name)
+
+    def GetToolTip(self):
+        return(self.tooltip)
+
+    def GetDescription(self):
+        return(self.tooltip)
+
+    def GetPrincipalInterfaceType(self):
+        return(self.interface_type)
+
+    def ToString(self):
+        return('')
+
+## ====================================================================================
+class ValueNode(Node):
+    """
+    A node holding a value. The value is kept in the node unless "getter" and "setter" functions are given (such as
+    for selector-indexed values), and "on_set" is called after each change.
+    """
+
+    def __init__(self, name, value=None, getter=None, setter=None, on_set=None, **kwargs):
+        super().__init__(name, **kwargs)
+        self._value = value
+        self._getter = getter
+        self._setter = setter
+        self._on_set = on_set
+
+    def GetValue(self, verify=False, ignore_cache=False):
+        self._check_readable()
+        return(self._getter() if (self._getter is not None) else self._value)
+
+    def _store(self, value):
+        if (self._setter is not None):
+            self._setter(value)
+        else:
+            self._value = value
+        if (self._on_set is not None):
+            self._on_set(value)
+
+    def ToString(self):
+        return(str(self.GetValue()))
+
+## ====================================================================================
+class IntegerNode(ValueNode):
+    interface_type = intfIInteger
+
+    def __init__(self, name, value=0, min=0, max=2**31-1, inc=1, **kwargs):
+        super().__init__(name, value, **kwargs)
+        self._min = min
+        self._max = max
+        self._inc = inc
+
+    def GetMin(self):
+        return(int(self._min() if callable(self._min) else self._min))
+
+    def GetMax(self):
+        return(int(self._max() if callable(self._max) else self._max))
+
+    def GetInc(self):
+        return(int(self._inc() if callable(self._inc) else self._inc))
+
+    def SetValue(self, value, verify=True):
+        self._check_writable()
+        value = int(value)
+        if (value < self.GetMin()) or (value > self.GetMax()):
+            raise SpinnakerException(f'Value {value} of node {self.name} is outside the range ({self.GetMin()},{self.GetMax()})',
+                                     SPINNAKER_ERR_GENICAM_OUT_OF_RANGE)
+        if ((value - self.GetMin()) % self.GetInc() != 0):
+            raise SpinnakerException(f'Value {value} of node {self.name} is not a multiple of the increment {self.GetInc()}',
+                                     SPINNAKER_ERR_GENICAM_OUT_OF_RANGE)
+        self._store(value)
+
+## ====================================================================================
+class FloatNode(ValueNode):
+    interface_type = intfIFloat
+
+    def __init__(self, name, value=0.0, min=0.0, max=1.0e308, unit='', **kwargs):
+        super().__init__(name, value, **kwargs)
+        self._min = min
+        self._max = max
+        self.unit = unit
+
+    def GetMin(self):
+        return(float(self._min() if callable(self._min) else self._min))
+
+    def GetMax(self):
+        return(float(self._max() if callable(self._max) else self._max))
+
+    def GetUnit(self):
+        return(self.unit)
+
+    def SetValue(self, value, verify=True):
+        self._check_writable()
+        value = float(value)
+        if (value < self.GetMin()) or (value > self.GetMax()):
+            raise SpinnakerException(f'Value {value} of node {self.name} is outside the range ({self.GetMin()},{self.GetMax()})',
+                                     SPINNAKER_ERR_GENICAM_OUT_OF_RANGE)
+        self._store(value)
+
+## ====================================================================================
+class BooleanNode(ValueNode):
+    interface_type = intfIBoolean
+
+    def SetValue(self, value, verify=True):
+        self._check_writable()
+        self._store(bool(value))
+
+## ====================================================================================
+class StringNode(ValueNode):
+    interface_type = intfIString
+
+    def SetValue(self, value, verify=True):
+        self._check_writable()
+        self._store(str(value))
+
+## ====================================================================================
+class CommandNode(Node):
+    interface_type = intfICommand
+
+    def __init__(self, name, command=None, **kwargs):
+        super().__init__(name, **kwargs)
+        self._command = command
+
+    def Execute(self, verify=True):
+        self._check_writable()
+        if (self._command is not None):
+            self._command()
+
+    def IsDone(self, verify=True):
+        return(True)
+
+## ====================================================================================
+class EnumEntryNode(Node):
+    interface_type = intfIEnumEntry
+
+    def __init__(self, enum_name, symbolic, value, **kwargs):
+        super().__init__(f'EnumEntry_{enum_name}_{symbolic}', display_name=symbolic, **kwargs)
+        self.symbolic = symbolic
+        self.value = value
+
+    def GetValue(self):
+        return(self.value)
+
+    def GetSymbolic(self):
+        return(self.symbolic)
+
+    def ToString(self):
+        return(self.symbolic)
+
+## ====================================================================================
+class EnumerationNode(ValueNode):
+    interface_type = intfIEnumeration
+
+    def __init__(self, name, symbolics, value=None, **kwargs):
+        super().__init__(name, symbolics[0] if (value is None) else value, **kwargs)
+        self.entries = [EnumEntryNode(name, symbolic, i) for (i,symbolic) in enumerate(symbolics)]
+
+    def GetEntries(self):
+        return(list(self.entries))
+
+    def GetEntryByName(self, symbolic):
+        for entry in self.entries:
+            if (entry.symbolic == symbolic):
+                return(entry)
+        return(None)
+
+    def GetCurrentEntry(self):
+        return(self.GetEntryByName(self.GetValue()))
+
+    def GetIntValue(self):
+        return(self.GetCurrentEntry().value)
+
+    def SetIntValue(self, value, verify=True):
+        self._check_writable()
+        for entry in self.entries:
+            if (entry.value == value):
+                self._store(entry.symbolic)
+                return
+        raise SpinnakerException(f'Value {value} is not an entry of node {self.name}', SPINNAKER_ERR_INVALID_VALUE)
+
+    def ToString(self):
+        return(self.GetValue())
+
+## ====================================================================================
+class CategoryNode(Node):
+    interface_type = intfICategory
+
+    def __init__(self, name, features=None, **kwargs):
+        super().__init__(name, **kwargs)
+        self.features = [] if (features is None) else features
+
+    def GetFeatures(self):
+        return(list(self.features))
+
+## ====================================================================================
+class NodeMap:
+    def __init__(self):
+        self.nodes = {}
+        self.nodes['Root'] = CategoryNode('Root')
+
+    def add(self, node):
+        self.nodes[node.name] = node
+        self.nodes['Root'].features.append(node)
+        return(node)
+
+    def GetNode(self, name):
+        return(self.nodes.get(name))
+
+    def GetNodes(self):
+        return(list(self.nodes.values()))
+
+## ====================================================================================
+class ChunkData:
+    def __init__(self, exposure_time=0.0, gain=0.0, frame_id=0, timestamp=0):
+        self.exposure_time = exposure_time
+        self.gain = gain
+        self.frame_id = frame_id
+        self.timestamp = timestamp
+
+    def GetExposureTime(self):
+        return(self.exposure_time)
+
+    def GetGain(self):
+        return(self.gain)
+
+    def GetFrameID(self):
+        return(self.frame_id)
+
+    def GetTimestamp(self):
+        return(self.timestamp)
+
+## ====================================================================================
+class SimulatedImage:
+    """
+    A frame delivered by a simulated camera (the equivalent of an ImagePtr). The pixel data is held as a 2D array for
+    Mono8 and Mono16, and as the packed bytes for Mono12p.
+    """
+
+    def __init__(self, data, width, height, pixel_format, frame_id=0, timestamp=0, status=IMAGE_NO_ERROR,
+                 chunk_data=None, camera=None):
+        self.data = data
+        self.width = width
+        self.height = height
+        self.pixel_format = pixel_format
+        self.frame_id = frame_id
+        self.timestamp = timestamp
+        self.status = status
+        self.chunk_data = chunk_data if (chunk_data is not None) else ChunkData()
+        self.camera = camera            ## the camera whose stream buffer this is, or None if not a stream buffer
+
+    def GetNDArray(self):
+        if (self.pixel_format == 'Mono12p'):
+            return(self.data.reshape(self.height, (self.width * 3) // 2))
+        return(self.data)
+
+    def GetData(self):
+        return(self.data.reshape(-1).view(uint8))
+
+    def GetBufferSize(self):
+        return(self.data.nbytes)
+
+    def GetWidth(self):
+        return(self.width)
+
+    def GetHeight(self):
+        return(self.height)
+
+    def GetPixelFormatName(self):
+        return(self.pixel_format)
+
+    def GetPixelFormat(self):
+        for (key,value) in PIXEL_FORMAT_NAMES.items():
+            if (value == self.pixel_format):
+                return(key)
+        return(-1)
+
+    def GetFrameID(self):
+        return(self.frame_id)
+
+    def GetTimeStamp(self):
+        return(self.timestamp)
+
+    def IsIncomplete(self):
+        return(self.status != IMAGE_NO_ERROR)
+
+    def GetImageStatus(self):
+        return(self.status)
+
+    def GetChunkData(self):
+        return(self.chunk_data)
+
+    def Release(self):
+        if (self.camera is not None):
+            self.camera._release_buffer()
+            self.camera = None
+        return
+
+    ## ===================================
+    def _as_counts16(self):
+        ## Return the pixels on the Mono16 scale.
+        if (self.pixel_format == 'Mono16'):
+            return(self.data)
+        elif (self.pixel_format == 'Mono8'):
+            return(uint16(self.data) << 8)
+
+        packed = self.GetData().reshape(-1, 3).astype(uint16)
+        out = empty((packed.shape[0], 2), uint16)
+        out[:,0] = packed[:,0] | ((packed[:,1] & 0x0F) << 8)
+        out[:,1] = (packed[:,1] >> 4) | (packed[:,2] << 4)
+        return(out.reshape(self.height, self.width) << 4)
+
+    ## ===================================
+    def Convert(self, pixel_format, algorithm=DEFAULT):
+        if (pixel_format not in PIXEL_FORMAT_NAMES) or (pixel_format == PixelFormat_Mono12p):
+            raise SpinnakerException(f'Conversion to pixel format {pixel_format} is not simulated', SPINNAKER_ERR_NOT_IMPLEMENTED)
+
+        counts16 = self._as_counts16()
+        if (pixel_format == PixelFormat_Mono16):
+            data = counts16.copy()
+        else:
+            data = uint8(counts16 >> 8)
+
+        return(SimulatedImage(data, self.width, self.height, PIXEL_FORMAT_NAMES[pixel_format], self.frame_id,
+                              self.timestamp, self.status, self.chunk_data))
+
+    ## ===================================
+    def Save(self, filename, *args):
+        ## Raw files hold the pixel data as is; PGM files are written directly; other formats go through imageio.
+        ext = os.path.splitext(filename)[1].lower()
+        if (ext == '.raw'):
+            self.data.tofile(filename)
+        elif (ext == '.pgm'):
+            counts16 = self._as_counts16() if (self.pixel_format != 'Mono8') else self.data
+            maxval = 255 if (self.pixel_format == 'Mono8') else 65535
+            with open(filename, 'wb') as f:
+                f.write(f'P5\n{self.width} {self.height}\n{maxval}\n'.encode('ascii'))
+                f.write(counts16.astype('>u2' if (maxval > 255) else uint8).tobytes())
+        else:
+            try:
+                from imageio import imwrite
+            except ImportError:
+                raise SpinnakerException(f'Saving "{ext}" files needs the imageio package', SPINNAKER_ERR_NOT_IMPLEMENTED)
+            imwrite(filename, self.data if (self.pixel_format != 'Mono12p') else self._as_counts16())
+        return
+
+## ====================================================================================
+class ImageEventHandler:
+    """
+    Base class for image event handlers. Subclasses override OnImageEvent(), which is called on the camera's
+    acquisition thread with each new frame. The frame is released when OnImageEvent() returns.
+    """
+
+    def __init__(self):
+        pass
+
+    def OnImageEvent(self, image):
+        pass
+
+## ====================================================================================
+class DeviceEventHandler:
+    """
+    Base class for device event handlers. Subclasses override OnDeviceEvent(), which is called with the event name
+    (such as 'EventExposureEnd'), and can call GetDeviceEventId() and GetDeviceEventName() from within it.
+    """
+
+    def __init__(self):
+        self._event_id = 0
+        self._event_name = ''
+
+    def GetDeviceEventId(self):
+        return(self._event_id)
+
+    def GetDeviceEventName(self):
+        return(self._event_name)
+
+    def OnDeviceEvent(self, event_name):
+        pass
+
+## ====================================================================================
+class AVIOption:
+    def __init__(self):
+        self.frameRate = 15.0
+
+class MJPGOption(AVIOption):
+    def __init__(self):
+        super().__init__()
+        self.quality = 75
+
+class H264Option(AVIOption):
+    def __init__(self):
+        super().__init__()
+        self.bitrate = 1000000
+        self.height = 0
+        self.width = 0
+
+class SpinVideo:
+    def Open(self, filename, option):
+        raise SpinnakerException('Video recording is not simulated', SPINNAKER_ERR_NOT_IMPLEMENTED)
+
+    def Append(self, image):
+        raise SpinnakerException('Video recording is not simulated', SPINNAKER_ERR_NOT_IMPLEMENTED)
+
+    def Close(self):
+        pass
+
+## ====================================================================================
+class SimulatedCamera:
+    """
+    A simulated camera (the equivalent of a CameraPtr). While acquiring, a producer thread exposes frames on the
+    schedule given by the frame rate (or by triggers), fires device events, and delivers the frames either to the
+    registered image event handlers or into the stream buffers read by GetNextImage().
+    """
+
+    ## Device event IDs, as reported by GetDeviceEventId().
+    EVENT_IDS = {'ExposureEnd':40003, 'ExposureStart':40004, 'Error':40005}
+
+    ## The cameras currently acquiring, which share the bus capacity.
+    streaming_cameras = set()
+
+    def __init__(self, index, serial_number, rng):
+        self.index = index
+        self.serial_number = serial_number
+        self.rng = rng
+        self.sensor_width = SIMULATION['sensor_width']
+        self.sensor_height = SIMULATION['sensor_height']
+
+        self.initialized = False
+        self.streaming = False
+        self.clock_origin = time.perf_counter_ns() - int(rng.integers(1, 10**12))     ## the camera powered up a while ago
+
+        self.lock = threading.Condition()
+        self.buffers = deque()              ## frames waiting to be retrieved with GetNextImage()
+        self.num_outstanding = 0            ## frames retrieved but not yet released
+        self.pending_triggers = 0
+        self.stop_event = threading.Event()
+        self.producer = None
+        self.frame_id = 0
+        self.image_handlers = []
+        self.device_handlers = []           ## list of (handler, event_name or None)
+
+        self.sequencer_sets = {}            ## set index -> (exposure, gain, next set)
+        self.chunk_enable = {}              ## chunk name -> bool
+        self.event_notification = {}        ## event name -> 'On' or 'Off'
+        self.render_cache = {}
+        self.scene = None
+        self.noise = None
+
+        self.nodemap_tldevice = self._build_tldevice_nodemap()
+        self.nodemap_tlstream = self._build_tlstream_nodemap()
+        self.nodemap = self._build_device_nodemap()
+
+    ## ===================================
+    def clock(self):
+        return(time.perf_counter_ns() - self.clock_origin)
+
+    def _not_streaming(self):
+        return(not self.streaming)
+
+    ## ===================================
+    def _build_tldevice_nodemap(self):
+        nodemap = NodeMap()
+        nodemap.add(StringNode('DeviceSerialNumber', self.serial_number, display_name='Device Serial Number', writable=False))
+        nodemap.add(StringNode('DeviceVendorName', 'FLIR (simulated)', display_name='Device Vendor Name', writable=False))
+        nodemap.add(StringNode('DeviceModelName', 'Simulated Blackfly S', display_name='Device Model Name', writable=False))
+        nodemap.add(EnumerationNode('DeviceType', ['U3V','GigEVision'], value=SIMULATION['interface'],
+                                    display_name='Device Type', writable=False))
+        return(nodemap)
+
+    ## ===================================
+    def _build_tlstream_nodemap(self):
+        nodemap = NodeMap()
+        nodemap.add(EnumerationNode('StreamBufferCountMode', ['Auto','Manual'], display_name='Buffer Count Mode',
+                                    writable=self._not_streaming))
+        nodemap.add(IntegerNode('StreamDefaultBufferCount', 10, min=1, max=10000, writable=False))
+        nodemap.add(IntegerNode('StreamBufferCountManual', 10, min=1, max=10000, display_name='Manual Buffer Count',
+                                writable=self._not_streaming))
+        nodemap.add(IntegerNode('StreamBufferCountResult', getter=self._buffer_count, min=1, max=10000, writable=False))
+        nodemap.add(EnumerationNode('StreamBufferHandlingMode', ['OldestFirst','OldestFirstOverwrite','NewestOnly','NewestFirst'],
+                                    display_name='Buffer Handling Mode'))
+        return(nodemap)
+
+    def _buffer_count(self):
+        if (self.nodemap_tlstream.GetNode('StreamBufferCountMode').GetValue() == 'Manual'):
+            return(self.nodemap_tlstream.GetNode('StreamBufferCountManual').GetValue())
+        return(self.nodemap_tlstream.GetNode('StreamDefaultBufferCount').GetValue())
+
+    ## ===================================
+    def _build_device_nodemap(self):
+        nodemap = NodeMap()
+        add = nodemap.add
+        not_streaming = self._not_streaming
+        get = lambda name: nodemap.GetNode(name).GetValue()
+        trigger_off = lambda: (get('TriggerMode') == 'Off')
+        config_on = lambda: (get('SequencerConfigurationMode') == 'On')
+
+        add(StringNode('DeviceSerialNumber', self.serial_number, writable=False))
+        add(StringNode('DeviceModelName', 'Simulated Blackfly S', writable=False))
+        add(IntegerNode('SensorWidth', self.sensor_width, writable=False))
+        add(IntegerNode('SensorHeight', self.sensor_height, writable=False))
+
+        ## Image format
+        add(EnumerationNode('PixelFormat', ['Mono8','Mono12p','Mono16'], value='Mono8', writable=not_streaming))
+        add(IntegerNode('BinningHorizontal', 1, min=1, max=4, writable=not_streaming,
+                        on_set=lambda value: self._rescale_roi()))
+        add(IntegerNode('BinningVertical', 1, min=1, max=4, writable=not_streaming,
+                        on_set=lambda value: self._rescale_roi()))
+        add(IntegerNode('WidthMax', getter=lambda: self.sensor_width // get('BinningHorizontal'), writable=False))
+        add(IntegerNode('HeightMax', getter=lambda: self.sensor_height // get('BinningVertical'), writable=False))
+        add(IntegerNode('Width', self.sensor_width, min=16, max=lambda: get('WidthMax') - get('OffsetX'), inc=4,
+                        writable=not_streaming))
+        add(IntegerNode('Height', self.sensor_height, min=8, max=lambda: get('HeightMax') - get('OffsetY'), inc=2,
+                        writable=not_streaming))
+        add(IntegerNode('OffsetX', 0, min=0, max=lambda: get('WidthMax') - get('Width'), inc=4))
+        add(IntegerNode('OffsetY', 0, min=0, max=lambda: get('HeightMax') - get('Height'), inc=2))
+        self._binning = (1, 1)
+
+        ## Exposure, gain and gamma
+        add(EnumerationNode('ExposureAuto', ['Off','Once','Continuous'], value='Continuous'))
+        add(EnumerationNode('ExposureMode', ['Timed','TriggerWidth'], value='Timed'))
+        add(FloatNode('ExposureTime', 10000.0, min=13.0, max=30000000.0, unit='us',
+                      writable=lambda: (get('ExposureAuto') == 'Off')))
+        add(EnumerationNode('ExposureCompensationAuto', ['Off','Once','Continuous'], value='Continuous'))
+        add(FloatNode('ExposureCompensation', 0.0, min=-3.0, max=3.0,
+                      writable=lambda: (get('ExposureCompensationAuto') == 'Off')))
+        add(EnumerationNode('GainAuto', ['Off','Once','Continuous'], value='Continuous'))
+        add(FloatNode('Gain', 0.0, min=0.0, max=47.99, unit='dB', writable=lambda: (get('GainAuto') == 'Off')))
+        add(BooleanNode('GammaEnable', True))
+        add(FloatNode('Gamma', 0.8, min=0.25, max=4.0, writable=lambda: get('GammaEnable')))
+
+        ## Acquisition control
+        add(EnumerationNode('AcquisitionMode', ['Continuous','SingleFrame','MultiFrame'], writable=not_streaming))
+        add(IntegerNode('AcquisitionFrameCount', 2, min=1, max=65535,
+                        writable=lambda: not_streaming() and (get('AcquisitionMode') == 'MultiFrame')))
+        add(BooleanNode('AcquisitionFrameRateEnable', False))
+        add(FloatNode('AcquisitionFrameRate', 30.0, min=1.0, max=self._max_framerate, unit='Hz',
+                      getter=lambda: min(nodemap.GetNode('AcquisitionFrameRate')._value, self._max_framerate()),
+                      writable=lambda: get('AcquisitionFrameRateEnable')))
+        add(FloatNode('AcquisitionResultingFrameRate', getter=self._resulting_framerate, unit='Hz', writable=False))
+        add(IntegerNode('DeviceLinkThroughputLimit', SIMULATION['link_throughput'], min=10000000,
+                        max=SIMULATION['link_throughput'], inc=16000))
+        add(FloatNode('DeviceLinkCurrentThroughput', getter=self._current_throughput, writable=False))
+        if (SIMULATION['interface'] == 'GigEVision'):
+            add(IntegerNode('GevSCPSPacketSize', 1400, min=576, max=9000, inc=4, writable=not_streaming))
+            add(IntegerNode('GevSCPD', 0, min=0, max=10000000))
+            add(IntegerNode('GevTimestampTickFrequency', 1000000000, writable=False))
+
+        ## Triggers
+        add(EnumerationNode('TriggerMode', ['Off','On'], writable=not_streaming))
+        add(EnumerationNode('TriggerSelector', ['FrameStart','AcquisitionStart'], writable=trigger_off))
+        add(EnumerationNode('TriggerSource', ['Software','Line0','Line1','Line2','Line3'], writable=trigger_off))
+        add(EnumerationNode('TriggerActivation', ['RisingEdge','FallingEdge','AnyEdge','LevelHigh','LevelLow']))
+        add(FloatNode('TriggerDelay', 9.0, min=9.0, max=65520.0, unit='us'))
+        add(CommandNode('TriggerSoftware', command=self._software_trigger))
+
+        ## Chunk data
+        chunk_names = ['Image','CRC','FrameID','OffsetX','OffsetY','Width','Height','ExposureTime','Gain','BlackLevel',
+                       'PixelFormat','SequencerSetActive','Timestamp']
+        self.chunk_enable = {name:(name == 'Image') for name in chunk_names}
+        add(BooleanNode('ChunkModeActive', False))
+        add(EnumerationNode('ChunkSelector', chunk_names))
+        add(BooleanNode('ChunkEnable', getter=lambda: self.chunk_enable[get('ChunkSelector')],
+                        setter=lambda value: self.chunk_enable.__setitem__(get('ChunkSelector'), value)))
+
+        ## Sequencer
+        add(EnumerationNode('SequencerMode', ['Off','On']))
+        add(EnumerationNode('SequencerConfigurationMode', ['Off','On'], writable=lambda: (get('SequencerMode') == 'Off')))
+        add(EnumerationNode('SequencerConfigurationValid', ['No','Yes'], getter=self._sequencer_valid, writable=False))
+        add(IntegerNode('SequencerSetSelector', 0, min=0, max=7, writable=config_on))
+        add(IntegerNode('SequencerSetNext', 0, min=0, max=7, writable=config_on))
+        add(IntegerNode('SequencerSetStart', 0, min=0, max=7, writable=config_on))
+        add(IntegerNode('SequencerSetActive', 0, min=0, max=7, writable=False))
+        add(EnumerationNode('SequencerTriggerSource', ['Off','FrameStart'], writable=config_on))
+        add(CommandNode('SequencerSetSave', command=self._save_sequencer_set, writable=config_on))
+
+        ## Device events
+        event_names = list(self.EVENT_IDS.keys())
+        self.event_notification = {name:'Off' for name in event_names}
+        add(EnumerationNode('EventSelector', event_names))
+        add(EnumerationNode('EventNotification', ['Off','On'], getter=lambda: self.event_notification[get('EventSelector')],
+                            setter=lambda value: self.event_notification.__setitem__(get('EventSelector'), value)))
+
+        ## Timestamps
+        add(CommandNode('TimestampLatch', command=lambda: nodemap.GetNode('TimestampLatchValue')._store(self.clock())))
+        add(IntegerNode('TimestampLatchValue', 0, min=0, max=2**63-1, writable=False))
+        add(CommandNode('TimestampReset', command=lambda: setattr(self, 'clock_origin', time.perf_counter_ns())))
+
+        return(nodemap)
+
+    ## ===================================
+    def _value(self, name):
+        return(self.nodemap.GetNode(name).GetValue())
+
+    ## ===================================
+    def _rescale_roi(self):
+        ## As on a real camera, changing the binning scales the image region to cover the same part of the sensor.
+        (old_h, old_v) = self._binning
+        new_h = self._value('BinningHorizontal')
+        new_v = self._value('BinningVertical')
+        self._binning = (new_h, new_v)
+
+        for (name, offset_name, inc, old, new) in (('Width','OffsetX',4,old_h,new_h), ('Height','OffsetY',2,old_v,new_v)):
+            node = self.nodemap.GetNode(name)
+            node_offset = self.nodemap.GetNode(offset_name)
+            size_max = self._value(name + 'Max')
+            node._value = max(min((node._value * old // new) // inc * inc, size_max), node.GetMin())
+            node_offset._value = min((node_offset._value * old // new) // inc * inc, size_max - node._value)
+
+        return
+
+    ## ===================================
+    def _bytes_per_frame(self):
+        return(self._value('Width') * self._value('Height') * PIXEL_FORMAT_BYTES[self._value('PixelFormat')])
+
+    def _max_framerate(self, exposure=None):
+        ## The frame rate is limited by the sensor readout (which scales with the number of sensor rows read), by the
+        ## link throughput, and by the exposure time.
+        rows = self._value('Height') * self._value('BinningVertical')
+        sensor_fps = SIMULATION['max_framerate'] * self.sensor_height / rows
+        link_fps = self._link_rate() / self._bytes_per_frame()
+        exposure_fps = 1.0e6 / (self._value('ExposureTime') if (exposure is None) else exposure)
+        return(min(sensor_fps, link_fps, exposure_fps))
+
+    def _resulting_framerate(self, exposure=None):
+        max_fps = self._max_framerate(exposure)
+        if self._value('AcquisitionFrameRateEnable'):
+            return(min(self.nodemap.GetNode('AcquisitionFrameRate')._value, max_fps))
+        return(max_fps)
+
+    def _readout_time(self):
+        ## The time (in sec) to read out and transfer one frame.
+        rows = self._value('Height') * self._value('BinningVertical')
+        sensor_fps = SIMULATION['max_framerate'] * self.sensor_height / rows
+        link_fps = self._link_rate() / self._bytes_per_frame()
+        return(1.0 / min(sensor_fps, link_fps))
+
+    def _link_rate(self):
+        ## The rate (in bytes/sec) at which image data crosses the link. For GigE cameras, each packet also carries the
+        ## protocol headers, and is followed by the inter-packet delay (in ns ticks).
+        limit = self._value('DeviceLinkThroughputLimit')
+        if (SIMULATION['interface'] != 'GigEVision'):
+            return(limit)
+        packet_size = self._value('GevSCPSPacketSize')
+        packet_time = packet_size / limit + self._value('GevSCPD') / 1.0e9
+        return((packet_size - GVSP_PACKET_OVERHEAD) / packet_time)
+
+    def _current_throughput(self):
+        return(self._bytes_per_frame() * self._resulting_framerate() if self.streaming else 0.0)
+
+    def _incomplete_probability(self):
+        ## Oversized GigE packets never reach the host. Otherwise, when the streaming cameras together try to send
+        ## more than the bus can carry, the excess shows up as incomplete frames.
+        if (SIMULATION['interface'] == 'GigEVision') and (self._value('GevSCPSPacketSize') > SIMULATION['max_packet_size']):
+            return(1.0)
+        p = SIMULATION['incomplete_rate']
+        if (SIMULATION['bus_capacity'] > 0):
+            total = sum(cam._current_throughput() for cam in list(SimulatedCamera.streaming_cameras))
+            if (total > SIMULATION['bus_capacity']):
+                p += 1.0 - SIMULATION['bus_capacity'] / total
+        return(min(p, 1.0))
+
+    ## ===================================
+    def _save_sequencer_set(self):
+        index = self._value('SequencerSetSelector')
+        self.sequencer_sets[index] = (self._value('ExposureTime'), self._value('Gain'), self._value('SequencerSetNext'))
+        return
+
+    def _sequencer_valid(self):
+        ## Valid if every set reachable from the start set has been saved.
+        index = self.nodemap.GetNode('SequencerSetStart')._value
+        visited = set()
+        while index not in visited:
+            if index not in self.sequencer_sets:
+                return('No')
+            visited.add(index)
+            index = self.sequencer_sets[index][2]
+        return('Yes')
+
+    ## ===================================
+    def _software_trigger(self):
+        with self.lock:
+            if self.streaming and (self._value('TriggerMode') == 'On') and (self._value('TriggerSource') == 'Software'):
+                self.pending_triggers += 1
+                self.lock.notify_all()
+        return
+
+    ## ===================================
+    def Init(self):
+        self.initialized = True
+        return
+
+    def DeInit(self):
+        if self.streaming:
+            self.EndAcquisition()
+        self.initialized = False
+        return
+
+    def IsInitialized(self):
+        return(self.initialized)
+
+    def IsStreaming(self):
+        return(self.streaming)
+
+    def IsValid(self):
+        return(True)
+
+    def GetUniqueID(self):
+        return(self.serial_number)
+
+    def GetNodeMap(self):
+        if not self.initialized:
+            raise SpinnakerException('Camera is not initialized', SPINNAKER_ERR_NOT_INITIALIZED)
+        return(self.nodemap)
+
+    def GetTLDeviceNodeMap(self):
+        return(self.nodemap_tldevice)
+
+    def GetTLStreamNodeMap(self):
+        return(self.nodemap_tlstream)
+
+    ## ===================================
+    def RegisterEventHandler(self, handler, event_name=None):
+        if isinstance(handler, ImageEventHandler):
+            self.image_handlers.append(handler)
+        elif isinstance(handler, DeviceEventHandler):
+            self.device_handlers.append((handler, event_name))
+        else:
+            raise SpinnakerException('Unknown event handler type', SPINNAKER_ERR_INVALID_PARAMETER)
+        return
+
+    def UnregisterEventHandler(self, handler):
+        if handler in self.image_handlers:
+            self.image_handlers.remove(handler)
+            return
+        for entry in self.device_handlers:
+            if (entry[0] is handler):
+                self.device_handlers.remove(entry)
+                return
+        raise SpinnakerException('Event handler is not registered', SPINNAKER_ERR_INVALID_PARAMETER)
+
+    ## ===================================
+    def BeginAcquisition(self):
+        if not self.initialized:
+            raise SpinnakerException('Camera is not initialized', SPINNAKER_ERR_NOT_INITIALIZED)
+        if self.streaming:
+            raise SpinnakerException('Camera is already streaming', SPINNAKER_ERR_RESOURCE_IN_USE)
+
+        ## Render the frames for the current settings (and for each sequencer set) up front, as the camera's own
+        ## frame timing does not include any host-side rendering time.
+        self._render_frames(self._value('ExposureTime'), self._value('Gain'))
+        if (self._value('SequencerMode') == 'On'):
+            for (exposure, gain, next_index) in self.sequencer_sets.values():
+                self._render_frames(exposure, gain)
+
+        with self.lock:
+            self.buffers.clear()
+            self.num_outstanding = 0
+            self.pending_triggers = 0
+            self.streaming = True
+        SimulatedCamera.streaming_cameras.add(self)
+
+        self.stop_event.clear()
+        self.producer = threading.Thread(target=self._produce, daemon=True)
+        self.producer.start()
+        return
+
+    def EndAcquisition(self):
+        if not self.streaming:
+            raise SpinnakerException('Camera is not started', SPINNAKER_ERR_ERROR)
+
+        self.stop_event.set()
+        with self.lock:
+            self.lock.notify_all()
+        if (self.producer is not None) and (self.producer is not threading.current_thread()):
+            self.producer.join()
+        self.producer = None
+
+        with self.lock:
+            self.streaming = False
+            self.buffers.clear()
+            self.lock.notify_all()
+        SimulatedCamera.streaming_cameras.discard(self)
+        return
+
+    ## ===================================
+    def GetNextImage(self, timeout=EVENT_TIMEOUT_INFINITE, stream_index=0):
+        if not self.streaming:
+            raise SpinnakerException('Camera is not started', SPINNAKER_ERR_ERROR)
+
+        wait = None if (timeout == EVENT_TIMEOUT_INFINITE) else timeout / 1000.0
+        with self.lock:
+            if not self.lock.wait_for(lambda: self.buffers or not self.streaming, wait):
+                raise SpinnakerException('Failed waiting for EventData on NEW_BUFFER_DATA event', SPINNAKER_ERR_TIMEOUT)
+            if not self.buffers:
+                raise SpinnakerException('Camera is not started', SPINNAKER_ERR_ERROR)
+
+            if (self.nodemap_tlstream.GetNode('StreamBufferHandlingMode').GetValue() == 'NewestFirst'):
+                image = self.buffers.pop()
+            else:
+                image = self.buffers.popleft()
+            self.num_outstanding += 1
+
+        return(image)
+
+    def _release_buffer(self):
+        with self.lock:
+            self.num_outstanding = max(self.num_outstanding - 1, 0)
+        return
+
+    ## ===================================
+    def _sleep_until(self, t):
+        dt = t - time.perf_counter()
+        if (dt > 0):
+            self.stop_event.wait(dt)
+        return(not self.stop_event.is_set())
+
+    ## ===================================
+    def _produce(self):
+        mode = self._value('AcquisitionMode')
+        num_frames = {'Continuous':None, 'SingleFrame':1, 'MultiFrame':self._value('AcquisitionFrameCount')}[mode]
+        sequencer_on = (self._value('SequencerMode') == 'On')
+        sequencer_index = self.nodemap.GetNode('SequencerSetStart')._value
+        num_delivered = 0
+        next_start = time.perf_counter()
+
+        while not self.stop_event.is_set():
+            if (num_frames is not None) and (num_delivered >= num_frames):
+                break
+
+            ## Wait for the start of the next exposure.
+            if (self._value('TriggerMode') == 'On'):
+                with self.lock:
+                    self.lock.wait_for(lambda: (self.pending_triggers > 0) or self.stop_event.is_set())
+                    if self.stop_event.is_set():
+                        break
+                    self.pending_triggers -= 1
+                start = time.perf_counter() + self._value('TriggerDelay') / 1.0e6
+            else:
+                start = max(next_start, time.perf_counter() - 1.0)      ## don't try to catch up after a long stall
+            if not self._sleep_until(start):
+                break
+            start_clock = self.clock()
+
+            if sequencer_on and (sequencer_index in self.sequencer_sets):
+                (exposure, gain, next_index) = self.sequencer_sets[sequencer_index]
+                active_set = sequencer_index
+                sequencer_index = next_index
+            else:
+                (exposure, gain, active_set) = (self._value('ExposureTime'), self._value('Gain'), 0)
+
+            next_start = start + 1.0 / self._resulting_framerate(exposure)
+
+            if not self._sleep_until(start + exposure / 1.0e6):
+                break
+            self.frame_id += 1
+            self._fire_device_event('ExposureEnd')
+
+            if not self._sleep_until(start + exposure / 1.0e6 + self._readout_time()):
+                break
+            num_delivered += 1
+
+            if (self.rng.random() < SIMULATION['drop_rate']):
+                continue
+            incomplete = (self.rng.random() < self._incomplete_probability())
+            self._deliver(self._render(exposure, gain, self.frame_id, start_clock, active_set, incomplete))
+
+        return
+
+    ## ===================================
+    def _fire_device_event(self, event_name):
+        if (self.event_notification.get(event_name) != 'On'):
+            return
+
+        full_name = 'Event' + event_name
+        for (handler, name_filter) in list(self.device_handlers):
+            if (name_filter is not None) and (name_filter != full_name):
+                continue
+            handler._event_id = self.EVENT_IDS[event_name]
+            handler._event_name = full_name
+            handler.OnDeviceEvent(full_name)
+
+        return
+
+    ## ===================================
+    def _deliver(self, image):
+        if self.image_handlers:
+            for handler in list(self.image_handlers):
+                handler.OnImageEvent(image)
+            return
+
+        mode = self.nodemap_tlstream.GetNode('StreamBufferHandlingMode').GetValue()
+        with self.lock:
+            ## Buffers held by the user (retrieved but not released) are not available to the stream.
+            num_free = self._buffer_count() - self.num_outstanding - len(self.buffers)
+            if (mode == 'NewestOnly'):
+                self.buffers.clear()
+            elif (num_free <= 0):
+                if (mode == 'OldestFirst') or not self.buffers:
+                    return                      ## no free buffer, so the new frame is lost
+                self.buffers.popleft()          ## overwrite the oldest frame
+            image.camera = self
+            self.buffers.append(image)
+            self.lock.notify_all()
+
+        return
+
+    ## ===================================
+    def _make_scene(self):
+        ## A fixed test scene on the full sensor, from 0 to 1: a smooth vignetted gradient with a grid of bright spots.
+        (y, x) = indices((self.sensor_height, self.sensor_width), dtype=float32)
+        (cy, cx) = (self.sensor_height / 2.0, self.sensor_width / 2.0)
+        r2 = ((x - cx)**2 + (y - cy)**2) / (cx**2 + cy**2)
+        scene = 0.5 * (1.0 - 0.6 * r2) * (0.6 + 0.4 * x / self.sensor_width)
+        spacing = 120
+        d2 = ((x % spacing) - spacing / 2.0)**2 + ((y % spacing) - spacing / 2.0)**2
+        scene += 0.45 * exp(-d2 / 50.0)
+        return(float32(scene))
+
+    ## ===================================
+    def _render_frames(self, exposure, gain):
+        ## Rendering is cached for each setting, with a few noise realizations that are cycled through. The noise is
+        ## drawn once for each image geometry, since drawing it is much slower than scaling the scene.
+        width = self._value('Width')
+        height = self._value('Height')
+        offset_x = self._value('OffsetX')
+        offset_y = self._value('OffsetY')
+        bin_h = self._value('BinningHorizontal')
+        bin_v = self._value('BinningVertical')
+        pixel_format = self._value('PixelFormat')
+
+        key = (width, height, offset_x, offset_y, bin_h, bin_v, pixel_format, exposure, gain)
+        if key in self.render_cache:
+            return(self.render_cache[key])
+
+        if (len(self.render_cache) >= 16):
+            self.render_cache.clear()
+        if (self.scene is None):
+            self.scene = self._make_scene()
+        if (self.noise is None) or (self.noise.shape[1:] != (height, width)):
+            self.noise = float32(self.rng.normal(0.0, SIMULATION['read_noise'], (4, height, width)))
+
+        x0 = offset_x * bin_h
+        y0 = offset_y * bin_v
+        region = self.scene[y0:y0+height*bin_v, x0:x0+width*bin_h]
+        region = region.reshape(height, bin_v, width, bin_h).sum(axis=(1,3))     ## binning sums the pixels
+
+        ## About 3000 counts (12-bit) at 10 ms exposure and 0 dB gain for a scene value of 1, plus a dark offset.
+        counts = region * float32(0.3 * exposure * 10.0**(gain / 20.0)) + float32(40.0)
+        max_counts = 4095 * bin_h * bin_v
+        frames = []
+        for k in range(4):
+            noisy = clip(counts + self.noise[k] * float32(sqrt(bin_h * bin_v)), 0, max_counts)
+            if (pixel_format == 'Mono16'):
+                frames.append(uint16(minimum(noisy * 16.0, 65535)))
+            elif (pixel_format == 'Mono8'):
+                frames.append(uint8(minimum(noisy / 16.0, 255)))
+            else:
+                frames.append(pack_mono12p(uint16(minimum(noisy, 4095))))
+
+        self.render_cache[key] = frames
+        return(frames)
+
+    ## ===================================
+    def _render(self, exposure, gain, frame_id, timestamp, active_set, incomplete):
+        data = self._render_frames(exposure, gain)[frame_id % 4].copy()
+        if incomplete:
+            ## Missing packets: the tail of the frame never arrived.
+            data.reshape(-1)[data.size // 2:] = 0
+
+        chunk_data = None
+        if self._value('ChunkModeActive'):
+            chunk_data = ChunkData(exposure_time=exposure if self.chunk_enable['ExposureTime'] else 0.0,
+                                   gain=gain if self.chunk_enable['Gain'] else 0.0,
+                                   frame_id=frame_id if self.chunk_enable['FrameID'] else 0,
+                                   timestamp=timestamp if self.chunk_enable['Timestamp'] else 0)
+
+        status = IMAGE_MISSING_PACKETS if incomplete else IMAGE_NO_ERROR
+        return(SimulatedImage(data, self._value('Width'), self._value('Height'), self._value('PixelFormat'), frame_id,
+                              timestamp, status, chunk_data))
+
+## ====================================================================================
+def pack_mono12p(counts):
+    """
+    Pack 12-bit values (a uint16 array with an even number of pixels) into Mono12p bytes: two pixels in three bytes,
+    least significant bits first.
+    """
+
+    pairs = counts.reshape(-1, 2)
+    packed = empty((pairs.shape[0], 3), uint8)
+    packed[:,0] = pairs[:,0] & 0xFF
+    packed[:,1] = ((pairs[:,0] >> 8) & 0x0F) | ((pairs[:,1] & 0x0F) << 4)
+    packed[:,2] = pairs[:,1] >> 4
+    return(packed.reshape(-1))
+
+## ====================================================================================
+class CameraList:
+    def __init__(self, cameras):
+        self.cameras = list(cameras)
+
+    def GetSize(self):
+        return(len(self.cameras))
+
+    def GetByIndex(self, index):
+        return(self.cameras[index])
+
+    def GetBySerial(self, serial_number):
+        for cam in self.cameras:
+            if (cam.serial_number == serial_number):
+                return(cam)
+        return(None)
+
+    def Clear(self):
+        self.cameras = []
+        return
+
+    def __len__(self):
+        return(len(self.cameras))
+
+    def __getitem__(self, index):
+        return(self.cameras[index])
+
+    def __iter__(self):
+        return(iter(list(self.cameras)))
+
+## ====================================================================================
+class LibraryVersion:
+    def __init__(self, major, minor, type, build):
+        self.major = major
+        self.minor = minor
+        self.type = type
+        self.build = build
+
+## ====================================================================================
+class System:
+    """
+    The simulated Spinnaker system singleton. The cameras are created the first time they are listed, using the
+    settings in SIMULATION at that time, and then persist (like real cameras) until the system is released.
+    """
+
+    _instance = None
+
+    def __init__(self):
+        self.cameras = None
+
+    @classmethod
+    def GetInstance(cls):
+        if (cls._instance is None):
+            cls._instance = System()
+        return(cls._instance)
+
+    def GetLibraryVersion(self):
+        return(LibraryVersion(*SIMULATED_LIBRARY_VERSION))
+
+    def GetCameras(self, update_interfaces=True, update_cameras=True):
+        if (self.cameras is None):
+            ## Each camera has its own random generator, since its frames are made on its own thread.
+            self.cameras = [SimulatedCamera(i, f'{90000000 + i}', random.default_rng(SIMULATION['seed'] + i))
+                            for i in range(SIMULATION['num_cameras'])]
+        return(CameraList(self.cameras))
+
+    def ReleaseInstance(self):
+        for cam in (self.cameras or []):
+            if cam.streaming:
+                cam.EndAcquisition()
+        self.cameras = None
+        System._instance = None
+        return